@@ -0,0 +1,125 @@
+"""
+Artefatti precompilati dei campionati: squadre normalizzate e calendario.
+
+Squadre e calendario dipendono solo dal file delle squadre: la prima volta
+che un campionato viene creato sono salvati in
+<cartella>/<nome del file>-<hash>.<interprete>.cal, con hash = SHA-256 del
+contenuto del file e interprete = sys.implementation.cache_tag (come in
+__pycache__, es. "cpython-311"). Ai caricamenti successivi (riavvii,
+processi worker, script) si legge l'artefatto: niente parsing del JSON,
+normalizzazione delle rose o generazione del calendario. Se il file delle squadre cambia cambia anche il nome
+dell'artefatto, che viene rigenerato; ARTIFACT_VERSION va incrementata se
+cambia il formato, la normalizzazione o l'algoritmo del calendario.
+
+Formato (ordine dei byte nativo: è una cache locale, non un file da
+scambiare):
+  intestazione  HEADER: magic, versione, numero di squadre, numero di
+                partite, byte del blocco squadre
+  squadre       lista delle squadre già normalizzate in formato marshal
+                (quello dei .pyc: si legge in un terzo del tempo del JSON,
+                ma dipende dalla versione di Python, che è nel nome del file)
+  padding       fino a un multiplo di 8 byte
+  partite       tre array uint16 lunghi quanto le partite, nell'ordine degli
+                id dei match: giornata, indice della squadra di casa,
+                indice della squadra in trasferta
+
+Il file è letto con mmap: gli array delle partite sono memoryview sui byte
+mappati, senza copia né parsing.
+"""
+import hashlib
+import marshal
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+ARTIFACT_VERSION = 1
+MAGIC = b"LSCAL"
+HEADER = struct.Struct("=5sBHII")
+ALIGN = 8
+
+
+def source_hash(path):
+    """SHA-256 (esadecimale) del contenuto di un file"""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def artifact_path(directory, source):
+    """Percorso dell'artefatto del file squadre source (cambia se cambia il contenuto)"""
+    name = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(directory, f"{name}-{source_hash(source)[:16]}.{sys.implementation.cache_tag}.cal")
+
+
+def save(path, teams, fixtures):
+    """
+    Salva squadre e partite ((giornata, id casa, id trasferta) in ordine di id
+    del match). La scrittura è atomica: più processi possono generare lo
+    stesso artefatto insieme.
+    """
+    index = {team["id"]: i for i, team in enumerate(teams)}
+    block = marshal.dumps(teams)
+    columns = (array("H", (matchday for matchday, _, _ in fixtures)),
+               array("H", (index[home_id] for _, home_id, _ in fixtures)),
+               array("H", (index[away_id] for _, _, away_id in fixtures)))
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    # Nome casuale: più processi possono scrivere lo stesso artefatto. Permessi
+    # 0666 meno la umask (applicata dal kernel), come un file creato con open()
+    temp_path = f"{path}.{os.urandom(6).hex()}.tmp"
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, ARTIFACT_VERSION, len(teams), len(fixtures), len(block)))
+            f.write(block)
+            f.write(bytes(_padding(len(block))))
+            for column in columns:
+                column.tofile(f)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def _padding(block_size):
+    return -(HEADER.size + block_size) % ALIGN
+
+
+def load(path):
+    """
+    (squadre, partite) di un artefatto, nello stesso formato di save().
+    Solleva FileNotFoundError se non esiste, ValueError se non è valido.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < HEADER.size:
+            raise ValueError(f"{path}: file troppo corto")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, version, num_teams, num_fixtures, block_size = HEADER.unpack_from(data)
+            if magic != MAGIC or version != ARTIFACT_VERSION:
+                raise ValueError(f"{path}: formato {magic!r} v{version} non supportato")
+            offset = HEADER.size + block_size + _padding(block_size)
+            column_size = num_fixtures * 2
+            if len(data) != offset + 3 * column_size:
+                raise ValueError(f"{path}: dimensione non valida")
+            try:
+                teams = marshal.loads(data[HEADER.size:HEADER.size + block_size])
+            except EOFError:
+                raise ValueError(f"{path}: blocco squadre troncato") from None
+            if len(teams) != num_teams:
+                raise ValueError(f"{path}: {len(teams)} squadre invece di {num_teams}")
+
+            ids = [team["id"] for team in teams]
+            with memoryview(data) as view:
+                matchdays, homes, aways = (view[offset + i * column_size:offset + (i + 1) * column_size].cast("H")
+                                           for i in range(3))
+                try:
+                    fixtures = [(matchday, ids[home], ids[away])
+                                for matchday, home, away in zip(matchdays, homes, aways)]
+                except IndexError:
+                    raise ValueError(f"{path}: indice di squadra non valido") from None
+                finally:
+                    for column in (matchdays, homes, aways):
+                        column.release()
+    return teams, fixtures
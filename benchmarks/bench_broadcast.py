@@ -0,0 +1,129 @@
+"""
+Benchmark del fan-out dei messaggi WebSocket.
+
+Misura la latenza di un broadcast verso 1k / 10k client simulati
+(stream finti, nessun socket reale) confrontando:
+- per-client: ogni client codifica e comprime il proprio frame (come write_message)
+- condiviso:  un solo frame (e una sola compressione) per tutti (Broadcaster)
+
+Uso:
+    python benchmarks/bench_broadcast.py [--clients 1000 10000] [--rounds 20] [--deflate]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from tornado.websocket import _PerMessageDeflateCompressor  # noqa: E402
+
+from broadcast import Broadcaster, Frame, RSV1, encode_frame  # noqa: E402
+
+
+class FakeStream:
+    """Stream che accetta tutto e tiene solo i contatori di Tornado"""
+
+    def __init__(self):
+        self._total_write_index = 0
+        self._total_write_done_index = 0
+
+    def write(self, data):
+        self._total_write_index += len(data)
+        self._total_write_done_index = self._total_write_index
+
+
+class FakeConnection:
+    def __init__(self, deflate):
+        self.stream = FakeStream()
+        self._compressor = _PerMessageDeflateCompressor(False, None) if deflate else None
+        self._message_bytes_out = 0
+        self._wire_bytes_out = 0
+
+    def is_closing(self):
+        return False
+
+
+class FakeHandler:
+    def __init__(self, deflate):
+        self.ws_connection = FakeConnection(deflate)
+
+    def close(self, code=None, reason=None):
+        pass
+
+
+def sample_message():
+    """Un match_update tipico: 10 delta con qualche evento e la classifica"""
+    deltas = [{
+        "id": str(i), "seq": 42, "minute": 57,
+        "events": [{"minute": 57, "type": "corner", "team": "home",
+                    "player": "Mario Rossi", "team_name": "Squadra"}],
+    } for i in range(10)]
+    standings = [{"position": p, "team_id": f"team{p}", "name": f"Team {p}", "points": 40 - p,
+                  "played": 20, "wins": 10, "draws": 5, "losses": 5, "goals_for": 30,
+                  "goals_against": 20, "goal_diff": 10} for p in range(1, 21)]
+    return json.dumps({"type": "match_update", "deltas": deltas,
+                       "standings": standings, "current_matchday": 20})
+
+
+def per_client_fanout(handlers, message):
+    """Come il vecchio loop: encoding e compressione ripetuti per ogni client"""
+    for handler in handlers:
+        connection = handler.ws_connection
+        payload = message.encode("utf-8")
+        flags = 0
+        if connection._compressor:
+            payload = connection._compressor.compress(payload)
+            flags = RSV1
+        connection.stream.write(encode_frame(payload, flags=flags))
+
+
+def run(num_clients, rounds, deflate):
+    message = sample_message()
+    broadcaster = Broadcaster()
+    for _ in range(num_clients):
+        broadcaster.clients.add(FakeHandler(deflate))
+    handlers = list(broadcaster.clients)
+
+    per_client, shared = [], []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        per_client_fanout(handlers, message)
+        per_client.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        broadcaster.publish(Frame(message))
+        shared.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "clients": num_clients,
+        "deflate": deflate,
+        "message_bytes": len(message),
+        "per_client_p50_ms": round(statistics.median(per_client), 3),
+        "shared_p50_ms": round(statistics.median(shared), 3),
+        "shared_p99_ms": round(broadcaster.stats.percentile(99), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--deflate", action="store_true", help="simula permessage-deflate")
+    parser.add_argument("--json", help="salva i risultati in questo file")
+    args = parser.parse_args()
+
+    results = [run(n, args.rounds, args.deflate) for n in args.clients]
+    for r in results:
+        print(f"{r['clients']:>6} client  per-client p50 {r['per_client_p50_ms']:>9.3f} ms   "
+              f"condiviso p50 {r['shared_p50_ms']:>8.3f} ms  p99 {r['shared_p99_ms']:>8.3f} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
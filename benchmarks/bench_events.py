@@ -0,0 +1,141 @@
+"""
+Microbenchmark della generazione degli eventi.
+
+Simula N partite complete (90 minuti) con lo stesso seme confrontando:
+- prima: il loop originale (moltiplicatore cercato tra i periodi a ogni
+  minuto, bias ricalcolato, liste di giocatori / motivi ricostruite a ogni
+  evento)
+- dopo:  simulate_match_history() con le tabelle precalcolate per minuto
+
+I due percorsi consumano i numeri casuali nello stesso ordine: gli eventi
+generati sono identici (verificato a ogni esecuzione).
+
+Uso:
+    python benchmarks/bench_events.py [--matches 20000] [--rounds 3] [--json risultati.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import server  # noqa: E402
+import engine  # noqa: E402
+from model import PENALTY_MISSED, PENALTY_SCORED, Event  # noqa: E402
+
+
+def legacy_period_multiplier(minute):
+    for period_name, (start, end, mult) in engine.PERIOD_MULTIPLIERS.items():
+        if start <= minute <= end:
+            return mult
+    return 1.0
+
+
+def legacy_generate_event(event_type, minute, home_team, away_team, home_bias, rng):
+    """generate_event() prima delle tabelle precalcolate"""
+    team = "home" if rng.random() < home_bias else "away"
+    team_data = home_team if team == "home" else away_team
+    player = rng.choice(team_data["players"])
+    info = other = None
+
+    if event_type == "goal":
+        goal_types = ["tiro", "colpo di testa", "punizione", "contropiede"]
+        info = rng.choice(goal_types)
+        if rng.random() < 0.7:
+            other_players = [p for p in team_data["players"] if p != player]
+            other = rng.choice(other_players)
+    elif event_type == "penalty":
+        info = PENALTY_SCORED if rng.random() < engine.PENALTY_SCORED_PROB else PENALTY_MISSED
+    elif event_type == "substitution":
+        if minute < 45:
+            return None
+        other_players = [p for p in team_data["players"] if p != player]
+        other = rng.choice(other_players)
+    elif event_type == "injury":
+        info = rng.choice(["lieve", "moderata", "grave"])
+    elif event_type == "yellow_card":
+        info = rng.choice(["fallo", "simulazione", "proteste", "gioco pericoloso"])
+    elif event_type == "red_card":
+        info = rng.choice(["doppia ammonizione", "fallo grave", "condotta violenta"])
+
+    return Event(minute, event_type, team, player, team_data["name"], info, other)
+
+
+def legacy_match_history(home_team, away_team, current_minute, rng):
+    """Il loop per minuto originale (bias e moltiplicatore ricalcolati ogni minuto)"""
+    events = []
+    for minute in range(1, current_minute + 1):
+        multiplier = legacy_period_multiplier(minute)
+        home_bias = engine.get_home_bias(home_team, away_team)
+        for event_type, base_prob in engine.EVENT_PROBABILITIES.items():
+            if rng.random() < base_prob * multiplier:
+                event = legacy_generate_event(event_type, minute, home_team, away_team, home_bias, rng)
+                if event:
+                    events.append(event)
+    return events
+
+
+def run(simulate, fixtures, seed):
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    events = [simulate(home, away, rng) for home, away in fixtures]
+    return time.perf_counter() - start, events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--matches", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--json", help="salva i risultati in questo file")
+    args = parser.parse_args()
+
+    teams = server.championship.teams
+    pick = random.Random(0)
+    fixtures = [tuple(pick.sample(teams, 2)) for _ in range(args.matches)]
+
+    def before(home, away, rng):
+        return legacy_match_history(home, away, 90, rng)
+
+    def after(home, away, rng):
+        return engine.simulate_match_history(home, away, 90, rng)[2]
+
+    best = {}
+    for name, simulate in (("prima", before), ("dopo", after)):
+        times = []
+        for round_number in range(args.rounds):
+            elapsed, events = run(simulate, fixtures, seed=round_number)
+            times.append(elapsed)
+        best[name] = (min(times), events)
+
+    same = all(
+        [e.to_wire() for e in a] == [e.to_wire() for e in b]
+        for a, b in zip(best["prima"][1], best["dopo"][1])
+    )
+    num_events = sum(len(events) for events in best["dopo"][1])
+    minutes = args.matches * 90
+
+    results = {"matches": args.matches, "events": num_events, "identical": same}
+    for name, (elapsed, _) in best.items():
+        results[name] = {
+            "seconds": round(elapsed, 4),
+            "events_per_sec": round(num_events / elapsed),
+            "match_minutes_per_sec": round(minutes / elapsed),
+        }
+        print(f"{name:>6}: {elapsed:7.3f} s   {num_events / elapsed:>10,.0f} eventi/s   "
+              f"{minutes / elapsed:>12,.0f} minuti-partita/s")
+    print(f"eventi: {num_events}   identici: {same}   "
+          f"speedup: {best['prima'][0] / best['dopo'][0]:.2f}x")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
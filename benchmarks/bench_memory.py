@@ -0,0 +1,131 @@
+"""
+Benchmark della memoria del modello match/eventi.
+
+Confronta il modello compatto (Match / Event con __slots__, vedi model.py)
+con la rappresentazione precedente a dict annidati:
+- N eventi generati da generate_event() (default 1 milione)
+- una stagione completa di un campionato simulata a velocità massima
+
+La memoria è misurata con tracemalloc (byte allocati e ancora vivi).
+
+Uso:
+    python benchmarks/bench_memory.py [--events 1000000] [--json risultati.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import server  # noqa: E402
+import engine  # noqa: E402
+from model import Event, Match  # noqa: E402
+
+
+def measure(build):
+    """Byte ancora allocati dopo build() (il risultato resta vivo durante la misura)"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, result
+
+
+def legacy_match(match):
+    """Il match come dict, con gli stessi campi e riferimenti di prima del modello compatto"""
+    legacy = match.to_wire()
+    legacy.update({"home": match.home, "away": match.away,
+                   "home_data": match.home_data, "away_data": match.away_data})
+    legacy["score"] = dict(match.score)
+    return legacy
+
+
+def bench_events(num_events, seed=1):
+    rng = random.Random(seed)
+    teams = server.championship.teams
+    types = list(engine.EVENT_PROBABILITIES)
+
+    events = []
+    while len(events) < num_events:
+        home, away = rng.sample(teams, 2)
+        event = engine.generate_event(rng.choice(types), rng.randint(46, 95), home, away,
+                                      0.5, 0, 0, rng)
+        if event is not None:
+            events.append(event)
+
+    # Stessi eventi nelle due rappresentazioni (stringhe condivise in entrambi i casi)
+    compact_bytes, _ = measure(lambda: [Event(*(getattr(event, slot) for slot in Event.__slots__))
+                                        for event in events])
+    dict_bytes, _ = measure(lambda: [event.to_wire() for event in events])
+    return {
+        "events": num_events,
+        "compact_bytes": compact_bytes,
+        "dict_bytes": dict_bytes,
+        "compact_bytes_per_event": round(compact_bytes / num_events, 1),
+        "dict_bytes_per_event": round(dict_bytes / num_events, 1),
+        "ratio": round(compact_bytes / dict_bytes, 3),
+    }
+
+
+def compact_match(match):
+    """Copia del match nel modello compatto, ricostruita dal formato wire"""
+    copy = Match(match.id, match.matchday, match.home_data, match.away_data)
+    for field in server.DELTA_FIELDS + ("seq",):
+        setattr(copy, field, getattr(match, field))
+    copy.score = dict(match.score)
+    copy.events = [Event.from_wire(event) for event in match.to_wire()["events"]]
+    return copy
+
+
+def bench_season():
+    championship = server.create_league(server.DEFAULT_LEAGUE)
+    championship.seed = 1
+    championship.start()
+    while not championship.tick()["season_over"]:
+        pass
+
+    # Solo lo stato dei match: indici, cache e classifica non fanno parte del confronto
+    matches = list(championship.matches.values())
+    compact_bytes, _ = measure(lambda: [compact_match(match) for match in matches])
+    dict_bytes, _ = measure(lambda: [legacy_match(match) for match in matches])
+    return {
+        "matches": len(matches),
+        "events": sum(len(match.events) for match in matches),
+        "compact_bytes": compact_bytes,
+        "dict_bytes": dict_bytes,
+        "ratio": round(compact_bytes / dict_bytes, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=1000000)
+    parser.add_argument("--json", help="salva i risultati in questo file")
+    args = parser.parse_args()
+
+    events = bench_events(args.events)
+    print(f"{events['events']:>9} eventi   compatto {events['compact_bytes'] / 1e6:8.1f} MB "
+          f"({events['compact_bytes_per_event']} B/evento)   "
+          f"dict {events['dict_bytes'] / 1e6:8.1f} MB ({events['dict_bytes_per_event']} B/evento)   "
+          f"rapporto {events['ratio']:.2f}")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        season = bench_season()
+    print(f"stagione: {season['matches']} match, {season['events']} eventi   "
+          f"compatto {season['compact_bytes'] / 1e6:6.2f} MB   dict {season['dict_bytes'] / 1e6:6.2f} MB   "
+          f"rapporto {season['ratio']:.2f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"events": events, "season": season}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+Microbenchmark dei percorsi caldi del server.
+
+- simulate_match_history(): partite complete di 90' simulate al secondo
+- get_sorted_standings(): classifica ricostruita (cache invalidata) e in cache;
+  get_live_standings() ricostruita con le partite in corso
+- broadcast di un tick: build_topic_update() + codifica JSON (il codec del
+  server) per i topic tipici (tutte le partite, un match, classifica,
+  classifica live) su batch reali di una giornata in corso
+- serializzazione: gli stessi aggiornamenti e uno stato iniziale codificati
+  con ogni codec installato (json/stdlib, json/orjson, json/msgspec,
+  msgpack/python, msgpack/msgpack): tempo e byte
+- salvataggio dello stato (statestore SQLite ed eventlog JSONL) fino a metà
+  stagione: costo di record() per tick sul thread che simula, tempo di
+  ripresa e spazio su disco
+- statistiche della stagione (stats.StatsIndex) su una stagione intera:
+  aggiornamento incrementale per tick, ricostruzione completa, primi 10
+  marcatori dall'indice e con una scansione di tutti gli eventi
+
+Ogni misura è il migliore di --rounds giri (tempo per chiamata).
+
+Uso:
+    python benchmarks/bench_micro.py [--rounds 5] [--json risultati.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import server  # noqa: E402
+import engine  # noqa: E402
+import eventlog  # noqa: E402
+import serialization  # noqa: E402
+import statestore  # noqa: E402
+import stats  # noqa: E402
+from loadtest import git_commit  # noqa: E402
+
+
+def best_time(function, number, rounds):
+    """Secondi per chiamata: il migliore di rounds giri da number chiamate"""
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def live_championship(seed=1, minute=60):
+    """Campionato con seme fisso a metà della terza giornata, più i batch dell'ultimo tick"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        championship = server.create_league(server.DEFAULT_LEAGUE)
+        championship.seed = seed
+        championship.start()
+        batches = []
+        while championship.current_matchday < 3 or championship.matchday_minute < minute:
+            batches.append(championship.tick())
+    return championship, batches[-30:]
+
+
+def bench_simulation(rounds, matches=2000):
+    teams = server.championship.teams
+    pick = random.Random(0)
+    fixtures = [tuple(pick.sample(teams, 2)) for _ in range(matches)]
+    rng = random.Random(1)
+
+    def simulate():
+        for home, away in fixtures:
+            engine.simulate_match_history(home, away, 90, rng)
+
+    seconds = best_time(simulate, 1, rounds) / matches
+    return {"us_per_match": round(seconds * 1e6, 2), "matches_per_sec": round(1 / seconds)}
+
+
+def bench_standings(championship, rounds, number=2000):
+    def rebuild():
+        championship._standings_cache = (None, None)
+        championship.get_sorted_standings()
+
+    def rebuild_live():
+        championship._live_standings_cache = (None, None)
+        championship.get_live_standings()
+
+    return {
+        "sorted_rebuild_us": round(best_time(rebuild, number, rounds) * 1e6, 2),
+        "sorted_cached_us": round(best_time(championship.get_sorted_standings, number * 10, rounds) * 1e6, 3),
+        "live_rebuild_us": round(best_time(rebuild_live, number, rounds) * 1e6, 2),
+    }
+
+
+def bench_topics(championship):
+    match_id = championship.matchday_index[championship.current_matchday][0]
+    return [server.TOPIC_LIVE, f"match:{match_id}", server.TOPIC_STANDINGS, server.TOPIC_LIVE_STANDINGS]
+
+
+def topic_messages(championship, batches, topics):
+    """Come publish_updates: un messaggio per topic attivo e per tick"""
+    standings = championship.get_sorted_standings()
+    live_standings = championship.get_live_standings()
+    messages = []
+    for batch in batches:
+        for topic in topics:
+            message = server.build_topic_update(
+                championship, topic, batch["deltas"], standings if batch["standings_updated"] else None,
+                batch["started_matchday"], live_standings)
+            if message is not None:
+                message["tick_time"] = batch["tick_time"]
+                messages.append(message)
+    return messages
+
+
+def bench_broadcast(championship, batches, rounds):
+    topics = bench_topics(championship)
+    codec = server.codecs["json"]
+    encoded = []
+
+    def encode_ticks():
+        encoded.clear()
+        encoded.extend(codec.encode(message) for message in topic_messages(championship, batches, topics))
+
+    seconds = best_time(encode_ticks, 20, rounds) / len(batches)
+    return {
+        "topics": len(topics),
+        "codec": codec.backend,
+        "us_per_tick": round(seconds * 1e6, 2),
+        "bytes_per_tick": round(sum(len(message) for message in encoded) / len(batches)),
+    }
+
+
+def bench_serialization(championship, batches, rounds):
+    """Solo codifica (messaggi già costruiti), per ogni codec installato"""
+    messages = topic_messages(championship, batches, bench_topics(championship))
+    snapshot = server.build_initial_state(championship, [server.TOPIC_LIVE, server.TOPIC_STANDINGS])
+    results = {}
+    for name, codec in serialization.available_codecs().items():
+        encode = codec.encode
+        update_seconds = best_time(lambda: [encode(message) for message in messages], 20, rounds) / len(batches)
+        snapshot_seconds = best_time(lambda: encode(snapshot), 200, rounds)
+        results[name] = {
+            "update_us_per_tick": round(update_seconds * 1e6, 2),
+            "update_bytes_per_tick": round(sum(len(encode(message)) for message in messages) / len(batches)),
+            "snapshot_us": round(snapshot_seconds * 1e6, 2),
+            "snapshot_bytes": len(encode(snapshot)),
+        }
+    return results
+
+
+def bench_persistence(rounds, matchday=20):
+    """Stagione simulata fino a matchday con ogni formato di salvataggio, poi ripresa"""
+    stores = {
+        "sqlite": (statestore.StateStore, statestore.restore, "bench.sqlite"),
+        "jsonl": (eventlog.EventLog, eventlog.restore, "bench.jsonl"),
+    }
+    directory = tempfile.mkdtemp()
+    results = {}
+    try:
+        for name, (store, restore, filename) in stores.items():
+            path = os.path.join(directory, filename)
+            championship = server.create_league(server.DEFAULT_LEAGUE)
+            championship.seed = 1
+            championship.start()
+            log = store(path)
+            log.start(championship)
+            record_seconds = 0.0
+            ticks = 0
+            while championship.current_matchday < matchday:
+                batch = championship.tick()
+                start = time.perf_counter()
+                log.record(championship, batch)
+                record_seconds += time.perf_counter() - start
+                ticks += 1
+            log.close()
+
+            restore_seconds = float("inf")
+            for _ in range(rounds):
+                copy = server.create_league(server.DEFAULT_LEAGUE)
+                start = time.perf_counter()
+                restore(copy, path)
+                restore_seconds = min(restore_seconds, time.perf_counter() - start)
+            results[name] = {
+                "record_us_per_tick": round(record_seconds / ticks * 1e6, 2),
+                "restore_ms": round(restore_seconds * 1000, 2),
+                "bytes": sum(os.path.getsize(os.path.join(directory, f))
+                             for f in os.listdir(directory) if f.startswith(filename)),
+            }
+    finally:
+        shutil.rmtree(directory)
+    return results
+
+
+def bench_stats(rounds):
+    """Stagione completa con l'indice aggiornato a ogni tick, poi interrogazioni"""
+    championship = server.create_league(server.DEFAULT_LEAGUE)
+    championship.seed = 1
+    championship.start()
+    index = stats.StatsIndex(championship)
+    update_seconds = 0.0
+    ticks = 0
+    while True:
+        batch = championship.tick()
+        start = time.perf_counter()
+        index.update(delta["id"] for delta in batch["deltas"])
+        update_seconds += time.perf_counter() - start
+        ticks += 1
+        if batch["season_over"]:
+            break
+
+    def scan_top_scorers():
+        goals = {}
+        for match in championship.matches.values():
+            for event in match.events:
+                if event.scored:
+                    key = (match.home_id if event.team == "home" else match.away_id, event.player)
+                    goals[key] = goals.get(key, 0) + 1
+        return sorted(goals.items(), key=lambda item: -item[1])[:10]
+
+    return {
+        "events": sum(len(match.events) for match in championship.matches.values()),
+        "update_us_per_tick": round(update_seconds / ticks * 1e6, 2),
+        "rebuild_ms": round(best_time(lambda: stats.StatsIndex(championship), 1, rounds) * 1000, 2),
+        "top10_index_us": round(best_time(lambda: index.top("goals", 10), 1000, rounds) * 1e6, 2),
+        "top10_scan_us": round(best_time(scan_top_scorers, 5, rounds) * 1e6, 2),
+    }
+
+
+def run_micro(rounds=5):
+    championship, batches = live_championship()
+    return {
+        "benchmark": "micro",
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "simulate_match_history": bench_simulation(rounds),
+        "standings": bench_standings(championship, rounds),
+        "broadcast_encode": bench_broadcast(championship, batches, rounds),
+        "serialization": bench_serialization(championship, batches, rounds),
+        "persistence": bench_persistence(rounds),
+        "stats": bench_stats(rounds),
+    }
+
+
+def print_results(results):
+    simulation = results["simulate_match_history"]
+    standings = results["standings"]
+    broadcast = results["broadcast_encode"]
+    print(f"simulate_match_history: {simulation['us_per_match']:>9.2f} us/partita "
+          f"({simulation['matches_per_sec']:,} partite/s)")
+    print(f"get_sorted_standings:   {standings['sorted_rebuild_us']:>9.2f} us ricostruita   "
+          f"{standings['sorted_cached_us']:.3f} us in cache   live {standings['live_rebuild_us']:.2f} us")
+    print(f"broadcast ({broadcast['codec']:>7}):  {broadcast['us_per_tick']:>9.2f} us/tick per "
+          f"{broadcast['topics']} topic ({broadcast['bytes_per_tick']:,} B/tick)")
+    print(f"\n{'codec':<16}{'update us/tick':>16}{'B/tick':>9}{'snapshot us':>13}{'B':>8}")
+    for name, codec in results["serialization"].items():
+        print(f"{name:<16}{codec['update_us_per_tick']:>16.2f}{codec['update_bytes_per_tick']:>9,}"
+              f"{codec['snapshot_us']:>13.2f}{codec['snapshot_bytes']:>8,}")
+    print(f"\n{'salvataggio':<16}{'record us/tick':>16}{'ripresa ms':>12}{'B su disco':>12}")
+    for name, store in results["persistence"].items():
+        print(f"{name:<16}{store['record_us_per_tick']:>16.2f}{store['restore_ms']:>12.2f}{store['bytes']:>12,}")
+    season = results["stats"]
+    print(f"\nstatistiche ({season['events']:,} eventi): {season['update_us_per_tick']:.2f} us/tick, "
+          f"ricostruzione {season['rebuild_ms']:.2f} ms, primi 10 marcatori {season['top10_index_us']:.2f} us "
+          f"(scansione {season['top10_scan_us']:.0f} us)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--json", help="salva i risultati in questo file")
+    args = parser.parse_args()
+
+    results = run_micro(args.rounds)
+    print_results(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+Test di carico del server WebSocket.
+
+Avvia server.py in un processo separato con l'orologio accelerato (--speed)
+e senza log, poi apre uno sciame di client WebSocket asyncio (divisi su più
+processi client) con un mix di topic: tutte le partite della giornata, un
+match, la classifica ufficiale e quella live. Misura:
+- latenza tick -> consegna (campo tick_time dei messaggi, stesso host)
+- messaggi al secondo e byte per client al minuto (payload decompresso,
+  nel formato scelto con --format: json o msgpack)
+- tempo di connessione e client falliti
+- CPU (secondi e percentuale) e RSS di picco del server, worker inclusi
+  (letti da /proc: solo Linux)
+
+I risultati (con commit e parametri) si salvano in JSON con --json, per
+confrontare commit diversi (vedi run_all.py).
+
+Uso:
+    python benchmarks/loadtest.py [--clients 1000] [--duration 30] [--speed 10]
+                                  [--client-procs 2] [--workers 0] [--format msgpack]
+                                  [--json risultati.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+import urllib.request
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+import tornado.websocket
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import serialization  # noqa: E402
+
+# Mix di topic dello sciame (query string della connessione WebSocket, peso)
+TOPIC_MIX = (
+    ("", 0.4),                 # tutte le partite della giornata corrente
+    ("?standings=1", 0.2),     # solo classifica
+    ("?standings=live", 0.1),  # classifica live
+    ("?match={match}", 0.3),   # un singolo match
+)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def raise_fd_limit():
+    """Un client = un descrittore: alza il limite soft al massimo consentito"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ----------------------------------------------------------------------------
+# PROCESSO DEL SERVER: CPU e memoria da /proc
+# ----------------------------------------------------------------------------
+def process_tree(pid):
+    """pid e tutti i suoi discendenti (i worker di simulazione)"""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, ()))
+    return tree
+
+
+def sample_process(pid):
+    """(secondi di CPU, RSS in byte) di pid e discendenti"""
+    ticks = os.sysconf("SC_CLK_TCK")
+    page = os.sysconf("SC_PAGE_SIZE")
+    cpu = rss = 0
+    for member in process_tree(pid):
+        try:
+            with open(f"/proc/{member}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            cpu += (int(fields[11]) + int(fields[12])) / ticks  # utime + stime
+            rss += int(fields[21]) * page
+        except (OSError, IndexError, ValueError):
+            continue
+    return cpu, rss
+
+
+def start_server(port, speed, workers):
+    command = [sys.executable, "server.py", "--port", str(port), "--speed", str(speed),
+               "--workers", str(workers), "--no-log"]
+    server = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"server.py terminato all'avvio (codice {server.returncode})")
+        # In ascolto subito, pronto quando i campionati sono caricati (503 fino ad allora)
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=0.5).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("server.py non risponde")
+
+
+# ----------------------------------------------------------------------------
+# SCIAME DI CLIENT (eseguito in ogni processo client)
+# ----------------------------------------------------------------------------
+async def run_client(url, stats, measure_from, deadline, deflate, subprotocols):
+    start = time.perf_counter()
+    try:
+        ws = await tornado.websocket.websocket_connect(
+            url, compression_options={} if deflate else None, max_message_size=64 * 1024 * 1024,
+            subprotocols=subprotocols)
+    except Exception:
+        stats["failed"] += 1
+        return
+    stats["connect_ms"].append((time.perf_counter() - start) * 1000)
+    stats["connected"] += 1
+
+    loop = asyncio.get_running_loop()
+    while True:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            break
+        try:
+            message = await asyncio.wait_for(ws.read_message(), remaining)
+        except asyncio.TimeoutError:
+            break
+        if message is None:
+            stats["closed"] += 1
+            return
+        if loop.time() < measure_from:
+            continue  # rampa: le connessioni non sono ancora tutte aperte
+        stats["messages"] += 1
+        stats["bytes"] += len(message)
+        # Solo gli aggiornamenti hanno tick_time (lo stato iniziale no)
+        if ('"tick_time"' if isinstance(message, str) else b"tick_time") in message:
+            tick_time = serialization.decode(message).get("tick_time")
+            if tick_time:
+                stats["latency_ms"].append((time.time() - tick_time) * 1000)
+    ws.close()
+
+
+async def run_swarm(base_url, num_clients, duration, ramp, deflate, seed, wire_format):
+    stats = {"connected": 0, "failed": 0, "closed": 0, "messages": 0, "bytes": 0,
+             "connect_ms": array("d"), "latency_ms": array("d")}
+    rng = random.Random(seed)
+    queries, weights = zip(*TOPIC_MIX)
+    loop = asyncio.get_running_loop()
+    measure_from = loop.time() + ramp
+    deadline = measure_from + duration
+    subprotocols = [subprotocol for subprotocol, name in serialization.SUBPROTOCOLS.items() if name == wire_format]
+    tasks = []
+    for i in range(num_clients):
+        query = rng.choices(queries, weights)[0].format(match=rng.randint(1, 10))
+        tasks.append(asyncio.create_task(
+            run_client(base_url + query, stats, measure_from, deadline, deflate, subprotocols)))
+        # Connessioni distribuite sul tempo di rampa
+        await asyncio.sleep(ramp / num_clients)
+    await asyncio.gather(*tasks)
+    return stats
+
+
+def swarm_process(base_url, num_clients, duration, ramp, deflate, seed, wire_format):
+    """Corpo di un processo client: restituisce i contatori in forma serializzabile"""
+    raise_fd_limit()
+    stats = asyncio.run(run_swarm(base_url, num_clients, duration, ramp, deflate, seed, wire_format))
+    stats["connect_ms"] = stats["connect_ms"].tolist()
+    stats["latency_ms"] = stats["latency_ms"].tolist()
+    return stats
+
+
+def run_loadtest(clients=1000, duration=30, speed=10, client_procs=2, workers=0, port=8950,
+                 ramp=5, deflate=False, wire_format="json"):
+    """Esegue un test di carico completo e restituisce i risultati (dict serializzabile)"""
+    raise_fd_limit()
+    server = start_server(port, speed, workers)
+    base_url = f"ws://127.0.0.1:{port}/ws"
+    try:
+        cpu_start, _ = sample_process(server.pid)
+        rss_peak = 0
+        started = time.monotonic()
+        client_procs = max(1, min(client_procs, clients))
+        with ProcessPoolExecutor(max_workers=client_procs) as pool:
+            futures = [pool.submit(swarm_process, base_url, clients // client_procs + (i < clients % client_procs),
+                                   duration, ramp, deflate, i, wire_format)
+                       for i in range(client_procs)]
+            # Campionamento del server mentre lo sciame è connesso
+            while not all(future.done() for future in futures):
+                rss_peak = max(rss_peak, sample_process(server.pid)[1])
+                time.sleep(0.5)
+            parts = [future.result() for future in futures]
+        elapsed = time.monotonic() - started
+        cpu_end, rss = sample_process(server.pid)
+        rss_peak = max(rss_peak, rss)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    total = {key: sum(part[key] for part in parts)
+             for key in ("connected", "failed", "closed", "messages", "bytes")}
+    latencies = sorted(value for part in parts for value in part["latency_ms"])
+    connects = sorted(value for part in parts for value in part["connect_ms"])
+    cpu_seconds = cpu_end - cpu_start
+    return {
+        "benchmark": "loadtest",
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "params": {"clients": clients, "duration": duration, "speed": speed, "client_procs": client_procs,
+                   "workers": workers, "ramp": ramp, "deflate": deflate, "format": wire_format},
+        "clients": {
+            "connected": total["connected"], "failed": total["failed"], "closed_by_server": total["closed"],
+            "connect_ms_p50": percentile(connects, 50), "connect_ms_p99": percentile(connects, 99),
+        },
+        "messages": total["messages"],
+        "messages_per_sec": round(total["messages"] / duration, 1),
+        # Byte di payload (decompresso) per client per minuto di test
+        "bytes_per_client_per_minute": round(total["bytes"] / max(total["connected"], 1) / (duration / 60)),
+        "latency_ms": {
+            "samples": len(latencies),
+            "p50": percentile(latencies, 50), "p90": percentile(latencies, 90),
+            "p99": percentile(latencies, 99), "max": latencies[-1] if latencies else None,
+        },
+        "server": {
+            "cpu_seconds": round(cpu_seconds, 2),
+            "cpu_percent": round(cpu_seconds / elapsed * 100, 1),
+            "rss_mb_peak": round(rss_peak / 1e6, 1),
+        },
+    }
+
+
+def print_results(results):
+    clients = results["clients"]
+    latency = results["latency_ms"]
+    server = results["server"]
+    fmt = lambda value: "-" if value is None else f"{value:.1f}"  # noqa: E731
+    print(f"client: {clients['connected']} connessi, {clients['failed']} falliti, "
+          f"{clients['closed_by_server']} chiusi dal server   connessione p50 {fmt(clients['connect_ms_p50'])} ms "
+          f"p99 {fmt(clients['connect_ms_p99'])} ms")
+    print(f"messaggi: {results['messages']} ({results['messages_per_sec']:,.0f}/s)   "
+          f"{results['bytes_per_client_per_minute']:,} B/client/min")
+    print(f"latenza tick->consegna: p50 {fmt(latency['p50'])} ms  p90 {fmt(latency['p90'])} ms  "
+          f"p99 {fmt(latency['p99'])} ms  max {fmt(latency['max'])} ms  ({latency['samples']} campioni)")
+    print(f"server: CPU {server['cpu_seconds']} s ({server['cpu_percent']}%)   RSS di picco {server['rss_mb_peak']} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=30, help="secondi di misura dopo la rampa")
+    parser.add_argument("--ramp", type=float, default=5, help="secondi in cui si connettono i client")
+    parser.add_argument("--speed", type=float, default=10, help="minuti di gioco al secondo nel server")
+    parser.add_argument("--client-procs", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--workers", type=int, default=0, help="worker di simulazione del server")
+    parser.add_argument("--port", type=int, default=8950)
+    parser.add_argument("--deflate", action="store_true", help="client con permessage-deflate")
+    parser.add_argument("--format", choices=("json", "msgpack"), default="json",
+                        help="formato dei messaggi chiesto dai client (sottoprotocollo WebSocket)")
+    parser.add_argument("--json", help="salva i risultati in questo file")
+    args = parser.parse_args()
+
+    results = run_loadtest(args.clients, args.duration, args.speed, args.client_procs, args.workers,
+                           args.port, args.ramp, args.deflate, args.format)
+    print_results(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
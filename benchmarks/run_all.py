@@ -0,0 +1,76 @@
+"""
+Esegue i microbenchmark (bench_micro.py) e un test di carico breve
+(loadtest.py) e salva tutto in un unico file JSON con il commit corrente.
+
+Con --baseline si confronta con un file salvato da un altro commit: per ogni
+metrica numerica si stampa la variazione percentuale.
+
+Uso:
+    python benchmarks/run_all.py [--json bench-<commit>.json] [--baseline bench-vecchio.json]
+                                 [--clients 500] [--duration 15] [--speed 10] [--skip-loadtest]
+"""
+import argparse
+import json
+import time
+
+from bench_micro import print_results as print_micro, run_micro
+from loadtest import git_commit, print_results as print_loadtest, run_loadtest
+
+
+def flatten(results, prefix=""):
+    """{"a": {"b": 1}} -> {"a.b": 1}, solo valori numerici"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(results, baseline):
+    current, previous = flatten(results), flatten(baseline)
+    print(f"\nconfronto con {baseline.get('commit')} ({baseline.get('timestamp')}):")
+    for name, value in current.items():
+        old = previous.get(name)
+        if name.startswith("params.") or old in (None, 0):
+            continue
+        print(f"  {name:<45} {old:>12,.2f} -> {value:>12,.2f}   {(value - old) / old * 100:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--json", help="file dei risultati (default: bench-<commit>.json)")
+    parser.add_argument("--baseline", help="risultati di un altro commit da confrontare")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--speed", type=float, default=10)
+    parser.add_argument("--skip-loadtest", action="store_true")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    results = {"commit": commit, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+    print("== microbenchmark ==")
+    results["micro"] = run_micro(args.rounds)
+    print_micro(results["micro"])
+
+    if not args.skip_loadtest:
+        print(f"\n== test di carico: {args.clients} client, {args.duration:g} s, velocità {args.speed:g} ==")
+        results["loadtest"] = run_loadtest(args.clients, args.duration, args.speed)
+        print_loadtest(results["loadtest"])
+
+    path = args.json or f"bench-{commit or 'nocommit'}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nrisultati salvati in {path}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""
+Broadcast dei messaggi WebSocket verso molti client.
+
+Ogni messaggio viene codificato UNA sola volta in un frame WebSocket già
+pronto (e, se il client ha negoziato permessage-deflate, compresso UNA sola
+volta), poi scritto direttamente sullo stream di ogni client senza await:
+un client lento non blocca più quelli che vengono dopo di lui.
+
+I client possono sottoscrivere dei "topic" (es. un singolo match): l'indice
+topic -> sottoscrittori permette di inviare ogni messaggio solo a chi è
+interessato, codificandolo una volta per topic.
+
+Un messaggio può essere codificato in più formati (JSON, MessagePack: vedi
+serialization.py): FrameSet codifica ogni formato una volta sola, solo se
+almeno un destinatario lo usa (attributo wire_format dell'handler).
+
+I client lenti hanno una coda di uscita limitata (byte in attesa sullo
+stream); oltre il limite vengono disconnessi oppure saltano il messaggio,
+a seconda della politica scelta.
+
+Scrivere i frame direttamente sullo stream richiede attributi non pubblici
+di Tornado (verificati con Tornado 6.x, fino alla 6.5):
+- WebSocketProtocol13: _compressor, _message_bytes_out, _wire_bytes_out
+- _PerMessageDeflateCompressor: _max_wbits, _compression_level, _mem_level,
+  _compressor
+- IOStream: _total_write_index, _total_write_done_index
+Broadcaster.add() li controlla su ogni connessione: se mancano (un'altra
+versione di Tornado) quel client riceve i messaggi con write_message(),
+senza frame condivisi, con un warning nel log. Il limite alla coda di uscita
+vale anche per lui: i byte in attesa si contano fino al completamento di
+ogni write_message().
+"""
+import functools
+import logging
+import struct
+import time
+import zlib
+from collections import deque
+
+# Bit e opcode del protocollo WebSocket (RFC 6455)
+FIN = 0x80
+RSV1 = 0x40
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+
+# Politiche per i client lenti
+EVICT_CLOSE = "close"   # chiude la connessione (il client si riconnette e riceve lo snapshot)
+EVICT_DROP = "drop"     # salta il messaggio (il client vede il buco di sequenza e fa resync)
+
+DEFAULT_MAX_PENDING_BYTES = 1024 * 1024  # 1 MB in coda per client
+DEFAULT_WIRE_FORMAT = "json"             # formato dei client senza wire_format
+LATENCY_WINDOW = 1000                    # ultimi N fan-out usati per i percentili
+
+# Attributi privati di Tornado usati dal percorso veloce (vedi il docstring del modulo)
+CONNECTION_ATTRIBUTES = ("_compressor", "_message_bytes_out", "_wire_bytes_out")
+COMPRESSOR_ATTRIBUTES = ("_max_wbits", "_compression_level", "_mem_level", "_compressor")
+STREAM_ATTRIBUTES = ("_total_write_index", "_total_write_done_index")
+
+log = logging.getLogger("livescore.broadcast")
+
+
+def encode_frame(payload, opcode=OPCODE_TEXT, flags=0):
+    """Costruisce un frame WebSocket lato server (non mascherato) con FIN impostato"""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", FIN | flags | opcode, length)
+    elif length <= 0xFFFF:
+        header = struct.pack("!BBH", FIN | flags | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", FIN | flags | opcode, 127, length)
+    return header + payload
+
+
+def deflate_message(payload, max_wbits=zlib.MAX_WBITS, level=6, mem_level=8):
+    """
+    Comprime un messaggio per permessage-deflate (RFC 7692) senza contesto
+    condiviso con i messaggi precedenti: il risultato è valido per qualsiasi
+    client, quindi può essere calcolato una volta e riusato per tutti.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -max_wbits, mem_level)
+    data = compressor.compress(payload) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    return data[:-4]  # rimuove la coda 00 00 ff ff come da RFC 7692
+
+
+class Frame:
+    """
+    Messaggio pre-codificato. Il frame in chiaro è calcolato subito,
+    le varianti compresse alla prima richiesta (una per parametri di
+    compressione, in pratica quasi sempre una sola).
+    """
+    __slots__ = ("payload", "opcode", "plain", "_deflated")
+
+    def __init__(self, message, binary=False):
+        if isinstance(message, str):
+            message = message.encode("utf-8")
+        self.payload = message
+        self.opcode = OPCODE_BINARY if binary else OPCODE_TEXT
+        self.plain = encode_frame(message, self.opcode)
+        self._deflated = {}
+
+    def for_connection(self, connection):
+        """Restituisce i byte da scrivere sullo stream di una connessione"""
+        compressor = getattr(connection, "_compressor", None)
+        if compressor is None:
+            return self.plain
+
+        key = (compressor._max_wbits, compressor._compression_level, compressor._mem_level)
+        data = self._deflated.get(key)
+        if data is None:
+            data = encode_frame(deflate_message(self.payload, *key), self.opcode, RSV1)
+            self._deflated[key] = data
+        return data
+
+    def frame_for(self, handler):
+        return self
+
+
+class FrameSet:
+    """
+    Lo stesso messaggio (un dict) per client con formati diversi: ogni
+    formato è codificato in un Frame alla prima richiesta di un client che
+    lo usa, poi riusato per tutti gli altri.
+    """
+    __slots__ = ("message", "codecs", "frames", "on_encode")
+
+    def __init__(self, message, codecs, on_encode=None):
+        self.message = message
+        self.codecs = codecs        # formato -> Codec (vedi serialization.py)
+        self.frames = {}            # formato -> Frame
+        self.on_encode = on_encode  # callback(formato, frame) a ogni codifica (metriche)
+
+    def frame(self, wire_format):
+        frame = self.frames.get(wire_format)
+        if frame is None:
+            codec = self.codecs[wire_format]
+            frame = self.frames[wire_format] = Frame(codec.encode(self.message), codec.binary)
+            if self.on_encode is not None:
+                self.on_encode(wire_format, frame)
+        return frame
+
+    def frame_for(self, handler):
+        return self.frame(getattr(handler, "wire_format", DEFAULT_WIRE_FORMAT))
+
+
+def supports_shared_frames(connection):
+    """True se la connessione ha gli attributi di Tornado usati per scrivere i frame condivisi"""
+    compressor = getattr(connection, "_compressor", None)
+    return (all(hasattr(connection, name) for name in CONNECTION_ATTRIBUTES)
+            and all(hasattr(connection.stream, name) for name in STREAM_ATTRIBUTES)
+            and (compressor is None or all(hasattr(compressor, name) for name in COMPRESSOR_ATTRIBUTES)))
+
+
+def prepare_connection(handler):
+    """
+    Da chiamare in open(): se la connessione usa permessage-deflate, disattiva
+    il contesto persistente del compressore di Tornado. Così anche i messaggi
+    inviati con write_message() sono compressi in modo indipendente e possono
+    alternarsi ai frame condivisi senza corrompere la finestra del client.
+    """
+    connection = handler.ws_connection
+    compressor = getattr(connection, "_compressor", None)
+    if compressor is not None:
+        compressor._compressor = None
+
+
+def pending_bytes(stream):
+    """Byte accodati sullo stream e non ancora scritti sul socket (0 se Tornado non li espone)"""
+    return getattr(stream, "_total_write_index", 0) - getattr(stream, "_total_write_done_index", 0)
+
+
+class BroadcastStats:
+    """Metriche del broadcast: contatori e latenze di fan-out recenti"""
+
+    def __init__(self):
+        self.messages = 0
+        self.frames_written = 0
+        self.bytes_out = 0
+        self.evicted = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_fanout_ms = 0.0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def record_fanout(self, seconds):
+        self.last_fanout_ms = seconds * 1000
+        self._latencies.append(self.last_fanout_ms)
+
+    def percentile(self, pct):
+        if not self._latencies:
+            return 0.0
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * pct / 100))
+        return ordered[index]
+
+    def snapshot(self):
+        return {
+            "messages": self.messages,
+            "frames_written": self.frames_written,
+            "bytes_out": self.bytes_out,
+            "evicted": self.evicted,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "last_fanout_ms": round(self.last_fanout_ms, 3),
+            "fanout_p50_ms": round(self.percentile(50), 3),
+            "fanout_p99_ms": round(self.percentile(99), 3),
+        }
+
+
+class Broadcaster:
+    """
+    Insieme dei client connessi, indice dei topic sottoscritti e invio dei
+    messaggi a tutti (o ai sottoscrittori di un topic) con un solo encoding
+    per messaggio.
+    """
+
+    def __init__(self, max_pending_bytes=DEFAULT_MAX_PENDING_BYTES, policy=EVICT_CLOSE):
+        if policy not in (EVICT_CLOSE, EVICT_DROP):
+            raise ValueError(f"Politica di eviction non valida: {policy!r}")
+        self.clients = set()
+        self.topics = {}             # topic -> set di handler sottoscritti
+        self._subscriptions = {}     # handler -> set di topic
+        self._fallback = {}          # handler serviti con write_message -> byte non ancora scritti
+        self.max_pending_bytes = max_pending_bytes
+        self.policy = policy
+        self.stats = BroadcastStats()
+
+    def add(self, handler):
+        if supports_shared_frames(handler.ws_connection):
+            prepare_connection(handler)
+        else:
+            if not self._fallback:
+                log.warning("⚠️  Versione di Tornado senza gli attributi attesi: messaggi inviati "
+                            "con write_message(), senza frame condivisi")
+            self._fallback[handler] = 0
+        self.clients.add(handler)
+
+    def discard(self, handler):
+        self.clients.discard(handler)
+        self._fallback.pop(handler, None)
+        for topic in self._subscriptions.pop(handler, ()):
+            subscribers = self.topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(handler)
+                if not subscribers:
+                    del self.topics[topic]
+
+    def subscribe(self, handler, topic):
+        self.topics.setdefault(topic, set()).add(handler)
+        self._subscriptions.setdefault(handler, set()).add(topic)
+
+    def subscriptions(self, handler):
+        return self._subscriptions.get(handler, set())
+
+    def active_topics(self):
+        """Topic con almeno un sottoscrittore"""
+        return list(self.topics)
+
+    def publish_topic(self, topic, message, binary=False):
+        """Invia il messaggio ai soli sottoscrittori del topic"""
+        subscribers = self.topics.get(topic)
+        if not subscribers:
+            return 0
+        return self.publish(message, subscribers, binary)
+
+    def publish(self, message, clients=None, binary=False):
+        """
+        Invia il messaggio ai client indicati (default: tutti).
+        Non attende la scrittura sui socket: restituisce il numero di frame accodati.
+        """
+        targets = self.clients if clients is None else clients
+        if not targets:
+            return 0
+
+        start = time.perf_counter()
+        frame = message if isinstance(message, (Frame, FrameSet)) else Frame(message, binary)
+        sent = 0
+        for handler in list(targets):
+            if self.send(handler, frame):
+                sent += 1
+
+        self.stats.messages += 1
+        self.stats.record_fanout(time.perf_counter() - start)
+        return sent
+
+    def send(self, handler, frame):
+        """Accoda un frame pre-codificato (o il frame del suo formato da un FrameSet) sullo stream di un client"""
+        connection = handler.ws_connection
+        if connection is None or connection.is_closing():
+            self.discard(handler)
+            return False
+        frame = frame.frame_for(handler)
+        if handler in self._fallback:
+            return self._write_message(handler, frame)
+
+        stream = connection.stream
+        if pending_bytes(stream) > self.max_pending_bytes:
+            self._evict(handler)
+            return False
+
+        data = frame.for_connection(connection)
+        try:
+            stream.write(data)
+        except Exception:
+            # Stream già chiuso: on_close() arriverà a breve
+            self.stats.errors += 1
+            self.discard(handler)
+            return False
+
+        connection._message_bytes_out += len(frame.payload)
+        connection._wire_bytes_out += len(data)
+        self.stats.frames_written += 1
+        self.stats.bytes_out += len(data)
+        return True
+
+    def _write_message(self, handler, frame):
+        """
+        Invio tramite l'API pubblica di Tornado (codifica e compressione per
+        client), con lo stesso limite alla coda di uscita dei frame condivisi
+        """
+        if self._fallback[handler] > self.max_pending_bytes:
+            self._evict(handler)
+            return False
+        size = len(frame.payload)
+        try:
+            future = handler.write_message(frame.payload, binary=frame.opcode == OPCODE_BINARY)
+        except Exception:
+            self.stats.errors += 1
+            self.discard(handler)
+            return False
+        self._fallback[handler] += size
+        future.add_done_callback(functools.partial(self._written, handler, size))
+        self.stats.frames_written += 1
+        self.stats.bytes_out += size
+        return True
+
+    def _written(self, handler, size, future):
+        """Fine di una write_message(): i suoi byte non sono più in coda"""
+        if not future.cancelled():
+            future.exception()  # connessione chiusa nel frattempo: ci pensa on_close()
+        if handler in self._fallback:
+            self._fallback[handler] -= size
+
+    def _evict(self, handler):
+        """Applica la politica per i client che non smaltiscono la coda"""
+        if self.policy == EVICT_DROP:
+            self.stats.dropped += 1
+            return
+        self.stats.evicted += 1
+        self.discard(handler)
+        handler.close(1013, "Client troppo lento")
@@ -0,0 +1,332 @@
+"""
+Bus pub/sub tra il simulatore e i nodi edge.
+
+Il simulatore pubblica su un canale per campionato i batch dei tick (e, su
+richiesta, lo stato completo); i nodi edge (server.py --role edge) li
+ricevono, li applicano alla propria copia dei campionati e servono i client
+WebSocket. Così il numero di client non è limitato da un solo processo:
+si aggiungono processi edge (sulla stessa porta con SO_REUSEPORT o dietro
+un bilanciatore).
+
+Trasporti (scelti con l'URL del bus, vedi create_bus):
+- None / "local://":             nello stesso processo (LocalBus)
+- "tcp://host:porta",
+  "redis://host:porta":          un broker che parla il protocollo Redis
+- "unix:///percorso/socket":     lo stesso broker su socket Unix
+
+Del protocollo Redis (RESP) si usano solo PUBLISH, SUBSCRIBE e PING: va bene
+un server Redis vero oppure il broker minimo di questo modulo:
+    python bus.py --listen 127.0.0.1:6380
+    python bus.py --unix /tmp/livescore.sock
+
+I messaggi sono dict serializzati in JSON; l'ordine è quello di
+pubblicazione (una sola connessione per publisher).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import socket
+
+import tornado.iostream
+import tornado.netutil
+import tornado.tcpclient
+import tornado.tcpserver
+
+RECONNECT_DELAY = 1.0                        # secondi tra due tentativi di connessione
+MAX_SUBSCRIBER_BUFFER = 64 * 1024 * 1024     # byte in coda per sottoscrittore nel broker
+
+log = logging.getLogger("livescore.bus")
+
+
+class BusError(Exception):
+    """Errore restituito dal broker"""
+
+
+def encode_message(message):
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def decode_message(data):
+    return json.loads(data)
+
+
+def _bulk(value):
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def encode_command(*args):
+    """Comando (o reply multi-bulk) nel formato RESP"""
+    return b"*%d\r\n" % len(args) + b"".join(
+        b":%d\r\n" % arg if isinstance(arg, int) else _bulk(arg) for arg in args)
+
+
+async def read_reply(stream):
+    """Legge una reply (o un comando) RESP completa dallo stream"""
+    line = await stream.read_until(b"\r\n")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode("utf-8")
+    if kind == b"-":
+        raise BusError(rest.decode("utf-8"))
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        length = int(rest)
+        if length < 0:
+            return None
+        return (await stream.read_bytes(length + 2))[:-2]
+    if kind == b"*":
+        length = int(rest)
+        if length < 0:
+            return None
+        return [await read_reply(stream) for _ in range(length)]
+    raise BusError(f"Risposta non valida: {line[:40]!r}")
+
+
+def parse_address(url):
+    """URL del bus -> ("tcp", (host, porta)) o ("unix", percorso)"""
+    scheme, _, rest = url.partition("://")
+    if scheme == "unix":
+        return "unix", rest
+    if scheme in ("tcp", "redis"):
+        host, _, port = rest.rstrip("/").rpartition(":")
+        return "tcp", (host or "127.0.0.1", int(port or 6379))
+    raise ValueError(f"URL del bus non supportato: {url}")
+
+
+async def open_stream(address):
+    kind, target = address
+    if kind == "unix":
+        stream = tornado.iostream.IOStream(socket.socket(socket.AF_UNIX, socket.SOCK_STREAM))
+        await stream.connect(target)
+        return stream
+    stream = await tornado.tcpclient.TCPClient().connect(*target)
+    stream.set_nodelay(True)
+    return stream
+
+
+class LocalBus:
+    """Bus nello stesso processo: i sottoscrittori ricevono il dict pubblicato, senza copie"""
+    shared = False  # True se i messaggi arrivano ad altri processi
+
+    def __init__(self):
+        self._callbacks = {}  # canale -> lista di callback(message)
+
+    async def connect(self):
+        pass
+
+    def subscribe(self, channel, callback):
+        self._callbacks.setdefault(channel, []).append(callback)
+
+    def publish(self, channel, message):
+        callbacks = self._callbacks.get(channel, ())
+        for callback in callbacks:
+            callback(message)
+        return len(callbacks)
+
+
+class RespBus:
+    """
+    Bus su un broker Redis-compatibile. Una connessione pubblica (le reply di
+    PUBLISH sono lette e scartate in background), una seconda riceve i
+    messaggi dei canali sottoscritti. Entrambe si riconnettono da sole: i
+    messaggi pubblicati mentre il broker non è raggiungibile sono persi e i
+    sottoscrittori se ne accorgono dai numeri di tick (vedi server.LeagueFeed).
+    """
+    shared = True
+
+    def __init__(self, url):
+        self.address = parse_address(url)
+        self.url = url
+        self._publisher = None
+        self._callbacks = {}   # canale -> lista di callback(message)
+        self._subscriber = None
+        self.published = 0
+        self.received = 0
+        self.dropped = 0       # messaggi non pubblicati (broker non connesso)
+
+    async def connect(self):
+        """Prima connessione (attende il broker); le riconnessioni sono automatiche"""
+        while True:
+            try:
+                self._publisher = await open_stream(self.address)
+                break
+            except OSError as e:
+                log.warning("⏳ Bus %s non raggiungibile (%s), nuovo tentativo...", self.url, e)
+                await asyncio.sleep(RECONNECT_DELAY)
+        asyncio.create_task(self._drain_publisher(self._publisher))
+        asyncio.create_task(self._run_subscriber())
+
+    async def _drain_publisher(self, stream):
+        try:
+            while True:
+                await read_reply(stream)
+        except tornado.iostream.StreamClosedError:
+            pass
+        except BusError as e:
+            log.error("❌ Bus: %s", e)
+            stream.close()
+        except Exception:  # reply non valida o errore imprevisto: si riconnette comunque
+            log.exception("❌ Bus %s: errore sulla connessione del publisher", self.url)
+            stream.close()
+        self._publisher = None
+        while self._publisher is None:
+            await asyncio.sleep(RECONNECT_DELAY)
+            try:
+                self._publisher = await open_stream(self.address)
+            except OSError:
+                continue
+        log.info("🔌 Bus %s: publisher riconnesso", self.url)
+        asyncio.create_task(self._drain_publisher(self._publisher))
+
+    async def _run_subscriber(self):
+        while True:
+            try:
+                stream = await open_stream(self.address)
+            except OSError:
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+            self._subscriber = stream
+            try:
+                if self._callbacks:
+                    stream.write(encode_command("SUBSCRIBE", *self._callbacks))
+                while True:
+                    reply = await read_reply(stream)
+                    if isinstance(reply, list) and reply[0] == b"message":
+                        self.received += 1
+                        message = decode_message(reply[2])
+                        channel = reply[1].decode("utf-8")
+                        for callback in self._callbacks.get(channel, ()):
+                            try:
+                                callback(message)
+                            except Exception:  # un gestore difettoso non ferma la sottoscrizione
+                                log.exception("❌ Bus: errore nel gestore del canale %s", channel)
+            except tornado.iostream.StreamClosedError:
+                log.warning("🔌 Bus %s: sottoscrizione interrotta, riconnessione...", self.url)
+            except Exception:  # reply non valida o errore imprevisto: anche qui ci si riconnette
+                log.exception("❌ Bus %s: errore sulla sottoscrizione, riconnessione...", self.url)
+                stream.close()
+            self._subscriber = None
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    def subscribe(self, channel, callback):
+        new = channel not in self._callbacks
+        self._callbacks.setdefault(channel, []).append(callback)
+        if new and self._subscriber is not None:
+            self._subscriber.write(encode_command("SUBSCRIBE", channel))
+
+    def publish(self, channel, message):
+        stream = self._publisher
+        if stream is None or stream.closed():
+            self.dropped += 1
+            return 0
+        try:
+            stream.write(encode_command("PUBLISH", channel, encode_message(message)))
+        except tornado.iostream.StreamClosedError:
+            self.dropped += 1
+            return 0
+        self.published += 1
+        return 1
+
+
+def create_bus(url=None):
+    """Bus per l'URL indicato (None = nello stesso processo)"""
+    if url is None or url.startswith("local://"):
+        return LocalBus()
+    parse_address(url)  # ValueError subito se l'URL non è valido
+    return RespBus(url)
+
+
+# ----------------------------------------------------------------------------
+# BROKER MINIMO (sottoinsieme di Redis: PING, PUBLISH, SUBSCRIBE)
+# ----------------------------------------------------------------------------
+class Broker(tornado.tcpserver.TCPServer):
+    """
+    Ogni messaggio pubblicato è codificato una volta sola e scritto senza
+    await sugli stream dei sottoscrittori; un sottoscrittore troppo lento
+    (oltre MAX_SUBSCRIBER_BUFFER byte in coda) viene disconnesso.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.channels = {}  # canale -> set di stream sottoscritti
+        self.messages = 0
+
+    async def handle_stream(self, stream, address):
+        stream.max_write_buffer_size = MAX_SUBSCRIBER_BUFFER
+        subscribed = set()
+        try:
+            while True:
+                command = await read_reply(stream)
+                if not isinstance(command, list) or not command:
+                    stream.write(b"-ERR comando non valido\r\n")
+                    continue
+                name = command[0].upper()
+                if name == b"PING":
+                    stream.write(b"+PONG\r\n")
+                elif name == b"PUBLISH" and len(command) == 3:
+                    stream.write(b":%d\r\n" % self.publish(command[1], command[2]))
+                elif name == b"SUBSCRIBE" and len(command) > 1:
+                    for channel in command[1:]:
+                        subscribed.add(channel)
+                        self.channels.setdefault(channel, set()).add(stream)
+                        stream.write(encode_command("subscribe", channel, len(subscribed)))
+                else:
+                    stream.write(b"-ERR comando non supportato\r\n")
+        except (tornado.iostream.StreamClosedError, BusError, ValueError):
+            pass
+        finally:
+            for channel in subscribed:
+                self._unsubscribe(channel, stream)
+            stream.close()
+
+    def _unsubscribe(self, channel, stream):
+        subscribers = self.channels.get(channel)
+        if subscribers is not None:
+            subscribers.discard(stream)
+            if not subscribers:
+                del self.channels[channel]
+
+    def publish(self, channel, data):
+        subscribers = self.channels.get(channel)
+        if not subscribers:
+            return 0
+        self.messages += 1
+        frame = encode_command("message", channel, data)
+        for stream in list(subscribers):
+            try:
+                stream.write(frame)
+            except tornado.iostream.StreamClosedError:
+                self._unsubscribe(channel, stream)
+            except tornado.iostream.StreamBufferFullError:
+                self._unsubscribe(channel, stream)
+                stream.close()
+        return len(subscribers)
+
+
+async def run_broker(listen=None, unix=None):
+    broker = Broker()
+    if unix:
+        broker.add_socket(tornado.netutil.bind_unix_socket(unix))
+        print(f"📨 Broker in ascolto su unix://{unix}")
+    else:
+        host, _, port = listen.rpartition(":")
+        broker.listen(int(port), address=host or "127.0.0.1")
+        print(f"📨 Broker in ascolto su tcp://{host or '127.0.0.1'}:{port}")
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Broker pub/sub minimo (protocollo Redis) per i nodi edge")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--listen", default="127.0.0.1:6380", help="host:porta TCP")
+    group.add_argument("--unix", help="percorso del socket Unix")
+    args = parser.parse_args()
+    asyncio.run(run_broker(args.listen, args.unix))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,520 @@
+"""
+Motori di simulazione delle partite.
+
+Un motore genera gli eventi di un minuto per tutte le partite in corso di un
+campionato con una sola chiamata (MatchEngine.play_minute). Orologio,
+recupero, punteggio e fine partita restano al campionato (server.py): il
+motore decide solo cosa succede in campo. Il generatore casuale è sempre
+quello del campionato, quindi ogni motore è riproducibile dal seme.
+
+Motori disponibili (chiave "engine" di LEAGUES in server.py):
+- "classic": probabilità fisse per tipo di evento e minuto, squadra scelta
+  con home_bias (il modello originale)
+- "xg":      tiri e qualità dei tiri (xG) da attacco contro difesa, giocatori
+  scelti per ruolo, espulsioni e sostituzioni che cambiano chi è in campo
+Le previsioni di montecarlo.py seguono il motore del campionato.
+"""
+import abc
+import random
+
+from model import PENALTY_MISSED, PENALTY_SCORED, Event
+
+# CONFIGURAZIONE PROBABILITÀ EVENTI (realistiche per il calcio)
+EVENT_PROBABILITIES = {
+    "goal": 0.03,              # 3% per minuto (circa 2-3 goal per partita)
+    "yellow_card": 0.025,      # 2.5% per minuto (circa 2-3 cartellini gialli)
+    "red_card": 0.003,         # 0.3% per minuto (raro, circa 1 ogni 3-4 partite)
+    "substitution": 0.015,     # 1.5% per minuto (concentrato dopo il 60°)
+    "corner": 0.08,            # 8% per minuto (circa 7-10 corner per partita)
+    "offside": 0.04,           # 4% per minuto (4-5 fuorigioco)
+    "penalty": 0.004,          # 0.4% per minuto (raro)
+    "injury": 0.008            # 0.8% per minuto (infortuni occasionali)
+}
+
+# Probabilità aumentate in certi periodi
+PERIOD_MULTIPLIERS = {
+    "early": (1, 15, 0.7),      # Inizio: eventi ridotti (studio tattico)
+    "normal": (16, 75, 1.0),    # Gioco normale
+    "final": (76, 90, 1.4),     # Finale: eventi aumentati (pressing)
+    "injury_time": (91, 95, 1.6) # Recupero: massima intensità
+}
+
+PENALTY_SCORED_PROB = 0.75          # Probabilità di trasformare un rigore
+
+
+def simulate_match_history(home_team, away_team, current_minute, rng=random):
+    """
+    Simula la storia di un match fino al minuto corrente.
+    Genera eventi realistici basati sulle probabilità e sulla forza delle squadre.
+    """
+    home_score = 0
+    away_score = 0
+    events = []
+    
+    # Calcola bias in base alla differenza di forza
+    home_bias = get_home_bias(home_team, away_team)
+    
+    for minute in range(1, current_minute + 1):
+        # Genera eventi casuali (probabilità del minuto già moltiplicate)
+        for event_type, adjusted_prob in get_event_probabilities(minute):
+            if rng.random() < adjusted_prob:
+                event = generate_event(
+                    event_type, minute, home_team, away_team, 
+                    home_bias, home_score, away_score, rng
+                )
+                
+                if event:
+                    events.append(event)
+                    
+                    # Aggiorna punteggio se è un goal
+                    if event_type == "goal" and event.scored:
+                        if event.team == "home":
+                            home_score += 1
+                        else:
+                            away_score += 1
+                    
+                    # Penalty trasformato in goal
+                    if event_type == "penalty" and event.scored:
+                        if event.team == "home":
+                            home_score += 1
+                        else:
+                            away_score += 1
+    
+    return home_score, away_score, events
+
+
+def get_home_bias(home_team, away_team):
+    """
+    Probabilità che un evento sia della squadra di casa,
+    in base alla differenza di forza (da 0.3 a 0.7 circa).
+    """
+    strength_diff = home_team["strength"] - away_team["strength"]
+    return 0.5 + (strength_diff / 200)
+
+
+def _find_period_multiplier(minute):
+    for period_name, (start, end, mult) in PERIOD_MULTIPLIERS.items():
+        if start <= minute <= end:
+            return mult
+    return 1.0
+
+
+# TABELLE PRECALCOLATE
+# Tutto ciò che dipende solo dal minuto è calcolato una volta all'avvio:
+# nel loop dei tick resta una lettura da tupla, senza calcoli né allocazioni.
+MAX_TABLE_MINUTE = 120
+PERIOD_MULTIPLIER_BY_MINUTE = tuple(_find_period_multiplier(m) for m in range(MAX_TABLE_MINUTE + 1))
+# Per minuto: (tipo evento, probabilità già moltiplicata) nell'ordine di EVENT_PROBABILITIES
+EVENT_PROBABILITIES_BY_MINUTE = tuple(
+    tuple((event_type, base_prob * mult) for event_type, base_prob in EVENT_PROBABILITIES.items())
+    for mult in PERIOD_MULTIPLIER_BY_MINUTE
+)
+GOAL_TYPES = ("tiro", "colpo di testa", "punizione", "contropiede")
+INJURY_SEVERITIES = ("lieve", "moderata", "grave")
+YELLOW_CARD_REASONS = ("fallo", "simulazione", "proteste", "gioco pericoloso")
+RED_CARD_REASONS = ("doppia ammonizione", "fallo grave", "condotta violenta")
+
+
+def get_period_multiplier(minute):
+    """
+    Restituisce il moltiplicatore di probabilità in base al minuto.
+    """
+    if 0 <= minute <= MAX_TABLE_MINUTE:
+        return PERIOD_MULTIPLIER_BY_MINUTE[minute]
+    return _find_period_multiplier(minute)
+
+
+def get_event_probabilities(minute):
+    """Coppie (tipo evento, probabilità) per il minuto indicato"""
+    if 0 <= minute <= MAX_TABLE_MINUTE:
+        return EVENT_PROBABILITIES_BY_MINUTE[minute]
+    mult = _find_period_multiplier(minute)
+    return tuple((event_type, base_prob * mult) for event_type, base_prob in EVENT_PROBABILITIES.items())
+
+
+def pick_other_player(players, player_index, rng):
+    """
+    Un giocatore a caso diverso da players[player_index], senza costruire la
+    lista degli altri: si estrae tra n-1 posizioni e si salta quella esclusa.
+    """
+    index = rng.randrange(len(players) - 1)
+    return players[index + 1 if index >= player_index else index]
+
+
+def generate_event(event_type, minute, home_team, away_team, home_bias, home_score, away_score, rng=random):
+    """
+    Genera un evento specifico con dati realistici.
+    rng: generatore da usare (il Random del campionato per una simulazione riproducibile).
+    info / other dipendono dal tipo di evento (vedi Event.to_wire).
+    """
+    # Determina quale squadra causa l'evento (con bias)
+    team = "home" if rng.random() < home_bias else "away"
+    team_data = home_team if team == "home" else away_team
+    team_name = team_data["name"]
+    
+    # Seleziona un giocatore casuale
+    players = team_data["players"]
+    player_index = rng.randrange(len(players))
+    player = players[player_index]
+    
+    info = None
+    other = None
+    
+    # Dettagli specifici per tipo di evento
+    if event_type == "goal":
+        # Tipo di goal
+        info = rng.choice(GOAL_TYPES)
+        
+        # Possibile assistente
+        if rng.random() < 0.7:  # 70% dei goal hanno un assist
+            other = pick_other_player(players, player_index, rng)
+    
+    elif event_type == "penalty":
+        # 75% di probabilità di segnare un rigore
+        scored = rng.random() < PENALTY_SCORED_PROB
+        info = PENALTY_SCORED if scored else PENALTY_MISSED
+    
+    elif event_type == "substitution":
+        # Solo dopo il 45° minuto
+        if minute < 45:
+            return None
+        other = pick_other_player(players, player_index, rng)  # entra al posto di player
+    
+    elif event_type == "injury":
+        info = rng.choice(INJURY_SEVERITIES)
+    
+    elif event_type == "yellow_card":
+        info = rng.choice(YELLOW_CARD_REASONS)
+    
+    elif event_type == "red_card":
+        info = rng.choice(RED_CARD_REASONS)
+    
+    return Event(minute, event_type, team, player, team_name, info, other)
+
+
+# ----------------------------------------------------------------------------
+# MOTORI
+# ----------------------------------------------------------------------------
+class MatchEngine(abc.ABC):
+    """Interfaccia dei motori di simulazione"""
+    name = None
+
+    @abc.abstractmethod
+    def play_minute(self, matches, rng):
+        """
+        Eventi del minuto in corso (match.minute, già avanzato dal campionato)
+        per tutti i match indicati: una lista di Event per match, nello stesso
+        ordine. Il campionato aggiunge gli eventi al match e aggiorna il punteggio.
+        """
+
+
+class ClassicEngine(MatchEngine):
+    """
+    Il modello originale: ogni tipo di evento ha una probabilità per minuto
+    (EVENT_PROBABILITIES per il moltiplicatore del periodo) e la squadra è
+    scelta con home_bias. È lo stesso modello di simulate_match_history().
+    """
+    name = "classic"
+
+    def play_minute(self, matches, rng):
+        results = []
+        for match in matches:
+            events = []
+            for event_type, adjusted_prob in get_event_probabilities(match.minute):
+                if rng.random() < adjusted_prob:
+                    event = generate_event(
+                        event_type, match.minute, match.home_data, match.away_data,
+                        match.home_bias, match.score["home"], match.score["away"], rng
+                    )
+                    if event:
+                        events.append(event)
+            results.append(events)
+        return results
+
+
+# CONFIGURAZIONE MODELLO xG
+# Ruoli come nel file delle squadre; modulo schierato dal motore xG
+GOALKEEPERS, DEFENDERS, MIDFIELDERS, FORWARDS = "goalkeepers", "defenders", "midfielders", "forwards"
+FORMATION = ((GOALKEEPERS, 1), (DEFENDERS, 4), (MIDFIELDERS, 4), (FORWARDS, 2))
+
+XG_SHOTS_PER_90 = 9.5           # Tiri per squadra in 90' con attacco pari alla difesa avversaria
+XG_SHOT_QUALITY = (             # (xG del tiro, frequenza cumulata): in media ~0.11 xG per tiro
+    (0.04, 0.45),
+    (0.09, 0.75),
+    (0.18, 0.92),
+    (0.40, 1.00),
+)
+XG_RATING_EXPONENT = 2.0        # Peso del rapporto attacco / difesa avversaria sui tiri
+XG_HOME_ADVANTAGE = 1.10        # Tiri in più della squadra di casa
+XG_MAN_DOWN_FACTOR = 0.80       # Tiri di una squadra per ogni uomo in meno dell'avversaria
+XG_CORNER_PROB = 0.30           # Tiri non segnati che finiscono in corner
+XG_ASSIST_PROB = 0.7            # Goal su azione con un assist
+
+# Altri eventi per squadra in 90' (prima del moltiplicatore del periodo)
+XG_EVENTS_PER_90 = {
+    "penalty": 0.16,
+    "offside": 2.0,
+    "yellow_card": 2.0,
+    "red_card": 0.06,
+    "injury": 0.35,
+}
+MAX_SUBSTITUTIONS = 5           # Cambi per squadra
+SUBSTITUTION_FROM_MINUTE = 55   # Cambi tattici solo da questo minuto (gli infortuni sempre)
+SUBSTITUTION_PROB = 0.09        # Probabilità per minuto di un cambio tattico
+FORCED_SUBSTITUTION = ("moderata", "grave")  # Infortuni che obbligano al cambio
+STRAIGHT_RED_REASONS = ("fallo grave", "condotta violenta")
+SECOND_YELLOW_REASON = "doppia ammonizione"
+
+# Peso di ogni ruolo nella scelta del giocatore protagonista (0 = mai)
+ROLE_WEIGHTS = {
+    "goal": {GOALKEEPERS: 0, DEFENDERS: 1, MIDFIELDERS: 3, FORWARDS: 6},
+    "assist": {GOALKEEPERS: 0, DEFENDERS: 2, MIDFIELDERS: 5, FORWARDS: 3},
+    "penalty": {GOALKEEPERS: 0, DEFENDERS: 1, MIDFIELDERS: 2, FORWARDS: 6},
+    "corner": {GOALKEEPERS: 0, DEFENDERS: 1, MIDFIELDERS: 4, FORWARDS: 1},
+    "offside": {GOALKEEPERS: 0, DEFENDERS: 0.2, MIDFIELDERS: 1, FORWARDS: 6},
+    "yellow_card": {GOALKEEPERS: 0.3, DEFENDERS: 4, MIDFIELDERS: 3, FORWARDS: 1.5},
+    "red_card": {GOALKEEPERS: 0.3, DEFENDERS: 4, MIDFIELDERS: 3, FORWARDS: 1.5},
+    "injury": {GOALKEEPERS: 0.3, DEFENDERS: 1, MIDFIELDERS: 1, FORWARDS: 1},
+    "substitution": {GOALKEEPERS: 0, DEFENDERS: 1, MIDFIELDERS: 1.5, FORWARDS: 2},
+}
+
+
+def team_roster(team):
+    """
+    Titolari e panchina di una squadra come tuple di (giocatore, ruolo).
+    Usa le rose per ruolo ("roles", vedi load_teams); senza ruoli il primo
+    giocatore è il portiere e gli altri centrocampisti.
+    """
+    roles = team.get("roles")
+    if not roles:
+        players = team["players"]
+        roles = {GOALKEEPERS: players[:1], MIDFIELDERS: players[1:]}
+
+    lineup, bench = [], []
+    wanted = dict(FORMATION)
+    for role, players in roles.items():
+        for index, player in enumerate(players):
+            (lineup if index < wanted.get(role, 0) else bench).append((player, role))
+    # Ruoli incompleti: si completa l'undici con i primi della panchina
+    while len(lineup) < 11 and bench:
+        lineup.append(bench.pop(0))
+    return tuple(lineup), tuple(bench)
+
+
+def pick_by_role(players, weights, rng, exclude=None):
+    """Un giocatore tra (giocatore, ruolo) con probabilità proporzionale al peso del ruolo"""
+    total = 0.0
+    for player, role in players:
+        if player != exclude:
+            total += weights.get(role, 0)
+    if total <= 0:
+        return None
+    r = rng.random() * total
+    chosen = None
+    for player, role in players:
+        weight = weights.get(role, 0)
+        if player == exclude or weight <= 0:
+            continue
+        chosen = player
+        r -= weight
+        if r < 0:
+            break
+    return chosen
+
+
+class TeamState:
+    """Chi è in campo per una squadra in un match, ammoniti, cambi ed espulsi"""
+    __slots__ = ("on_pitch", "bench", "booked", "injured", "substitutions", "sent_off")
+
+    def __init__(self, roster):
+        lineup, bench = roster
+        self.on_pitch = list(lineup)
+        self.bench = list(bench)
+        self.booked = set()
+        self.injured = []
+        self.substitutions = 0
+        self.sent_off = 0
+
+    def _remove(self, players, player):
+        for index, (name, role) in enumerate(players):
+            if name == player:
+                return players.pop(index)
+        return None
+
+    def apply(self, event):
+        """Aggiorna lo stato con un evento della squadra (generato o letto da un log)"""
+        if event.type == "yellow_card":
+            self.booked.add(event.player)
+        elif event.type == "red_card":
+            if self._remove(self.on_pitch, event.player):
+                self.sent_off += 1
+            if event.player in self.injured:
+                self.injured.remove(event.player)
+        elif event.type == "injury":
+            if event.info in FORCED_SUBSTITUTION:
+                self.injured.append(event.player)
+        elif event.type == "substitution":
+            out = self._remove(self.on_pitch, event.player)
+            entering = self._remove(self.bench, event.other)
+            if entering is None and out is not None:
+                entering = (event.other, out[1])
+            if entering is not None:
+                self.on_pitch.append(entering)
+            if event.player in self.injured:
+                self.injured.remove(event.player)
+            self.substitutions += 1
+
+    def substitute(self, player_out):
+        """Il primo della panchina con il ruolo di chi esce (o il primo in assoluto)"""
+        role = next((role for name, role in self.on_pitch if name == player_out), None)
+        for name, bench_role in self.bench:
+            if bench_role == role:
+                return name
+        return self.bench[0][0] if self.bench else None
+
+
+class MatchState:
+    """Stato del motore xG per un match, sincronizzato con match.events"""
+    __slots__ = ("events", "applied", "teams", "shot_prob")
+
+    def __init__(self, match, rosters):
+        self.events = match.events
+        self.applied = 0
+        self.teams = {"home": TeamState(rosters(match.home_data)),
+                      "away": TeamState(rosters(match.away_data))}
+        # Probabilità di tiro per minuto (a parità di uomini, prima del periodo)
+        self.shot_prob = {
+            "home": XGEngine.shot_rate(match.home_data, match.away_data) * XG_HOME_ADVANTAGE / 90,
+            "away": XGEngine.shot_rate(match.away_data, match.home_data) / 90,
+        }
+
+    def sync(self, match):
+        """Applica gli eventi del match non ancora visti (es. dopo un restore dal log)"""
+        for event in match.events[self.applied:]:
+            self.teams[event.team].apply(event)
+        self.applied = len(match.events)
+
+
+class XGEngine(MatchEngine):
+    """
+    Modello guidato dai valori delle squadre: a ogni minuto ciascuna squadra
+    tira con una probabilità che cresce con il rapporto tra il proprio
+    attacco e la difesa avversaria, ogni tiro ha un xG estratto da
+    XG_SHOT_QUALITY ed è goal con probabilità pari all'xG. I protagonisti
+    sono scelti per ruolo tra i giocatori in campo (i portieri non segnano);
+    espulsioni e sostituzioni cambiano chi è in campo e un uomo in meno
+    riduce i tiri della squadra.
+
+    Lo stato di ogni match è ricostruito dai suoi eventi: un campionato
+    ripristinato dal log riprende con le stesse formazioni.
+    """
+    name = "xg"
+
+    def __init__(self):
+        self._rosters = {}  # id squadra -> (titolari, panchina)
+        self._states = {}   # id match -> MatchState (solo i match in corso)
+
+    @staticmethod
+    def shot_rate(team, opponent):
+        """Tiri attesi in 90' di team contro opponent (a parità di uomini, senza fattore campo)"""
+        attack = team.get("attack", team["strength"])
+        defense = opponent.get("defense", opponent["strength"])
+        return XG_SHOTS_PER_90 * (attack / defense) ** XG_RATING_EXPONENT
+
+    def _roster(self, team):
+        roster = self._rosters.get(team["id"])
+        if roster is None:
+            roster = self._rosters[team["id"]] = team_roster(team)
+        return roster
+
+    def _state(self, match):
+        state = self._states.get(match.id)
+        # Eventi sostituiti (nuova giornata o restore): stato ricostruito da zero
+        if state is None or state.events is not match.events or state.applied > len(match.events):
+            state = MatchState(match, self._roster)
+        state.sync(match)
+        return state
+
+    def play_minute(self, matches, rng):
+        states = {match.id: self._state(match) for match in matches}
+        self._states = states  # i match finiti escono da soli
+        results = []
+        for match in matches:
+            state = states[match.id]
+            events = []
+            multiplier = get_period_multiplier(match.minute)
+            for team in ("home", "away"):
+                opponent = "away" if team == "home" else "home"
+                self._play_team(match, state, team, opponent, multiplier, rng, events)
+            state.applied += len(events)  # il campionato li aggiunge a match.events
+            results.append(events)
+        return results
+
+    def _play_team(self, match, state, team, opponent, multiplier, rng, events):
+        side = state.teams[team]
+        team_name = (match.home_data if team == "home" else match.away_data)["name"]
+        minute = match.minute
+
+        def emit(event_type, player, info=None, other=None):
+            event = Event(minute, event_type, team, player, team_name, info, other)
+            side.apply(event)
+            events.append(event)
+
+        # Sostituzioni: prima gli infortunati, poi i cambi tattici
+        if side.substitutions < MAX_SUBSTITUTIONS and side.bench:
+            player_out = side.injured[0] if side.injured else None
+            if player_out is None and minute >= SUBSTITUTION_FROM_MINUTE and rng.random() < SUBSTITUTION_PROB:
+                player_out = pick_by_role(side.on_pitch, ROLE_WEIGHTS["substitution"], rng)
+            if player_out is not None:
+                emit("substitution", player_out, other=side.substitute(player_out))
+
+        # Tiri: meno tiri con uomini in meno, più tiri contro una squadra in inferiorità
+        man_advantage = XG_MAN_DOWN_FACTOR ** (side.sent_off - state.teams[opponent].sent_off)
+        if rng.random() < state.shot_prob[team] * man_advantage * multiplier:
+            r = rng.random()
+            xg = next(value for value, cumulative in XG_SHOT_QUALITY if r < cumulative)
+            if rng.random() < xg:
+                scorer = pick_by_role(side.on_pitch, ROLE_WEIGHTS["goal"], rng)
+                if scorer is not None:
+                    assist = None
+                    if rng.random() < XG_ASSIST_PROB:
+                        assist = pick_by_role(side.on_pitch, ROLE_WEIGHTS["assist"], rng, exclude=scorer)
+                    emit("goal", scorer, rng.choice(GOAL_TYPES), assist)
+            elif rng.random() < XG_CORNER_PROB:
+                taker = pick_by_role(side.on_pitch, ROLE_WEIGHTS["corner"], rng)
+                if taker is not None:
+                    emit("corner", taker)
+
+        # Altri eventi (per squadra, scalati dal periodo della partita)
+        for event_type, per_90 in XG_EVENTS_PER_90.items():
+            if rng.random() >= per_90 / 90 * multiplier:
+                continue
+            player = pick_by_role(side.on_pitch, ROLE_WEIGHTS[event_type], rng)
+            if player is None:
+                continue
+            if event_type == "penalty":
+                scored = rng.random() < PENALTY_SCORED_PROB
+                emit("penalty", player, PENALTY_SCORED if scored else PENALTY_MISSED)
+            elif event_type == "yellow_card":
+                second = player in side.booked
+                emit("yellow_card", player, rng.choice(YELLOW_CARD_REASONS))
+                if second:
+                    emit("red_card", player, SECOND_YELLOW_REASON)
+            elif event_type == "red_card":
+                emit("red_card", player, rng.choice(STRAIGHT_RED_REASONS))
+            elif event_type == "injury":
+                emit("injury", player, rng.choice(INJURY_SEVERITIES))
+            else:
+                emit(event_type, player)
+
+
+ENGINES = {engine.name: engine for engine in (ClassicEngine, XGEngine)}
+DEFAULT_ENGINE = ClassicEngine.name
+
+
+def create_engine(name=None):
+    """Nuova istanza del motore indicato (ogni campionato ha la sua)"""
+    try:
+        return ENGINES[name or DEFAULT_ENGINE]()
+    except KeyError:
+        raise ValueError(f"Motore di simulazione sconosciuto: {name}") from None
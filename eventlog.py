@@ -0,0 +1,257 @@
+"""
+Log append-only della simulazione di un campionato, con replay veloce.
+
+Il log è un file JSONL (una riga compatta per record) scritto solo in coda:
+- "header":   campionato e seme della simulazione (prima riga)
+- "tick":     il batch prodotto da Championship.tick(): eventi generati,
+              cambi di stato, minuti, punteggi e numeri di sequenza
+- "results":  stato finale dei match di una giornata appena conclusa
+- "snapshot": classifica e stato dei match della giornata in corso,
+              scritto a inizio giornata e poi ogni snapshot_every minuti
+
+Un indice (<log>.idx, anch'esso JSONL) registra la posizione in byte di
+ogni "results" e "snapshot". Per ricostruire lo stato a (giornata, minuto)
+restore() legge i risultati delle giornate precedenti, salta allo snapshot
+più vicino e applica solo i tick successivi, senza rigiocare la stagione.
+
+Il generatore casuale di ogni tick è derivato da (seme, tick): dopo un
+restore() la simulazione riprende esattamente da dove si era fermata.
+
+Uso da riga di comando:
+    python eventlog.py logs/serie_a.jsonl [--matchday N] [--minute M]
+"""
+import argparse
+import json
+import os
+import sys
+
+LOG_FORMAT = 1
+DEFAULT_SNAPSHOT_EVERY = 15  # minuti di gioco tra due snapshot della stessa giornata
+
+
+def encode_record(record):
+    return (json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def read_index(path):
+    """Voci dell'indice di un log (in ordine di scrittura)"""
+    entries = []
+    try:
+        with open(path + ".idx", "rb") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    break  # riga troncata da un crash: il resto non è affidabile
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def read_record(f, offset):
+    """Legge il record che inizia all'offset indicato"""
+    f.seek(offset)
+    return json.loads(f.readline())
+
+
+def iter_records(f, offset=0):
+    """
+    Record dall'offset indicato fino alla fine del file, come (offset, record).
+    Si ferma alla prima riga incompleta (scrittura interrotta da un crash).
+    """
+    f.seek(offset)
+    while True:
+        line = f.readline()
+        if not line.endswith(b"\n"):
+            return
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return
+        yield offset, record
+        offset += len(line)
+
+
+def valid_length(path):
+    """Lunghezza della parte integra del log (esclusa un'eventuale riga troncata)"""
+    end = 0
+    with open(path, "rb") as f:
+        for offset, record in iter_records(f):
+            end = f.tell()
+    return end
+
+
+class EventLog:
+    """
+    Scrittura del log di un campionato. I record sono scritti e passati al
+    sistema operativo a ogni tick: un crash del processo perde al massimo
+    il tick in corso.
+    """
+
+    def __init__(self, path, snapshot_every=DEFAULT_SNAPSHOT_EVERY):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.index = read_index(path) if os.path.exists(path) else []
+        if os.path.exists(path):
+            # Scarta la coda scritta a metà e le voci d'indice che la puntano
+            end = valid_length(path)
+            with open(path, "r+b") as f:
+                f.truncate(end)
+            self.index = [entry for entry in self.index if entry["offset"] < end]
+            with open(path + ".idx", "wb") as f:
+                f.writelines(encode_record(entry) for entry in self.index)
+
+        self._file = open(path, "ab")
+        self._index_file = open(path + ".idx", "ab")
+        self._results = {entry["matchday"] for entry in self.index if entry["type"] == "results"}
+        self._last_snapshot = None
+
+    def _write(self, record, indexed=False):
+        offset = self._file.tell()
+        self._file.write(encode_record(record))
+        if indexed:
+            entry = {"type": record["type"], "tick": record["tick"], "matchday": record["matchday"],
+                     "minute": record.get("minute", 0), "offset": offset}
+            self.index.append(entry)
+            self._index_file.write(encode_record(entry))
+
+    def _flush(self):
+        self._file.flush()
+        self._index_file.flush()
+
+    def start(self, championship):
+        """
+        Da chiamare prima del primo tick (log nuovo) o dopo restore() (ripresa):
+        scrive l'intestazione se manca, i risultati delle giornate concluse che
+        mancano e uno snapshot dello stato attuale.
+        """
+        if self._file.tell() == 0:
+            self._write({"type": "header", "format": LOG_FORMAT,
+                         "league": championship.league_id, "seed": championship.seed})
+        for matchday in range(1, championship.current_matchday):
+            if matchday not in self._results:
+                self._write_results(championship, matchday)
+        self._write_snapshot(championship)
+        self._flush()
+
+    def record(self, championship, batch):
+        """Aggiunge al log il batch di un tick (dopo Championship.tick())"""
+        self._write({"type": "tick", **batch})
+
+        # Risultati delle giornate concluse (anche più di una in un batch di recupero)
+        last_finished = championship.current_matchday - (0 if batch["season_over"] else 1)
+        for matchday in range(1, last_finished + 1):
+            if matchday not in self._results:
+                self._write_results(championship, matchday)
+        if not batch["season_over"] and (
+                batch["started_matchday"] is not None
+                or championship.tick_count - self._last_snapshot >= self.snapshot_every):
+            self._write_snapshot(championship)
+        self._flush()
+
+    def _write_results(self, championship, matchday):
+        match_ids = list(championship.matchday_index.get(matchday, ()))
+        self._write({"type": "results", "tick": championship.tick_count, "matchday": matchday,
+                     "matches": championship.match_states(match_ids)}, indexed=True)
+        self._results.add(matchday)
+
+    def _write_snapshot(self, championship):
+        match_ids = list(championship.matchday_index.get(championship.current_matchday, ()))
+        self._write({"type": "snapshot", "tick": championship.tick_count,
+                     "matchday": championship.current_matchday,
+                     "minute": championship.matchday_minute,
+                     "standings": championship.standings,
+                     "matches": championship.match_states(match_ids)}, indexed=True)
+        self._last_snapshot = championship.tick_count
+
+    def close(self):
+        self._file.close()
+        self._index_file.close()
+
+
+def restore(championship, path, matchday=None, minute=None):
+    """
+    Ricostruisce in championship (appena creato, con lo stesso calendario)
+    lo stato registrato nel log all'ultimo tick non successivo al minuto
+    indicato della giornata indicata, o alla fine del log se matchday è None.
+    Restituisce il numero del tick raggiunto; solleva ValueError se il log è
+    di un altro campionato o non ha snapshot prima di quel momento.
+    """
+    index = read_index(path)
+    target = None if matchday is None else (matchday, minute or 0)
+
+    with open(path, "rb") as f:
+        header = read_record(f, 0)
+        if header.get("type") != "header" or header.get("league") != championship.league_id:
+            raise ValueError(f"{path} non è il log del campionato {championship.league_id}")
+        championship.seed = header["seed"]
+
+        # Snapshot più recente che non supera il momento richiesto
+        snapshots = [entry for entry in index if entry["type"] == "snapshot"
+                     and (target is None or (entry["matchday"], entry["minute"]) <= target)]
+        if not snapshots:
+            raise ValueError(f"Nessuno snapshot nel log prima di {target}")
+        snapshot_entry = snapshots[-1]
+
+        # Giornate già concluse: solo il loro stato finale
+        for entry in index:
+            if entry["type"] == "results" and entry["matchday"] < snapshot_entry["matchday"]:
+                championship.restore_matches(read_record(f, entry["offset"])["matches"])
+
+        snapshot = read_record(f, snapshot_entry["offset"])
+        championship.restore_standings(snapshot["standings"])
+        championship.restore_matches(snapshot["matches"])
+        championship.current_matchday = snapshot["matchday"]
+        championship.matchday_minute = snapshot["minute"]
+        championship.tick_count = snapshot["tick"]
+
+        # Solo i tick tra lo snapshot e il momento richiesto
+        for offset, record in iter_records(f, snapshot_entry["offset"]):
+            if record["type"] != "tick" or record["tick"] <= championship.tick_count:
+                continue
+            if target is not None and (record["matchday"], record["minute"]) > target:
+                break
+            championship.apply_batch(record)
+
+    return championship.tick_count
+
+
+def main():
+    import server
+
+    parser = argparse.ArgumentParser(description="Ricostruisce lo stato di un campionato dal log")
+    parser.add_argument("path")
+    parser.add_argument("--league", default=server.DEFAULT_LEAGUE)
+    parser.add_argument("--matchday", type=int)
+    parser.add_argument("--minute", type=int, default=0)
+    args = parser.parse_args()
+    if not os.path.exists(args.path):
+        sys.exit(f"{args.path}: file non trovato")
+
+    championship = server.create_league(args.league)
+    try:
+        tick = restore(championship, args.path, args.matchday, args.minute if args.matchday else None)
+    except ValueError as e:
+        sys.exit(str(e))
+    print_summary(championship, f"tick {tick}, seme {championship.seed}")
+
+
+def print_summary(championship, details):
+    """Stato ripristinato da riga di comando (anche statestore.py): giornata in corso e prime in classifica"""
+    print(f"\n{championship.name} - giornata {championship.current_matchday}, "
+          f"minuto {championship.matchday_minute} ({details})\n")
+    for mid in championship.matchday_index.get(championship.current_matchday, ()):
+        match = championship.matches[mid]
+        print(f"{match.home:>18} {match.score['home']}-{match.score['away']} "
+              f"{match.away:<18} {match.status} {match.minute}'")
+    print()
+    for row in championship.get_sorted_standings()[:5]:
+        print(f"{row['position']:>2}. {row['name']:<18} {row['points']:>3} pt")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+Metriche e profilazione del server.
+
+- Counter, Gauge e Histogram esposti nel formato testo di Prometheus
+  (GET /metrics del server). Un Gauge o un Counter può avere una funzione
+  letta solo al momento dello scrape: nessun costo sul percorso caldo per i
+  valori che esistono già (client connessi, code, contatori del broadcast).
+- LoopLagMonitor: ritardo dell'event loop, cioè di quanto un callback parte
+  dopo il previsto (tick lenti, json.dumps grandi, I/O bloccante).
+- SamplingProfiler: profiler a campionamento attivabile a caldo, senza
+  riavviare il processo (POST /debug/profile del server).
+"""
+import asyncio
+import bisect
+import collections
+import sys
+import threading
+import time
+
+# Bucket (limiti superiori) predefiniti degli istogrammi, in secondi
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Metric:
+    """Base delle metriche: nome, descrizione, nomi delle etichette e valori per combinazione di etichette"""
+    kind = None
+
+    def __init__(self, name, help, labels=(), function=None):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        # function(): valore (senza etichette) o dict {tupla di etichette: valore}
+        self.function = function
+        self._values = {}
+
+    def values(self):
+        if self.function is None:
+            return self._values.items()
+        value = self.function()
+        return value.items() if isinstance(value, dict) else [((), value)]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in sorted(self.values()):
+            lines.append(f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, *labels):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, *labels):
+        self._values[labels] = value
+
+
+class Histogram(Metric):
+    """Istogramma cumulativo a bucket fissi (osservazione: una bisect e tre somme)"""
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        state = self._values.get(labels)
+        if state is None:
+            # conteggi per bucket (l'ultimo è +Inf), somma, numero di osservazioni
+            state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = ("le", _format_value(float(bound)))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, labels)} {count}")
+        return lines
+
+
+class Registry:
+    """Insieme delle metriche di un processo, esportate con render()"""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def _add(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metrica già registrata: {metric.name}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=(), function=None):
+        return self._add(Counter(name, help, labels, function))
+
+    def gauge(self, name, help, labels=(), function=None):
+        return self._add(Gauge(name, help, labels, function))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def render(self):
+        """Tutte le metriche nel formato testo di Prometheus (versione 0.0.4)"""
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class LoopLagMonitor:
+    """
+    Misura il ritardo dell'event loop: si addormenta per `interval` secondi
+    e registra di quanto si è svegliato in ritardo. Un ritardo alto vuol
+    dire che qualcosa occupa il loop senza restituire il controllo.
+    """
+
+    def __init__(self, histogram, interval=0.5):
+        self.histogram = histogram
+        self.interval = interval
+        self.last = 0.0
+        self.max = 0.0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.last = max(0.0, loop.time() - expected)
+            self.max = max(self.max, self.last)
+            self.histogram.observe(self.last)
+
+
+class SamplingProfiler:
+    """
+    Profiler a campionamento: un thread legge ogni `interval` secondi lo
+    stack del thread osservato (sys._current_frames) e conta gli stack visti.
+    A differenza di cProfile non c'è un hook su ogni chiamata: il costo è
+    solo quello dei campioni, quindi si può accendere in produzione.
+    """
+
+    def __init__(self, max_depth=64):
+        self.max_depth = max_depth
+        self.stacks = collections.Counter()  # tupla di funzioni (radice -> foglia) -> campioni
+        self.samples = 0
+        self.interval = None
+        self.started = None
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        # Il thread di campionamento scrive stacks mentre una richiesta legge il report
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, thread_id=None, interval=0.005, duration=None):
+        """Azzera i campioni e inizia a campionare thread_id (default: il thread chiamante)"""
+        if self.running:
+            raise RuntimeError("Profiler già attivo")
+        with self._lock:
+            self.stacks.clear()
+            self.samples = 0
+        self.interval = interval
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+        self._stop.clear()
+        target = threading.get_ident() if thread_id is None else thread_id
+        self._thread = threading.Thread(target=self._run, args=(target, interval, duration),
+                                        name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _run(self, target, interval, duration):
+        deadline = None if duration is None else self.started + duration
+        while not self._stop.wait(interval):
+            frame = sys._current_frames().get(target)
+            if frame is None:
+                break  # thread terminato
+            self._record(frame)
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+        self.elapsed = time.monotonic() - self.started
+
+    def _record(self, frame):
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            code = frame.f_code
+            stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+            frame = frame.f_back
+        stack.reverse()
+        with self._lock:
+            self.stacks[tuple(stack)] += 1
+            self.samples += 1
+
+    def _snapshot(self):
+        """(copia degli stack, campioni): letti anche mentre il profiler è attivo"""
+        with self._lock:
+            return collections.Counter(self.stacks), self.samples
+
+    @staticmethod
+    def _label(function):
+        name, filename, line = function
+        return f"{name} ({filename.rsplit('/', 1)[-1]}:{line})"
+
+    def collapsed(self):
+        """Stack nel formato "radice;...;foglia campioni" (flamegraph.pl, speedscope)"""
+        stacks, _ = self._snapshot()
+        return "\n".join(";".join(self._label(f) for f in stack) + f" {count}"
+                         for stack, count in stacks.most_common()) + "\n"
+
+    def report(self, limit=30):
+        """Funzioni con più campioni: propri (funzione in cima allo stack) e totali (funzione nello stack)"""
+        stacks, sampled = self._snapshot()
+        own = collections.Counter()
+        total = collections.Counter()
+        for stack, count in stacks.items():
+            own[stack[-1]] += count
+            for function in set(stack):
+                total[function] += count
+        elapsed = self.elapsed if not self.running else time.monotonic() - self.started
+        samples = max(sampled, 1)
+        lines = [f"{'attivo' if self.running else 'fermo'}: {sampled} campioni in {elapsed:.1f} s "
+                 f"(intervallo {(self.interval or 0) * 1000:g} ms)", "",
+                 f"{'propri':>8} {'totali':>8}  funzione"]
+        for function in sorted(total, key=lambda f: (own[f], total[f]), reverse=True)[:limit]:
+            lines.append(f"{own[function] / samples:>8.1%} {total[function] / samples:>8.1%}  "
+                         f"{self._label(function)}")
+        return "\n".join(lines) + "\n"
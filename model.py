@@ -0,0 +1,143 @@
+"""
+Modello compatto di match ed eventi.
+
+Match ed Event usano __slots__: niente dizionario per istanza, solo i
+riferimenti ai campi. Le stringhe ripetute (tipo di evento, squadra,
+giocatore, dettagli) sono sempre lo stesso oggetto: quelle generate dalla
+simulazione arrivano già dai dati delle squadre, quelle lette dal log o
+da un altro processo passano da sys.intern().
+
+Il formato wire (i dict JSON inviati ai client e scritti nel log) non
+cambia: to_wire() / from_wire() convertono in entrambe le direzioni.
+"""
+import sys
+
+PENALTY_SCORED = "segnato"
+PENALTY_MISSED = "sbagliato"
+
+# Tutti i tipi di evento prodotti dai motori di simulazione
+EVENT_TYPES = ("goal", "penalty", "yellow_card", "red_card", "substitution", "injury", "corner", "offside")
+
+# Campo del formato wire che contiene Event.info, per tipo di evento
+INFO_FIELDS = {
+    "goal": "detail",
+    "penalty": "detail",
+    "injury": "severity",
+    "yellow_card": "reason",
+    "red_card": "reason",
+}
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Event:
+    """
+    Evento di una partita. info e other hanno un significato diverso a
+    seconda del tipo (vedi to_wire): dettaglio/gravità/motivo e
+    assistman/giocatore entrato.
+    """
+    __slots__ = ("minute", "type", "team", "player", "team_name", "info", "other")
+
+    def __init__(self, minute, type, team, player, team_name, info=None, other=None):
+        self.minute = minute
+        self.type = type
+        self.team = team
+        self.player = player
+        self.team_name = team_name
+        self.info = info
+        self.other = other
+
+    @property
+    def scored(self):
+        """True se l'evento cambia il punteggio (goal o rigore trasformato)"""
+        if self.type == "goal":
+            return True
+        return self.type == "penalty" and self.info == PENALTY_SCORED
+
+    def to_wire(self):
+        event = {
+            "minute": self.minute,
+            "type": self.type,
+            "team": self.team,
+            "player": self.player,
+            "team_name": self.team_name
+        }
+        if self.type in ("goal", "penalty"):
+            event["scored"] = self.scored
+        if self.type in INFO_FIELDS:
+            event[INFO_FIELDS[self.type]] = self.info
+        if self.type == "goal" and self.other is not None:
+            event["assist"] = self.other
+        elif self.type == "substitution":
+            event["player_in"] = self.other
+            event["player_out"] = self.player
+        return event
+
+    @classmethod
+    def from_wire(cls, event):
+        event_type = event["type"]
+        if event_type == "substitution":
+            other = event.get("player_in")
+        else:
+            other = event.get("assist")
+        return cls(event["minute"], _intern(event_type), _intern(event["team"]),
+                   _intern(event["player"]), _intern(event["team_name"]),
+                   _intern(event.get(INFO_FIELDS.get(event_type))), _intern(other))
+
+
+class Match:
+    """
+    Partita del calendario. Le squadre sono riferimenti ai dati completi
+    (mai inviati ai client): id e nomi si leggono da lì.
+    """
+    __slots__ = ("id", "matchday", "home_data", "away_data", "home_bias", "status", "minute",
+                 "score", "events", "half", "injury_time", "seq", "standings_updated")
+
+    def __init__(self, match_id, matchday, home_data, away_data):
+        self.id = match_id
+        self.matchday = matchday
+        self.home_data = home_data
+        self.away_data = away_data
+        self.home_bias = 0.5  # probabilità che un evento sia della squadra di casa
+        self.status = "scheduled"
+        self.minute = 0
+        self.score = {"home": 0, "away": 0}
+        self.events = []
+        self.half = 1
+        self.injury_time = 0
+        self.seq = 0
+        self.standings_updated = False  # evita il doppio aggiornamento della classifica
+
+    @property
+    def home_id(self):
+        return self.home_data["id"]
+
+    @property
+    def away_id(self):
+        return self.away_data["id"]
+
+    @property
+    def home(self):
+        return self.home_data["name"]
+
+    @property
+    def away(self):
+        return self.away_data["name"]
+
+    def to_wire(self):
+        """Stato completo del match nel formato inviato ai client"""
+        return {
+            "id": self.id,
+            "matchday": self.matchday,
+            "home_id": self.home_id,
+            "away_id": self.away_id,
+            "status": self.status,
+            "minute": self.minute,
+            "score": self.score,
+            "events": [event.to_wire() for event in self.events],
+            "half": self.half,
+            "injury_time": self.injury_time,
+            "seq": self.seq
+        }
@@ -0,0 +1,405 @@
+"""
+Previsioni Monte Carlo sul campionato: probabilità di ogni posizione finale
+(scudetto, zona Champions, retrocessione) per ogni squadra.
+
+Il loop live simula minuto per minuto con random.random() per ogni tipo di
+evento: troppo lento per centinaia di migliaia di stagioni. Qui invece:
+1. per ogni partita ancora da giocare si calcola la distribuzione ESATTA del
+   risultato finale, propagando minuto per minuto (vettorialmente su tutte
+   le partite) le probabilità di gol del motore del campionato (vedi
+   engine.py), con gli stessi PERIOD_MULTIPLIERS e recupero casuale del
+   simulatore live:
+   - "classic": EVENT_PROBABILITIES, bias di casa e rigori;
+   - "xg": tiri per minuto dai valori delle squadre per l'xG medio di un
+     tiro, più i rigori trasformati, indipendenti per le due squadre. Gli
+     espulsi contano quelli già avvenuti nei match in corso, non quelli
+     futuri (cambiano poco il risultato atteso);
+2. le stagioni si estraggono in blocco con NumPy: un solo numero casuale
+   per partita per stagione (metodo alias), poi classifica e ordinamento
+   vettoriali.
+
+I match in corso ripartono dal minuto e dal punteggio attuali, quelli finiti
+sono già nella classifica.
+
+Uso:
+    python montecarlo.py [--seasons 100000] [--seed 42] [--json previsioni.json]
+    python montecarlo.py --validate 20000   # confronto con il simulatore scalare
+"""
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+
+import engine
+import server
+
+MAX_GOALS = 16           # gol per squadra considerati (oltre, probabilità trascurabile)
+DEFAULT_CHUNK = 20000    # stagioni per blocco (limita la memoria a qualche centinaio di MB)
+CHAMPIONS_SPOTS = 4      # posizioni valide per la Champions League
+RELEGATION_SPOTS = 3     # ultime posizioni retrocesse
+
+
+def capture_state(championship):
+    """
+    Fotografa lo stato del campionato in strutture semplici. Va chiamata nel
+    thread dell'event loop; forecast() può poi girare in un altro thread.
+    """
+    team_ids = [team["id"] for team in championship.teams]
+    team_index = {team_id: i for i, team_id in enumerate(team_ids)}
+    standings = championship.standings
+    engine_name = championship.engine.name
+
+    fixtures = []
+    for match in championship.matches.values():
+        if match.status == "finished":
+            continue
+        live = match.status == "live"
+        fixtures.append({
+            "home": team_index[match.home_id],
+            "away": team_index[match.away_id],
+            "params": fixture_params(engine_name, match, live),
+            "minute": match.minute if live else 0,
+            "score": (match.score["home"], match.score["away"]) if live else (0, 0),
+            # Il recupero del 2° tempo è noto solo dal 90° in poi
+            "injury_time": match.injury_time if live and match.minute >= 90 else None,
+        })
+
+    return {
+        "engine": engine_name,
+        "team_ids": team_ids,
+        "names": [standings[team_id]["name"] for team_id in team_ids],
+        "points": [standings[team_id]["points"] for team_id in team_ids],
+        "goals_for": [standings[team_id]["goals_for"] for team_id in team_ids],
+        "goals_against": [standings[team_id]["goals_against"] for team_id in team_ids],
+        "fixtures": fixtures,
+    }
+
+
+def fixture_params(engine_name, match, live):
+    """
+    Parametri di una partita per la distribuzione del suo motore: il bias di
+    casa ("classic") o la probabilità per minuto di un gol su azione di casa
+    e ospiti prima del moltiplicatore del periodo ("xg")
+    """
+    if engine_name == "classic":
+        return engine.get_home_bias(match.home_data, match.away_data)
+    if engine_name != "xg":
+        raise ValueError(f"Previsioni non disponibili per il motore {engine_name}")
+    sent_off = {"home": 0, "away": 0}
+    if live:
+        for event in match.events:
+            if event.type == "red_card":
+                sent_off[event.team] += 1
+    man_advantage = engine.XG_MAN_DOWN_FACTOR ** (sent_off["home"] - sent_off["away"])
+    home = engine.XGEngine.shot_rate(match.home_data, match.away_data) * engine.XG_HOME_ADVANTAGE / 90
+    away = engine.XGEngine.shot_rate(match.away_data, match.home_data) / 90
+    return (home * man_advantage * XG_MEAN_SHOT, away / man_advantage * XG_MEAN_SHOT)
+
+
+# ============================================================================
+# DISTRIBUZIONE ESATTA DEL RISULTATO
+# ============================================================================
+# xG medio di un tiro del motore xG (XG_SHOT_QUALITY è cumulata)
+XG_MEAN_SHOT = sum(value * (cumulative - previous) for (value, cumulative), previous in zip(
+    engine.XG_SHOT_QUALITY, (0.0, ) + tuple(cumulative for _, cumulative in engine.XG_SHOT_QUALITY)))
+
+
+def _shift_home(p):
+    """Un gol in più per la squadra di casa (la massa oltre MAX_GOALS resta sull'ultima riga)"""
+    out = np.zeros_like(p)
+    out[:, 1:, :] = p[:, :-1, :]
+    out[:, -1, :] += p[:, -1, :]
+    return out
+
+
+def _shift_away(p):
+    out = np.zeros_like(p)
+    out[:, :, 1:] = p[:, :, :-1]
+    out[:, :, -1] += p[:, :, -1]
+    return out
+
+
+def _propagate(step, num_fixtures, start_minute, start_score, injury_time):
+    """
+    Distribuzione del risultato finale per un gruppo di partite che partono
+    dallo stesso minuto e punteggio: array (F, G, G) con P[f, gol casa, gol ospiti].
+    step(p, moltiplicatore del periodo) applica un minuto di gioco.
+
+    Come nel loop live: gli eventi avvengono nei minuti 1..89+recupero e la
+    partita finisce al minuto 90+recupero, con recupero uniforme in
+    SECOND_HALF_INJURY_TIME (se non è già noto).
+    """
+    p = np.zeros((num_fixtures, MAX_GOALS + 1, MAX_GOALS + 1))
+    p[:, min(start_score[0], MAX_GOALS), min(start_score[1], MAX_GOALS)] = 1.0
+
+    lo, hi = server.SECOND_HALF_INJURY_TIME if injury_time is None else (injury_time, injury_time)
+    weight = 1.0 / (hi - lo + 1)
+
+    result = np.zeros_like(p)
+    # Recuperi già superati (la partita è all'ultimo minuto)
+    for it in range(lo, hi + 1):
+        if 89 + it <= start_minute:
+            result += weight * p
+
+    for minute in range(start_minute + 1, 89 + hi + 1):
+        p = step(p, engine.get_period_multiplier(minute))
+        if lo <= minute - 89 <= hi:
+            result += weight * p
+
+    return result
+
+
+def score_distributions(bias, start_minute=0, start_score=(0, 0), injury_time=None):
+    """Distribuzioni (F, G, G) del motore "classic" per partite con i bias di casa indicati"""
+    bias = np.asarray(bias, dtype=float)[:, None, None]
+    goal_prob = engine.EVENT_PROBABILITIES["goal"]
+    penalty_prob = engine.EVENT_PROBABILITIES["penalty"]
+    scored = engine.PENALTY_SCORED_PROB
+
+    def step(p, multiplier):
+        # Goal: al più uno per minuto, della squadra di casa con probabilità bias
+        g = goal_prob * multiplier
+        p = (1 - g) * p + g * (bias * _shift_home(p) + (1 - bias) * _shift_away(p))
+        # Rigore: evento indipendente dal goal, trasformato con probabilità PENALTY_SCORED_PROB
+        r = penalty_prob * multiplier
+        return (1 - r * scored) * p + r * scored * (bias * _shift_home(p) + (1 - bias) * _shift_away(p))
+
+    return _propagate(step, len(bias), start_minute, start_score, injury_time)
+
+
+def xg_score_distributions(rates, start_minute=0, start_score=(0, 0), injury_time=None):
+    """
+    Distribuzioni (F, G, G) del motore "xg": rates sono le coppie (casa,
+    ospiti) di fixture_params. Le due squadre segnano in modo indipendente,
+    anche nello stesso minuto; il rigore è un evento a parte.
+    """
+    rates = np.asarray(rates, dtype=float).reshape(-1, 2)
+    home = rates[:, 0, None, None]
+    away = rates[:, 1, None, None]
+    penalty = engine.XG_EVENTS_PER_90["penalty"] / 90 * engine.PENALTY_SCORED_PROB
+
+    def score(p, h, a):
+        h = np.minimum(h, 1.0)
+        a = np.minimum(a, 1.0)
+        home_scored = _shift_home(p)
+        return ((1 - h) * (1 - a) * p + h * (1 - a) * home_scored
+                + (1 - h) * a * _shift_away(p) + h * a * _shift_away(home_scored))
+
+    def step(p, multiplier):
+        p = score(p, home * multiplier, away * multiplier)
+        return score(p, penalty * multiplier, penalty * multiplier)
+
+    return _propagate(step, len(rates), start_minute, start_score, injury_time)
+
+
+DISTRIBUTIONS = {"classic": score_distributions, "xg": xg_score_distributions}
+
+
+def fixture_distributions(fixtures, engine_name="classic"):
+    """Distribuzioni (F, G, G) di tutte le partite; quelle non iniziate in un solo passaggio"""
+    distributions = DISTRIBUTIONS[engine_name]
+    dists = np.zeros((len(fixtures), MAX_GOALS + 1, MAX_GOALS + 1))
+    scheduled = np.array([f["minute"] == 0 and f["score"] == (0, 0) for f in fixtures], dtype=bool)
+    if scheduled.any():
+        dists[scheduled] = distributions([f["params"] for f, new in zip(fixtures, scheduled) if new])
+
+    for i, f in enumerate(fixtures):
+        if not scheduled[i]:
+            dists[i] = distributions([f["params"]], f["minute"], f["score"], f["injury_time"])[0]
+    return dists
+
+
+# ============================================================================
+# ESTRAZIONE DELLE STAGIONI
+# ============================================================================
+def alias_tables(pmf):
+    """
+    Tabelle del metodo alias (Walker/Vose) per ogni riga di pmf (F, K):
+    permettono di estrarre da una distribuzione discreta in tempo costante.
+    """
+    num_rows, size = pmf.shape
+    prob = np.ones((num_rows, size))
+    alias = np.tile(np.arange(size), (num_rows, 1))
+    for row in range(num_rows):
+        scaled = (pmf[row] * (size / pmf[row].sum())).tolist()
+        small = [k for k, x in enumerate(scaled) if x < 1.0]
+        large = [k for k, x in enumerate(scaled) if x >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            prob[row, s] = scaled[s]
+            alias[row, s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+    return prob, alias
+
+
+def _sample_scores(rng, prob, alias, num_seasons):
+    """
+    Estrae i risultati (num_seasons, F) con un solo numero casuale per partita:
+    la parte intera di u*K sceglie la colonna, la parte frazionaria decide
+    tra colonna e alias.
+    """
+    num_fixtures, size = prob.shape
+    scaled = rng.random((num_seasons, num_fixtures)) * size
+    column = scaled.astype(np.int64)
+    slot = column + np.arange(num_fixtures) * size
+    index = np.where(scaled - column < prob.ravel()[slot], column, alias.ravel()[slot])
+    return np.divmod(index, MAX_GOALS + 1)
+
+
+def _position_counts(state, home_matrix, away_matrix, home_goals, away_goals, name_rank):
+    """Classifiche finali di un blocco di stagioni -> conteggi (squadra, posizione)"""
+    num_seasons = home_goals.shape[0]
+    num_teams = len(state["team_ids"])
+
+    # Somme per squadra come prodotto con le matrici di incidenza partita -> squadra
+    def total(base, home_values, away_values):
+        values = home_values @ home_matrix + away_values @ away_matrix
+        return values.astype(np.int64) + np.asarray(base, dtype=np.int64)
+
+    home_goals = home_goals.astype(np.float64)
+    away_goals = away_goals.astype(np.float64)
+    draws = home_goals == away_goals
+    points = total(state["points"], 3 * (home_goals > away_goals) + draws, 3 * (away_goals > home_goals) + draws)
+    goals_for = total(state["goals_for"], home_goals, away_goals)
+    goals_against = total(state["goals_against"], away_goals, home_goals)
+
+    # Stesso ordinamento di standings_key (punti, differenza reti, gol fatti,
+    # gol subiti, nome) compresso in un'unica chiave intera a base mista
+    goal_diff = goals_for - goals_against
+    key = points
+    for value, low, high in ((goal_diff, goal_diff.min(), goal_diff.max()),
+                             (goals_for, 0, goals_for.max()),
+                             (goals_against.max() - goals_against, 0, goals_against.max())):
+        key = key * (high - low + 1) + (value - low)
+    key = key * num_teams + name_rank
+    order = np.argsort(-key, axis=1)
+
+    positions = np.tile(np.arange(num_teams), num_seasons)
+    counts = np.bincount(order.ravel() * num_teams + positions, minlength=num_teams * num_teams)
+    return counts.reshape(num_teams, num_teams), points.sum(axis=0)
+
+
+def forecast(state, num_seasons, seed=None, chunk=DEFAULT_CHUNK):
+    """
+    Simula num_seasons completamenti della stagione e restituisce, per ogni
+    squadra, le probabilità di ogni posizione finale.
+    """
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    num_teams = len(state["team_ids"])
+    fixtures = state["fixtures"]
+
+    home_matrix = np.zeros((len(fixtures), num_teams))
+    away_matrix = np.zeros((len(fixtures), num_teams))
+    for i, f in enumerate(fixtures):
+        home_matrix[i, f["home"]] = 1
+        away_matrix[i, f["away"]] = 1
+    prob, alias = alias_tables(fixture_distributions(fixtures, state["engine"]).reshape(len(fixtures), -1))
+    name_rank = np.argsort(np.argsort(state["names"]))
+
+    counts = np.zeros((num_teams, num_teams), dtype=np.int64)
+    points_sum = np.zeros(num_teams)
+    done = 0
+    while done < num_seasons:
+        n = min(chunk, num_seasons - done)
+        if fixtures:
+            home_goals, away_goals = _sample_scores(rng, prob, alias, n)
+        else:
+            home_goals = away_goals = np.zeros((n, 0), dtype=np.int64)
+        block_counts, block_points = _position_counts(
+            state, home_matrix, away_matrix, home_goals, away_goals, name_rank)
+        counts += block_counts
+        points_sum += block_points
+        done += n
+
+    probs = counts / num_seasons
+    teams = []
+    for i, team_id in enumerate(state["team_ids"]):
+        teams.append({
+            "team_id": team_id,
+            "name": state["names"][i],
+            "expected_points": round(points_sum[i] / num_seasons, 2),
+            "title": round(float(probs[i, 0]), 5),
+            "champions": round(float(probs[i, :CHAMPIONS_SPOTS].sum()), 5),
+            "relegation": round(float(probs[i, -RELEGATION_SPOTS:].sum()), 5),
+            "positions": [round(float(x), 5) for x in probs[i]],
+        })
+    teams.sort(key=lambda t: t["expected_points"], reverse=True)
+
+    return {
+        "engine": state["engine"],
+        "seasons": num_seasons,
+        "fixtures_left": len(fixtures),
+        "elapsed_s": round(time.perf_counter() - start, 3),
+        "teams": teams,
+    }
+
+
+# ============================================================================
+# VALIDAZIONE CONTRO IL SIMULATORE SCALARE
+# ============================================================================
+def validate(num_matches, seed=None):
+    """
+    Confronta la distribuzione esatta con num_matches partite simulate da
+    simulate_match_history() (stessa logica di recupero del loop live).
+    """
+    rng = random.Random(seed)
+    random.seed(seed)
+    teams = server.championship.teams
+    pairs = [(teams[0], teams[-1]), (teams[-1], teams[0]), (teams[1], teams[2])]
+
+    for home_team, away_team in pairs:
+        dist = score_distributions([engine.get_home_bias(home_team, away_team)])[0]
+        goals = np.arange(MAX_GOALS + 1)
+        exact = {
+            "gol casa": float((dist.sum(axis=1) * goals).sum()),
+            "gol ospiti": float((dist.sum(axis=0) * goals).sum()),
+            "pareggio": float(np.trace(dist)),
+            "vittoria casa": float(np.tril(dist, -1).sum()),
+        }
+
+        totals = dict.fromkeys(exact, 0.0)
+        for _ in range(num_matches):
+            last_minute = 89 + rng.randint(*server.SECOND_HALF_INJURY_TIME)
+            h, a, _ = engine.simulate_match_history(home_team, away_team, last_minute)
+            totals["gol casa"] += h
+            totals["gol ospiti"] += a
+            totals["pareggio"] += h == a
+            totals["vittoria casa"] += h > a
+
+        print(f"\n{home_team['name']} - {away_team['name']}")
+        for key, value in exact.items():
+            print(f"  {key:<14} esatto {value:.4f}   scalare {totals[key] / num_matches:.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Previsioni Monte Carlo sul campionato")
+    parser.add_argument("--seasons", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", help="salva il risultato completo in questo file")
+    parser.add_argument("--validate", type=int, metavar="N",
+                        help="confronta con N partite del simulatore scalare invece di prevedere")
+    args = parser.parse_args()
+
+    if args.validate:
+        validate(args.validate, args.seed)
+        return
+
+    result = forecast(capture_state(server.championship), args.seasons, args.seed)
+    print(f"\n📈 {result['seasons']} stagioni simulate in {result['elapsed_s']} s "
+          f"({result['fixtures_left']} partite da giocare)\n")
+    print(f"{'Squadra':<16}{'Punti':>8}{'Scudetto':>10}{'Champions':>11}{'Retroc.':>9}")
+    for team in result["teams"]:
+        print(f"{team['name']:<16}{team['expected_points']:>8.1f}{team['title']:>10.1%}"
+              f"{team['champions']:>11.1%}{team['relegation']:>9.1%}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""
+Codifica dei messaggi inviati ai client (aggiornamenti, stato iniziale, API).
+
+Due formati, scelti dal client WebSocket con il sottoprotocollo (vedi
+SUBPROTOCOLS); senza sottoprotocollo si usa JSON:
+- "json" (frame di testo): orjson o msgspec se installati, altrimenti il
+  modulo json della libreria standard. Il JSON prodotto è equivalente (cambia
+  solo la spaziatura), nessuna dipendenza è obbligatoria.
+- "msgpack" (frame binari): MessagePack (https://msgpack.org), più compatto
+  del JSON (numeri binari, niente virgolette né escape). Con il pacchetto
+  msgpack se installato, altrimenti l'encoder in Python puro di questo
+  modulo; le pagine lo decodificano con static/wire.js.
+
+I messaggi dai client (es. resync) restano sempre JSON testuale.
+"""
+import json
+import struct
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Sottoprotocollo WebSocket -> formato
+SUBPROTOCOLS = {"livescore.msgpack": "msgpack", "livescore.json": "json"}
+DEFAULT_FORMAT = "json"
+
+# Backend JSON in ordine di preferenza quando non è indicato
+JSON_BACKENDS = ("orjson", "msgspec", "stdlib")
+MSGPACK_BACKENDS = ("msgpack", "python")
+
+
+class Codec:
+    """Formato di serializzazione: encode(obj) -> bytes, frame binari o di testo"""
+    __slots__ = ("name", "backend", "binary", "encode")
+
+    def __init__(self, name, backend, binary, encode):
+        self.name = name
+        self.backend = backend
+        self.binary = binary
+        self.encode = encode
+
+    def __repr__(self):
+        return f"Codec({self.name!r}, {self.backend!r})"
+
+
+# ----------------------------------------------------------------------------
+# JSON
+# ----------------------------------------------------------------------------
+def _stdlib_json_encode(obj, _dumps=json.JSONEncoder(separators=(",", ":"), ensure_ascii=False).encode):
+    return _dumps(obj).encode("utf-8")
+
+
+def _json_encoder(backend):
+    if backend == "stdlib":
+        return _stdlib_json_encode
+    if backend == "orjson" and orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        return lambda obj: orjson.dumps(obj, option=option)
+    if backend == "msgspec" and msgspec is not None:
+        return msgspec.json.Encoder().encode
+    return None
+
+
+def json_codec(backend=None):
+    """
+    Codec JSON con il backend indicato (None o "auto": il più veloce tra
+    quelli installati). Solleva ValueError se il backend non è disponibile.
+    """
+    names = JSON_BACKENDS if backend in (None, "auto") else (backend,)
+    for name in names:
+        encode = _json_encoder(name)
+        if encode is not None:
+            return Codec("json", name, False, encode)
+    raise ValueError(f"Backend JSON non disponibile: {backend} (disponibili: {', '.join(json_backends())})")
+
+
+def json_backends():
+    """Backend JSON installati"""
+    return [name for name in JSON_BACKENDS if _json_encoder(name) is not None]
+
+
+# ----------------------------------------------------------------------------
+# MESSAGEPACK (encoder e decoder in Python puro)
+# ----------------------------------------------------------------------------
+# Le stringhe brevi (chiavi, tipi di evento, nomi) si ripetono in ogni
+# messaggio: la loro codifica è tenuta in cache
+_STR_CACHE = {}
+MAX_CACHED_STR = 64
+MAX_STR_CACHE = 8192
+
+_pack_uint16 = struct.Struct(">BH").pack
+_pack_uint32 = struct.Struct(">BI").pack
+_pack_uint64 = struct.Struct(">BQ").pack
+_pack_int8 = struct.Struct(">Bb").pack
+_pack_int16 = struct.Struct(">Bh").pack
+_pack_int32 = struct.Struct(">Bi").pack
+_pack_int64 = struct.Struct(">Bq").pack
+_pack_float = struct.Struct(">Bd").pack
+
+
+def _pack_str(value):
+    data = value.encode("utf-8")
+    length = len(data)
+    if length < 32:
+        return bytes((0xa0 | length,)) + data
+    if length < 0x100:
+        return bytes((0xd9, length)) + data
+    if length < 0x10000:
+        return _pack_uint16(0xda, length) + data
+    return _pack_uint32(0xdb, length) + data
+
+
+def _pack_int(value, buf):
+    if 0 <= value < 0x80:
+        buf.append(value)
+    elif -32 <= value < 0:
+        buf.append(value & 0xff)
+    elif value >= 0:
+        if value < 0x100:
+            buf += bytes((0xcc, value))
+        elif value < 0x10000:
+            buf += _pack_uint16(0xcd, value)
+        elif value < 0x100000000:
+            buf += _pack_uint32(0xce, value)
+        else:
+            buf += _pack_uint64(0xcf, value)
+    elif value >= -0x80:
+        buf += _pack_int8(0xd0, value)
+    elif value >= -0x8000:
+        buf += _pack_int16(0xd1, value)
+    elif value >= -0x80000000:
+        buf += _pack_int32(0xd2, value)
+    else:
+        buf += _pack_int64(0xd3, value)
+
+
+def _pack_header(length, fix, code16, buf):
+    if length < 16:
+        buf.append(fix | length)
+    elif length < 0x10000:
+        buf += _pack_uint16(code16, length)
+    else:
+        buf += _pack_uint32(code16 + 1, length)
+
+
+def _pack(obj, buf):
+    kind = type(obj)
+    if kind is str:
+        data = _STR_CACHE.get(obj)
+        if data is None:
+            data = _pack_str(obj)
+            if len(obj) <= MAX_CACHED_STR:
+                if len(_STR_CACHE) >= MAX_STR_CACHE:
+                    _STR_CACHE.clear()
+                _STR_CACHE[obj] = data
+        buf += data
+    elif kind is int:
+        _pack_int(obj, buf)
+    elif kind is dict:
+        _pack_header(len(obj), 0x80, 0xde, buf)
+        for key, value in obj.items():
+            _pack(key, buf)
+            _pack(value, buf)
+    elif kind is list or kind is tuple:
+        _pack_header(len(obj), 0x90, 0xdc, buf)
+        for value in obj:
+            _pack(value, buf)
+    elif obj is None:
+        buf.append(0xc0)
+    elif obj is True:
+        buf.append(0xc3)
+    elif obj is False:
+        buf.append(0xc2)
+    elif kind is float:
+        buf += _pack_float(0xcb, obj)
+    elif isinstance(obj, (bytes, bytearray)):
+        length = len(obj)
+        if length < 0x100:
+            buf += bytes((0xc4, length))
+        elif length < 0x10000:
+            buf += _pack_uint16(0xc5, length)
+        else:
+            buf += _pack_uint32(0xc6, length)
+        buf += obj
+    # Sottoclassi (es. enum di stringhe) dopo i tipi esatti, più frequenti
+    elif isinstance(obj, str):
+        _pack(str(obj), buf)
+    elif isinstance(obj, int):
+        _pack_int(int(obj), buf)
+    elif isinstance(obj, dict):
+        _pack(dict(obj), buf)
+    else:
+        raise TypeError(f"Tipo non serializzabile in MessagePack: {kind.__name__}")
+
+
+def packb(obj):
+    """Codifica obj in MessagePack (Python puro)"""
+    buf = bytearray()
+    _pack(obj, buf)
+    return bytes(buf)
+
+
+_unpack_from = struct.unpack_from
+
+
+def _unpack(data, pos):
+    """(valore, posizione successiva) dell'oggetto MessagePack che inizia in pos"""
+    code = data[pos]
+    pos += 1
+    if code < 0x80:
+        return code, pos
+    if code < 0x90 or code in (0xde, 0xdf):
+        if code < 0x90:
+            length = code & 0x0f
+        else:
+            size = 2 if code == 0xde else 4
+            length = int.from_bytes(data[pos:pos + size], "big")
+            pos += size
+        result = {}
+        for _ in range(length):
+            key, pos = _unpack(data, pos)
+            result[key], pos = _unpack(data, pos)
+        return result, pos
+    if code < 0xa0 or code in (0xdc, 0xdd):
+        if code < 0xa0:
+            length = code & 0x0f
+        else:
+            size = 2 if code == 0xdc else 4
+            length = int.from_bytes(data[pos:pos + size], "big")
+            pos += size
+        result = []
+        for _ in range(length):
+            value, pos = _unpack(data, pos)
+            result.append(value)
+        return result, pos
+    if code < 0xc0 or code in (0xd9, 0xda, 0xdb):
+        if code < 0xc0:
+            length = code & 0x1f
+        else:
+            size = {0xd9: 1, 0xda: 2, 0xdb: 4}[code]
+            length = int.from_bytes(data[pos:pos + size], "big")
+            pos += size
+        return bytes(data[pos:pos + length]).decode("utf-8"), pos + length
+    if code >= 0xe0:
+        return code - 0x100, pos
+    if code == 0xc0:
+        return None, pos
+    if code == 0xc2:
+        return False, pos
+    if code == 0xc3:
+        return True, pos
+    if code in (0xc4, 0xc5, 0xc6):
+        size = {0xc4: 1, 0xc5: 2, 0xc6: 4}[code]
+        length = int.from_bytes(data[pos:pos + size], "big")
+        pos += size
+        return bytes(data[pos:pos + length]), pos + length
+    if code == 0xca:
+        return _unpack_from(">f", data, pos)[0], pos + 4
+    if code == 0xcb:
+        return _unpack_from(">d", data, pos)[0], pos + 8
+    if 0xcc <= code <= 0xcf:
+        size = 1 << (code - 0xcc)
+        return int.from_bytes(data[pos:pos + size], "big"), pos + size
+    if 0xd0 <= code <= 0xd3:
+        size = 1 << (code - 0xd0)
+        return int.from_bytes(data[pos:pos + size], "big", signed=True), pos + size
+    raise ValueError(f"Tipo MessagePack non supportato: 0x{code:02x}")
+
+
+def unpackb(data):
+    """Decodifica un messaggio MessagePack (Python puro; usato da test e benchmark)"""
+    value, pos = _unpack(memoryview(data), 0)
+    if pos != len(data):
+        raise ValueError("Dati in eccesso dopo il messaggio MessagePack")
+    return value
+
+
+def msgpack_codec(backend=None):
+    """Codec MessagePack: il pacchetto msgpack se installato, altrimenti Python puro"""
+    names = MSGPACK_BACKENDS if backend in (None, "auto") else (backend,)
+    for name in names:
+        if name == "msgpack" and msgpack is not None:
+            return Codec("msgpack", name, True, msgpack.Packer(use_bin_type=True).pack)
+        if name == "python":
+            return Codec("msgpack", name, True, packb)
+    raise ValueError(f"Backend MessagePack non disponibile: {backend}")
+
+
+def create_codecs(json_backend=None, msgpack_backend=None):
+    """Codec per formato (chiavi di SUBPROTOCOLS.values())"""
+    return {"json": json_codec(json_backend), "msgpack": msgpack_codec(msgpack_backend)}
+
+
+def available_codecs():
+    """Tutti i codec installati, per i benchmark: "formato/backend" -> Codec"""
+    codecs = {f"json/{name}": json_codec(name) for name in json_backends()}
+    for name in MSGPACK_BACKENDS:
+        try:
+            codecs[f"msgpack/{name}"] = msgpack_codec(name)
+        except ValueError:
+            pass
+    return codecs
+
+
+def decode(data):
+    """Messaggio del server -> oggetto: JSON se testo, MessagePack se binario"""
+    if isinstance(data, str):
+        return json.loads(data)
+    return unpackb(data)
@@ -1,32 +1,301 @@
+import argparse
 import asyncio
+import atexit
+import functools
+import gzip
+import hashlib
 import json
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import queue
 import random
+import sys
+import threading
+import time
+import tornado.autoreload
+import tornado.httpserver
+import tornado.ioloop
+import tornado.netutil
 import tornado.web
 import tornado.websocket
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+import artifacts
+import eventlog
+import statestore
+from broadcast import Broadcaster, FrameSet, pending_bytes
+from bus import create_bus
+from engine import create_engine, get_home_bias
+from metrics import LoopLagMonitor, Registry, SamplingProfiler
+from model import EVENT_TYPES, Event, Match
+from serialization import SUBPROTOCOLS, create_codecs
+from stats import LEADER_CATEGORIES, StatsIndex, team_pair
+
+# Avviato come script: i moduli che fanno "import server" (es. montecarlo)
+# devono ottenere questo stesso modulo, non una seconda copia
+if __name__ == "__main__":
+    sys.modules.setdefault("server", sys.modules[__name__])
+
+# LOG DEL SERVER
+# La cronaca (gol, cartellini, fine partita...) e i messaggi operativi passano
+# dal modulo logging e non da print(): chi simula mette il record in una coda
+# senza formattarlo né scriverlo (LogQueueHandler) e un thread QueueListener
+# lo formatta e lo scrive su stderr, fuori dall'event loop.
+# Livelli: INFO per giornate, gol, rigori, espulsioni e fine partita; DEBUG per
+# cartellini gialli, corner, recupero e connessioni WebSocket.
+# I campi strutturati (league, match, event, minute...) si passano con extra=
+# e compaiono come chiavi nel formato "json".
+LOG_LEVEL = "INFO"
+LOG_FORMAT = "text"        # "text" o "json" (una riga JSON per record)
+LOG_QUEUE_SIZE = 10000     # record in attesa di scrittura; oltre vengono scartati
+
+log = logging.getLogger("livescore")
+# Attributi standard di un LogRecord: tutto il resto arriva da extra=
+_LOG_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Una riga JSON per record: ora, livello, logger, messaggio e i campi passati con extra="""
+
+    def format(self, record):
+        entry = {"time": self.formatTime(record), "level": record.levelname,
+                 "logger": record.name, "message": record.getMessage()}
+        for key, value in vars(record).items():
+            if key not in _LOG_RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class LogQueueHandler(logging.handlers.QueueHandler):
+    """
+    Accoda il record così com'è: la formattazione avviene nel thread del
+    listener (gli argomenti dei messaggi devono essere valori immutabili).
+    Non blocca mai: a coda piena il record è scartato e contato.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+log_handler = None
+_log_listener = None
+
+
+def setup_logging(level=None, fmt=None):
+    """
+    Configura il logger "livescore" (e i figli, es. "livescore.bus") con coda
+    e thread di scrittura. Si può richiamare per cambiare livello e formato.
+    """
+    global log_handler, _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        atexit.unregister(_log_listener.stop)
+        log.removeHandler(log_handler)
+
+    output = logging.StreamHandler(sys.stderr)
+    if (fmt or LOG_FORMAT) == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)-7s %(message)s"))
+    log_handler = LogQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    _log_listener = logging.handlers.QueueListener(log_handler.queue, output)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+
+    log.addHandler(log_handler)
+    log.setLevel((level or LOG_LEVEL).upper())
+    log.propagate = False
+
+
+# Avviato come script: anche i messaggi dell'avvio (squadre, calendario)
+# passano dal log; livello e formato da riga di comando sono applicati dopo
+if __name__ == "__main__":
+    setup_logging()
+
 # CARICAMENTO E NORMALIZZAZIONE DATABASE SQUADRE
 def flatten_players(team):
-    """Converte players da dict per ruoli a lista piatta"""
+    """
+    Converte players da dict per ruoli a lista piatta. Le rose per ruolo
+    restano in "roles" (usate dal motore xG, vedi engine.py).
+    """
     if isinstance(team.get("players"), dict):
+        team["roles"] = team["players"]
         all_players = []
         for role, player_list in team["players"].items():
             all_players.extend(player_list)
         team["players"] = all_players[:11]  # Massimo 11 titolari
     return team
 
-with open('teams.json', 'r', encoding='utf-8') as f:
-    teams_db = json.load(f)['teams']
+def load_teams(path):
+    """Carica le squadre di un campionato da un file JSON e le normalizza"""
+    with open(path, 'r', encoding='utf-8') as f:
+        teams = json.load(f)['teams']
+
+    # NORMALIZZA TUTTE LE SQUADRE
+    teams = [flatten_players(team) for team in teams]
+
+    log.info("✅ Caricate %d squadre da %s con %d giocatori ciascuna", len(teams), path, len(teams[0]["players"]))
+    return teams
+
+
+def build_calendar(team_ids):
+    """
+    Calendario a girone doppio (andata e ritorno: 38 giornate con 20 squadre)
+    con l'algoritmo round-robin. Restituisce le partite come (giornata, id
+    casa, id trasferta) nell'ordine degli id dei match (1, 2, ...).
+    """
+    num_teams = len(team_ids)
+    # Con 20 squadre: 19 giornate per girone = 38 giornate totali
+    num_matchdays_per_girone = num_teams - 1
+    fixtures = []
+
+    for girone in range(2):  # 2 gironi (andata e ritorno)
+        teams_in_round = list(team_ids)
+
+        for matchday in range(1, num_matchdays_per_girone + 1):
+            # Ottieni gli accoppiamenti per questa giornata
+            actual_matchday = matchday + (girone * num_matchdays_per_girone)
+            for i in range(num_teams // 2):
+                fixtures.append((actual_matchday, teams_in_round[i], teams_in_round[num_teams - 1 - i]))
+
+            # Ruota le squadre per il prossimo round (algoritmo round-robin)
+            # Mantieni il primo fisso, ruota gli altri
+            fixed = teams_in_round[0]
+            teams_in_round = [fixed] + [teams_in_round[-1]] + teams_in_round[1:-1]
+    return fixtures
+
+# PROTOCOLLO DI AGGIORNAMENTO (delta con numeri di sequenza per match)
+PROTOCOL_VERSION = 2
+DELTA_FIELDS = ("status", "minute", "score", "half", "injury_time")  # campi inviati solo se cambiati
+# Le squadre viaggiano una volta sola nel campo "teams" (solo questi campi)
+# e i match le referenziano tramite home_id / away_id (vedi Match.to_wire)
+WIRE_TEAM_FIELDS = ("id", "name", "city", "stadium")
+
+# CLASSIFICA
+def standings_key(s):
+    """Chiave di ordinamento: punti, differenza reti, gol fatti, gol subiti, nome (decrescente)"""
+    return (s["points"], s["goals_for"] - s["goals_against"], s["goals_for"], -s["goals_against"], s["name"])
+
+
+def apply_result(home, away, home_score, away_score):
+    """Aggiorna le statistiche di classifica di due squadre con un risultato"""
+    home["played"] += 1
+    away["played"] += 1
+
+    home["goals_for"] += home_score
+    home["goals_against"] += away_score
+    away["goals_for"] += away_score
+    away["goals_against"] += home_score
+
+    if home_score > away_score:
+        home["wins"] += 1
+        away["losses"] += 1
+        home["points"] += 3
+    elif home_score < away_score:
+        away["wins"] += 1
+        home["losses"] += 1
+        away["points"] += 3
+    else:
+        home["draws"] += 1
+        away["draws"] += 1
+        home["points"] += 1
+        away["points"] += 1
+
+
+def standings_rows(ranking_ids, standings, live_ids=None):
+    """Righe della classifica (formato inviato ai client) nell'ordine indicato"""
+    out = []
+    for pos, team_id in enumerate(ranking_ids, start=1):
+        s = standings[team_id]
+        row = {
+            "position": pos,
+            "team_id": team_id,
+            "name": s["name"],
+            "played": s["played"],
+            "wins": s["wins"],
+            "draws": s["draws"],
+            "losses": s["losses"],
+            "goals_for": s["goals_for"],
+            "goals_against": s["goals_against"],
+            "goal_diff": s["goals_for"] - s["goals_against"],
+            "points": s["points"],
+        }
+        if live_ids is not None:
+            row["live"] = team_id in live_ids
+        out.append(row)
+    return out
+
+
+class Ranking:
+    """
+    Squadre ordinate per chiave decrescente. Spostare una squadra costa una
+    ricerca binaria più l'inserimento in lista, senza riordinare tutto.
+    """
+
+    def __init__(self, items=()):
+        pairs = sorted(items, key=lambda item: item[1], reverse=True)
+        self.ids = [team_id for team_id, _ in pairs]
+        self.keys = [key for _, key in pairs]
+
+    def _position(self, key):
+        """Prima posizione in cui la chiave non è maggiore di quella indicata"""
+        lo, hi = 0, len(self.keys)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.keys[mid] > key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
 
-# NORMALIZZA TUTTE LE SQUADRE
-teams_db = [flatten_players(team) for team in teams_db]
+    def move(self, team_id, old_key, new_key):
+        index = self._position(old_key)
+        assert self.ids[index] == team_id, "classifica incoerente"
+        del self.ids[index]
+        del self.keys[index]
+
+        index = self._position(new_key)
+        self.ids.insert(index, team_id)
+        self.keys.insert(index, new_key)
+
+    def copy(self):
+        ranking = Ranking()
+        ranking.ids = list(self.ids)
+        ranking.keys = list(self.keys)
+        return ranking
 
-print(f"✅ Caricate {len(teams_db)} squadre con {len(teams_db[0]['players'])} giocatori ciascuna")
 
 # SISTEMA DI CAMPIONATO
 class Championship:
-    def __init__(self, teams):
+    def __init__(self, teams, league_id="serie_a", name="Serie A", seed=None, engine=None, fixtures=None):
+        self.league_id = league_id
+        self.name = name
+        # Motore che genera gli eventi delle partite (vedi engine.py)
+        self.engine = create_engine(engine)
+        # Seme della simulazione: con lo stesso seme la stagione è identica
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.rng = random.Random()
+        # Orologio: tick simulati in tutto e minuto della giornata in corso
+        self.tick_count = 0
+        self.matchday_minute = 0
         self.teams = teams
+        self.teams_by_id = {team["id"]: team for team in teams}
         self.standings = {team["id"]: {
             "name": team["name"],
             "played": 0, "wins": 0, "draws": 0, "losses": 0,
@@ -35,7 +304,25 @@ class Championship:
         } for team in teams}
         self.matches = {}
         self.current_matchday = 1
-        self.generate_calendar()
+        self.num_matchdays = 0
+        # Indici: giornata -> id match, squadra -> id match, match in corso
+        self.matchday_index = {}
+        self.team_index = {team["id"]: [] for team in teams}
+        self.live_matches = {}  # id -> match (dict come insieme ordinato)
+        # Ultimo stato inviato ai client per ogni match: (campi, numero eventi)
+        self._wire_state = {}
+        # Incrementata a ogni cambiamento di stato (usata per invalidare le cache)
+        self.version = 0
+        # Incrementata a ogni ripristino dello stato (log, resync di un edge):
+        # dopo un ripristino i numeri di sequenza dei match possono ripartire
+        self.epoch = 0
+        # Classifica ordinata mantenuta in modo incrementale + cache per versione
+        self._ranking = Ranking((tid, standings_key(s)) for tid, s in self.standings.items())
+        self.standings_version = 0
+        self._standings_cache = (None, None)
+        self._standings_json_cache = (None, None)
+        self._live_standings_cache = (None, None)
+        self.generate_calendar(fixtures)
 
     def update_standings(self, match_id):
         match_id = str(match_id)
@@ -44,499 +331,2014 @@ class Championship:
             return
 
         # evita doppio aggiornamento se richiami la funzione più volte
-        if match.get("_standings_updated"):
+        if match.standings_updated:
             return
 
-        home_id = match["home_id"]
-        away_id = match["away_id"]
-        home_score = match["score"]["home"]
-        away_score = match["score"]["away"]
+        home_id = match.home_id
+        away_id = match.away_id
+        home_score = match.score["home"]
+        away_score = match.score["away"]
 
         home = self.standings[home_id]
         away = self.standings[away_id]
 
-        home["played"] += 1
-        away["played"] += 1
-
-        home["goals_for"] += home_score
-        home["goals_against"] += away_score
-        away["goals_for"] += away_score
-        away["goals_against"] += home_score
-
-        if home_score > away_score:
-            home["wins"] += 1
-            away["losses"] += 1
-            home["points"] += 3
-        elif home_score < away_score:
-            away["wins"] += 1
-            home["losses"] += 1
-            away["points"] += 3
-        else:
-            home["draws"] += 1
-            away["draws"] += 1
-            home["points"] += 1
-            away["points"] += 1
+        # Aggiornamento incrementale: solo le due squadre coinvolte cambiano posizione
+        old_home_key = standings_key(home)
+        old_away_key = standings_key(away)
+        apply_result(home, away, home_score, away_score)
+        self._ranking.move(home_id, old_home_key, standings_key(home))
+        self._ranking.move(away_id, old_away_key, standings_key(away))
 
-        match["_standings_updated"] = True
+        match.standings_updated = True
+        self.standings_version += 1
+        self.version += 1
 
     def get_sorted_standings(self):
-        def sort_key(item):
-            team_id, s = item
-            gd = s["goals_for"] - s["goals_against"]
-            return (s["points"], gd, s["goals_for"], -s["goals_against"], s["name"])
-
-        sorted_items = sorted(self.standings.items(), key=sort_key, reverse=True)
-
-        out = []
-        for pos, (team_id, s) in enumerate(sorted_items, start=1):
-            out.append({
-                "position": pos,
-                "team_id": team_id,
-                "name": s["name"],
-                "played": s["played"],
-                "wins": s["wins"],
-                "draws": s["draws"],
-                "losses": s["losses"],
-                "goals_for": s["goals_for"],
-                "goals_against": s["goals_against"],
-                "goal_diff": s["goals_for"] - s["goals_against"],
-                "points": s["points"],
-            })
-        return out
+        """Classifica ordinata, ricostruita solo quando cambia standings_version"""
+        version, rows = self._standings_cache
+        if version != self.standings_version:
+            rows = standings_rows(self._ranking.ids, self.standings)
+            self._standings_cache = (self.standings_version, rows)
+        return rows
 
-    def generate_calendar(self):
+    def standings_json(self):
+        """Classifica già serializzata in JSON (in cache per versione)"""
+        version, encoded = self._standings_json_cache
+        if version != self.standings_version:
+            encoded = json.dumps(self.get_sorted_standings())
+            self._standings_json_cache = (self.standings_version, encoded)
+        return encoded
+
+    def get_live_standings(self):
+        """
+        Classifica "live": proietta i punteggi attuali delle partite in corso
+        come se finissero adesso, senza toccare la classifica ufficiale.
+        Le squadre in campo sono segnate con "live": True.
+        """
+        version, rows = self._live_standings_cache
+        if version == self.version:
+            return rows
+
+        projected = {}
+        ranking = self._ranking.copy()
+        for match in self.live_matches.values():
+            home_id, away_id = match.home_id, match.away_id
+            home = projected[home_id] = dict(self.standings[home_id])
+            away = projected[away_id] = dict(self.standings[away_id])
+            old_home_key = standings_key(home)
+            old_away_key = standings_key(away)
+            apply_result(home, away, match.score["home"], match.score["away"])
+            ranking.move(home_id, old_home_key, standings_key(home))
+            ranking.move(away_id, old_away_key, standings_key(away))
+
+        rows = standings_rows(ranking.ids, {**self.standings, **projected}, live_ids=projected)
+        self._live_standings_cache = (self.version, rows)
+        return rows
+
+    def generate_calendar(self, fixtures=None):
         """
-        Genera il calendario del campionato (2 gironi = 38 giornate totali).
-        Tutte le squadre giocano contemporaneamente ogni giornata.
+        Crea le partite del calendario: fixtures è la lista di (giornata, id
+        casa, id trasferta) di build_calendar() (calcolata qui se None, o letta
+        da un artefatto precompilato). Tutte le squadre giocano
+        contemporaneamente ogni giornata.
         """
-        team_list = [t["id"] for t in self.teams]
-        num_teams = len(team_list)
-        
-        # Con 20 squadre: 19 giornate per girone = 38 giornate totali
-        num_matchdays_per_girone = num_teams - 1
-        match_id = 1
-        
-        # Algoritmo round-robin per generare calendario bilanciato
-        for girone in range(2):  # 2 gironi (andata e ritorno)
-            teams_in_round = team_list.copy()
-            
-            for matchday in range(1, num_matchdays_per_girone + 1):
-                # Ottieni gli accoppiamenti per questa giornata
-                matches_in_matchday = 0
-                for i in range(num_teams // 2):
-                    home_id = teams_in_round[i]
-                    away_id = teams_in_round[num_teams - 1 - i]
-                    
-                    # Crea la partita
-                    home_team = next(t for t in self.teams if t["id"] == home_id)
-                    away_team = next(t for t in self.teams if t["id"] == away_id)
-                    
-                    actual_matchday = matchday + (girone * num_matchdays_per_girone)
-                    
-                    self.matches[str(match_id)] = {
-                        "id": str(match_id),
-                        "matchday": actual_matchday,
-                        "home_id": home_id,
-                        "away_id": away_id,
-                        "home": home_team["name"],
-                        "away": away_team["name"],
-                        "home_data": home_team,
-                        "away_data": away_team,
-                        "status": "scheduled",
-                        "minute": 0,
-                        "score": {"home": 0, "away": 0},
-                        "events": [],
-                        "half": 1,
-                        "injury_time": 0
-                    }
-                    match_id += 1
-                    matches_in_matchday += 1
-                
-                # Ruota le squadre per il prossimo round (algoritmo round-robin)
-                # Mantieni il primo fisso, ruota gli altri
-                fixed = teams_in_round[0]
-                teams_in_round = [fixed] + [teams_in_round[-1]] + teams_in_round[1:-1]
-        
+        if fixtures is None:
+            fixtures = build_calendar([t["id"] for t in self.teams])
+
+        for match_id, (matchday, home_id, away_id) in enumerate(fixtures, 1):
+            home_team = self.teams_by_id[home_id]
+            away_team = self.teams_by_id[away_id]
+            match = Match(str(match_id), matchday, home_team, away_team)
+            # Piano della partita: il bias dipende solo dalle squadre
+            match.home_bias = get_home_bias(home_team, away_team)
+            self.matches[match.id] = match
+            self._index_match(match)
+            self._mark_sent(match.id)
+
         self.current_matchday = 1
+        self.num_matchdays = max(self.matchday_index, default=0)
+
+    def _index_match(self, match):
+        """Aggiunge un match agli indici per giornata e per squadra"""
+        self.matchday_index.setdefault(match.matchday, []).append(match.id)
+        self.team_index[match.home_id].append(match.id)
+        self.team_index[match.away_id].append(match.id)
+        if match.status == "live":
+            self.live_matches[match.id] = match
     
     def get_matches_by_matchday(self, matchday):
         """Restituisce le partite di una giornata"""
-        return {mid: m for mid, m in self.matches.items() if m["matchday"] == matchday}
-    
-        
-        home_id = match["home_id"]
-        away_id = match["away_id"]
-        home_score = match["score"]["home"]
-        away_score = match["score"]["away"]
-        
-
-# CONFIGURAZIONE PROBABILITÀ EVENTI (realistiche per il calcio)
-EVENT_PROBABILITIES = {
-    "goal": 0.03,              # 3% per minuto (circa 2-3 goal per partita)
-    "yellow_card": 0.025,      # 2.5% per minuto (circa 2-3 cartellini gialli)
-    "red_card": 0.003,         # 0.3% per minuto (raro, circa 1 ogni 3-4 partite)
-    "substitution": 0.015,     # 1.5% per minuto (concentrato dopo il 60°)
-    "corner": 0.08,            # 8% per minuto (circa 7-10 corner per partita)
-    "offside": 0.04,           # 4% per minuto (4-5 fuorigioco)
-    "penalty": 0.004,          # 0.4% per minuto (raro)
-    "injury": 0.008            # 0.8% per minuto (infortuni occasionali)
+        return {mid: self.matches[mid] for mid in self.matchday_index.get(matchday, ())}
+
+    def get_matches_by_team(self, team_id):
+        """Restituisce le partite di una squadra in ordine di calendario"""
+        return {mid: self.matches[mid] for mid in self.team_index.get(team_id, ())}
+
+    def set_status(self, match_id, status):
+        """Cambia lo stato di un match mantenendo aggiornato l'insieme dei match in corso"""
+        match = self.matches[match_id]
+        match.status = status
+        if status == "live":
+            self.live_matches[match_id] = match
+        else:
+            self.live_matches.pop(match_id, None)
+
+    def start_matchday(self, matchday):
+        """Mette in campo tutte le partite di una giornata e la rende quella corrente"""
+        self.current_matchday = matchday
+        self.matchday_minute = 0
+        started = []
+        for match_id in self.matchday_index.get(matchday, ()):
+            match = self.matches[match_id]
+            match.minute = 0
+            match.score = {"home": 0, "away": 0}
+            match.events = []
+            self.set_status(match_id, "live")
+            started.append(match)
+        return started
+
+    # ------------------------------------------------------------------------
+    # PROTOCOLLO DELTA
+    # ------------------------------------------------------------------------
+    def match_snapshot(self, match_id):
+        """
+        Stato completo di un match da inviare al client
+        (senza i dati completi delle squadre).
+        """
+        return self.matches[match_id].to_wire()
+
+    def teams_snapshot(self, match_ids):
+        """Dati essenziali (senza rose) delle squadre coinvolte nei match indicati"""
+        teams = {}
+        for mid in match_ids:
+            match = self.matches[mid]
+            for team in (match.home_data, match.away_data):
+                if team["id"] not in teams:
+                    teams[team["id"]] = {field: team.get(field) for field in WIRE_TEAM_FIELDS}
+        return teams
+
+    def _mark_sent(self, match_id):
+        """Registra lo stato corrente del match come ultimo stato inviato"""
+        match = self.matches[match_id]
+        fields = {field: getattr(match, field) for field in DELTA_FIELDS}
+        fields["score"] = dict(match.score)
+        self._wire_state[match_id] = (fields, len(match.events))
+
+    def build_delta(self, match_id):
+        """
+        Calcola il delta di un match rispetto all'ultimo stato inviato:
+        solo i campi cambiati e gli eventi aggiunti nel frattempo.
+        Incrementa il numero di sequenza del match; restituisce None
+        se non è cambiato nulla.
+        """
+        match = self.matches[match_id]
+        sent_fields, sent_events = self._wire_state[match_id]
+
+        delta = {}
+        for field in DELTA_FIELDS:
+            value = getattr(match, field)
+            if value != sent_fields[field]:
+                # Copia del punteggio: il batch può essere serializzato più tardi
+                # (coda dei worker) mentre i tick successivi lo modificano
+                delta[field] = dict(value) if field == "score" else value
+
+        new_events = match.events[min(sent_events, len(match.events)):]
+        if new_events:
+            delta["events"] = [event.to_wire() for event in new_events]
+
+        if not delta:
+            return None
+
+        match.seq += 1
+        self.version += 1
+        delta["id"] = match_id
+        delta["seq"] = match.seq
+        self._mark_sent(match_id)
+        return delta
+
+    # ------------------------------------------------------------------------
+    # AVANZAMENTO DELLA SIMULAZIONE
+    # ------------------------------------------------------------------------
+    def start(self):
+        """Avvia tutte le partite della prima giornata"""
+        started = self.start_matchday(1)
+        log.info("🎯 [%s] INIZIO GIORNATA 1 - %d PARTITE IN CAMPO", self.name, len(started),
+                 extra={"league": self.league_id, "matchday": 1})
+
+    def tick(self, minutes=1):
+        """
+        Avanza di `minutes` minuti tutte le partite in corso e, quando la
+        giornata è finita, avvia la successiva. Solo lavoro CPU, nessun I/O:
+        restituisce il batch di aggiornamento (delta, classifica, cambio di
+        giornata) da pubblicare ai client, piccolo e serializzabile (viaggia
+        tra processi).
+
+        Con più minuti (recupero di un ritardo) ogni match ha un solo delta
+        per tutto il batch. Il batch si chiude in anticipo all'inizio di una
+        nuova giornata o a fine stagione: "ticks" dice quanti minuti contiene.
+        """
+        started = time.perf_counter()
+        updated = {}  # id -> match (dict come insieme ordinato)
+        standings_updated = False
+        started_matchday = None
+        season_over = False
+        ticks = 0
+        while ticks < minutes and not (started_matchday or season_over):
+            finished, started_matchday, season_over = self._advance_minute(updated)
+            standings_updated = standings_updated or finished
+            ticks += 1
+
+        # Solo delta: campi cambiati + nuovi eventi
+        deltas = [d for d in (self.build_delta(mid) for mid in updated) if d]
+        return {
+            "league": self.league_id,
+            "tick": self.tick_count,
+            "ticks": ticks,
+            "matchday": self.current_matchday,
+            "minute": self.matchday_minute,
+            "deltas": deltas,
+            "standings_updated": standings_updated,
+            "started_matchday": started_matchday,
+            "season_over": season_over,
+            # Istante del tick (Unix time): i client misurano la latenza di consegna
+            "tick_time": round(time.time(), 3),
+            # Durata del calcolo del tick (metriche del processo che lo pubblica)
+            "tick_seconds": round(time.perf_counter() - started, 6)
+        }
+
+    def _advance_minute(self, updated):
+        """
+        Un minuto di gioco: aggiunge a `updated` i match modificati e
+        restituisce (classifica cambiata, giornata avviata o None, fine stagione).
+        """
+        self.tick_count += 1
+        self.matchday_minute += 1
+        # Sequenza casuale del tick derivata da (seme, tick): lo stato del
+        # generatore non va mai salvato e si può riprendere da qualsiasi tick
+        self.rng.seed(f"{self.seed}/{self.tick_count}")
+
+        standings_updated = False
+        playing = []
+
+        # Solo le partite in corso: il costo del tick non dipende dalla lunghezza del calendario
+        for match_id, match in list(self.live_matches.items()):
+
+            # ----------------------------------------------------------------
+            # AVANZAMENTO TEMPO
+            # ----------------------------------------------------------------
+            match.minute += 1
+            current_minute = match.minute
+
+            # Gestione fine primo tempo
+            if current_minute == 45:
+                match.half = 1
+                match.injury_time = self.rng.randint(*FIRST_HALF_INJURY_TIME)
+                log.debug("⏱️  Fine 1° tempo: %s %d-%d %s", match.home, match.score["home"],
+                          match.score["away"], match.away, extra={"league": self.league_id, "match": match_id})
+
+            # Gestione inizio secondo tempo
+            if current_minute == 46:
+                match.half = 2
+                match.injury_time = 0
+
+            # Gestione fine secondo tempo
+            if current_minute == 90:
+                match.injury_time = self.rng.randint(*SECOND_HALF_INJURY_TIME)
+                log.debug("⏱️  90° minuto: +%d di recupero (%s-%s)", match.injury_time, match.home, match.away,
+                          extra={"league": self.league_id, "match": match_id})
+
+            # Fine match
+            if current_minute >= 90 + match.injury_time:
+                self.set_status(match_id, "finished")
+                self.update_standings(match_id)
+                standings_updated = True
+                log.info("🏁 FINE PARTITA: %s %d-%d %s", match.home, match.score["home"], match.score["away"],
+                         match.away, extra={"league": self.league_id, "match": match_id, "event": "finished"})
+                updated[match_id] = match
+                continue
+
+            playing.append(match)
+            updated[match_id] = match
+
+        # --------------------------------------------------------------------
+        # GENERAZIONE EVENTI: una sola chiamata al motore per tutte le partite
+        # --------------------------------------------------------------------
+        for match, events in zip(playing, self.engine.play_minute(playing, self.rng)):
+            for event in events:
+                match.events.append(event)
+                # Aggiorna punteggio
+                if event.type == "goal" or (event.type == "penalty" and event.scored):
+                    match.score[event.team] += 1
+                self._log_event(match, event)
+
+        # Passa alla giornata successiva quando TUTTE le partite della giornata sono finite
+        season_over = False
+        started_matchday = None
+        if not self.live_matches:
+            if self.current_matchday < self.num_matchdays:
+                # Avvia tutte le partite della nuova giornata
+                next_matchday_matches = self.start_matchday(self.current_matchday + 1)
+                # L'avvio delle nuove partite parte nello stesso aggiornamento
+                updated.update((m.id, m) for m in next_matchday_matches)
+                started_matchday = self.current_matchday
+                log.info("🎯 [%s] INIZIO GIORNATA %d - %d PARTITE IN CAMPO", self.name, started_matchday,
+                         len(next_matchday_matches), extra={"league": self.league_id, "matchday": started_matchday})
+            else:
+                log.info("🏆 [%s] STAGIONE CONCLUSA", self.name, extra={"league": self.league_id})
+                season_over = True
+
+        return standings_updated, started_matchday, season_over
+
+    def _log_event(self, match, event):
+        """Cronaca di un evento (vedi EVENT_LOG_MESSAGES); i campi si calcolano solo se il livello è attivo"""
+        key = event.type
+        if key == "penalty":
+            key = "penalty_scored" if event.scored else "penalty_missed"
+        entry = EVENT_LOG_MESSAGES.get(key)
+        if entry is None or not log.isEnabledFor(entry[0]):
+            return
+        level, message = entry
+        log.log(level, message, {
+            "player": event.player, "team": event.team_name, "home": match.home, "away": match.away,
+            "home_score": match.score["home"], "away_score": match.score["away"],
+        }, extra={"league": self.league_id, "match": match.id, "event": event.type, "minute": event.minute})
+
+    def apply_batch(self, batch):
+        """
+        Applica un batch prodotto da tick() in un altro processo a questa copia
+        del campionato (quella usata dal server per snapshot, API e resync):
+        stessi campi, stessi eventi, stessi numeri di sequenza, stessa classifica.
+        """
+        self.tick_count = batch["tick"]
+        self.current_matchday = batch["matchday"]
+        self.matchday_minute = batch["minute"]
+
+        for delta in batch["deltas"]:
+            match_id = delta["id"]
+            match = self.matches[match_id]
+            for field in DELTA_FIELDS:
+                if field in delta:
+                    setattr(match, field, delta[field])
+            match.events.extend(Event.from_wire(event) for event in delta.get("events", ()))
+            match.seq = delta["seq"]
+            if "status" in delta:
+                self.set_status(match_id, delta["status"])
+                if delta["status"] == "finished":
+                    self.update_standings(match_id)
+            self._mark_sent(match_id)
+            self.version += 1
+
+    # ------------------------------------------------------------------------
+    # SNAPSHOT (log della simulazione e replay)
+    # ------------------------------------------------------------------------
+    def match_states(self, match_ids):
+        """Stato variabile dei match indicati, serializzabile in JSON"""
+        return [self.matches[mid].to_wire() for mid in match_ids]
+
+    def restore_matches(self, states):
+        """Ripristina lo stato di alcuni match da match_states()"""
+        for state in states:
+            match_id = state["id"]
+            match = self.matches[match_id]
+            for field in DELTA_FIELDS + ("seq",):
+                setattr(match, field, state[field])
+            match.events = [Event.from_wire(event) for event in state["events"]]
+            match.standings_updated = state["status"] == "finished"
+            self.set_status(match_id, state["status"])
+            self._mark_sent(match_id)
+        self.version += 1
+        self.epoch += 1
+
+    def state(self):
+        """Stato completo (orologio, classifica e tutti i match), serializzabile in JSON"""
+        return {
+            "tick": self.tick_count,
+            "matchday": self.current_matchday,
+            "minute": self.matchday_minute,
+            "standings": self.standings,
+            "matches": self.match_states(list(self.matches)),
+        }
+
+    def restore_state(self, state):
+        """Ripristina lo stato prodotto da state() (anche in un altro processo)"""
+        self.restore_standings(state["standings"])
+        self.restore_matches(state["matches"])
+        self.current_matchday = state["matchday"]
+        self.matchday_minute = state["minute"]
+        self.tick_count = state["tick"]
+
+    def restore_standings(self, standings):
+        """Ripristina la classifica (squadra -> statistiche) e ricostruisce l'ordinamento"""
+        for team_id, row in standings.items():
+            self.standings[team_id].update(row)
+        self._ranking = Ranking((tid, standings_key(s)) for tid, s in self.standings.items())
+        self.standings_version += 1
+        self.version += 1
+
+
+# Cronaca per tipo di evento: (livello, messaggio); gli altri eventi non vanno nel log
+_SCORE = "%(home)s %(home_score)d-%(away_score)d %(away)s"
+EVENT_LOG_MESSAGES = {
+    "goal": (logging.INFO, "⚽ GOL! %(player)s (%(team)s) - " + _SCORE),
+    "penalty_scored": (logging.INFO, "⚽🎯 RIGORE SEGNATO! %(player)s (%(team)s) - " + _SCORE),
+    "penalty_missed": (logging.INFO, "❌ RIGORE SBAGLIATO! %(player)s (%(team)s) - " + _SCORE),
+    "red_card": (logging.INFO, "🟥 CARTELLINO ROSSO! %(player)s (%(team)s) - " + _SCORE),
+    "yellow_card": (logging.DEBUG, "🟨 Cartellino giallo: %(player)s (%(team)s) - " + _SCORE),
+    "corner": (logging.DEBUG, "🚩 Corner per %(team)s - " + _SCORE),
 }
 
-# Probabilità aumentate in certi periodi
-PERIOD_MULTIPLIERS = {
-    "early": (1, 15, 0.7),      # Inizio: eventi ridotti (studio tattico)
-    "normal": (16, 75, 1.0),    # Gioco normale
-    "final": (76, 90, 1.4),     # Finale: eventi aumentati (pressing)
-    "injury_time": (91, 95, 1.6) # Recupero: massima intensità
+# DURATA DELLE PARTITE
+FIRST_HALF_INJURY_TIME = (1, 5)     # Minuti di recupero (min, max) del 1° tempo
+SECOND_HALF_INJURY_TIME = (3, 7)    # Minuti di recupero (min, max) del 2° tempo
+
+
+# CAMPIONATI OSPITATI
+# Ogni campionato ha il proprio file squadre e una simulazione indipendente
+# (eventualmente in un processo worker, vedi SIMULATION_WORKERS)
+# seed: seme della simulazione (None = casuale, comunque salvato nel log)
+# engine: motore di simulazione ("classic" o "xg", vedi engine.py), seguito
+# anche dalle previsioni di montecarlo.py
+LEAGUES = {
+    "serie_a": {"name": "Serie A 2025/2026", "teams_file": "teams.json", "seed": None,
+                "engine": "classic"},
 }
+DEFAULT_LEAGUE = "serie_a"
+
+# ARTEFATTI PRECOMPILATI (vedi artifacts.py)
+# Squadre normalizzate e calendario di ogni file squadre sono salvati in
+# ARTIFACT_DIR, con l'hash del file nel nome: riavvii, processi worker e
+# script li leggono da lì. Modificare il file squadre rigenera l'artefatto.
+# None: sempre dal file squadre.
+ARTIFACT_DIR = ".cache"
 
-# INIZIALIZZA IL CAMPIONATO
-championship = Championship(teams_db[:20])  # Usa tutte le 20 squadre
-matches = championship.matches
 
+def load_league_data(teams_file):
+    """Squadre normalizzate e partite ((giornata, id casa, id trasferta)) di un file squadre"""
+    if ARTIFACT_DIR is None:
+        teams = load_teams(teams_file)
+        return teams, build_calendar([team["id"] for team in teams])
 
-def simulate_match_history(home_team, away_team, current_minute):
+    path = artifacts.artifact_path(ARTIFACT_DIR, teams_file)
+    try:
+        return artifacts.load(path)
+    except FileNotFoundError:
+        pass
+    except ValueError as e:
+        log.warning("⚠️ Artefatto non valido, viene rigenerato: %s", e)
+    teams = load_teams(teams_file)
+    fixtures = build_calendar([team["id"] for team in teams])
+    try:
+        artifacts.save(path, teams, fixtures)
+    except OSError as e:
+        log.warning("⚠️ Artefatto %s non salvato: %s", path, e)
+    return teams, fixtures
+
+
+def create_league(league_id):
+    """Crea un campionato di LEAGUES con squadre e calendario"""
+    config = LEAGUES[league_id]
+    teams, fixtures = load_league_data(config["teams_file"])
+    league = Championship(teams, league_id=league_id, name=config["name"], seed=config.get("seed"),
+                          engine=config.get("engine"), fixtures=fixtures)
+    log.info("📅 [%s] Calendario con %d partite (%d giornate)", league.name, len(league.matches),
+             league.num_matchdays, extra={"league": league_id})
+    return league
+
+
+class LeagueRegistry(Mapping):
     """
-    Simula la storia di un match fino al minuto corrente.
-    Genera eventi realistici basati sulle probabilità e sulla forza delle squadre.
+    Campionati di LEAGUES, creati al primo accesso (leagues[id]): importare
+    il modulo non carica nulla e un processo worker crea solo i campionati
+    del suo shard. La creazione è protetta da un lock: main() crea i
+    campionati in un thread mentre il server è già in ascolto.
+
+    Stato di ogni campionato (status()):
+    - "pending": non ancora creato
+    - "loaded": squadre e calendario pronti, stato non ancora allineato
+    - "ready": stato allineato alla simulazione (avviata o ripresa dal
+      salvataggio, o ricevuta dal bus in un nodo edge); solo da qui in poi
+      pagine, API e WebSocket lo servono (vedi get_league)
+    - "stopped": simulazione interrotta (worker terminato con errore): non
+      più servito, i dati resterebbero fermi
     """
-    home_score = 0
-    away_score = 0
-    events = []
-    
-    # Calcola bias in base alla differenza di forza
-    strength_diff = home_team["strength"] - away_team["strength"]
-    home_bias = 0.5 + (strength_diff / 200)  # Da 0.3 a 0.7 circa
-    
-    for minute in range(1, current_minute + 1):
-        # Determina moltiplicatore del periodo
-        multiplier = get_period_multiplier(minute)
-        
-        # Genera eventi casuali
-        for event_type, base_prob in EVENT_PROBABILITIES.items():
-            adjusted_prob = base_prob * multiplier
-            
-            if random.random() < adjusted_prob:
-                event = generate_event(
-                    event_type, minute, home_team, away_team, 
-                    home_bias, home_score, away_score
-                )
-                
-                if event:
-                    events.append(event)
-                    
-                    # Aggiorna punteggio se è un goal
-                    if event_type == "goal" and event.get("scored"):
-                        if event["team"] == "home":
-                            home_score += 1
-                        else:
-                            away_score += 1
-                    
-                    # Penalty trasformato in goal
-                    if event_type == "penalty" and event.get("scored"):
-                        if event["team"] == "home":
-                            home_score += 1
-                        else:
-                            away_score += 1
-    
-    return home_score, away_score, events
 
+    def __init__(self, configs):
+        self._configs = configs
+        self._leagues = {}
+        self._status = dict.fromkeys(configs, "pending")
+        self._lock = threading.Lock()
+
+    def __getitem__(self, league_id):
+        league = self._leagues.get(league_id)
+        if league is not None:
+            return league
+        if league_id not in self._configs:
+            raise KeyError(league_id)
+        with self._lock:
+            league = self._leagues.get(league_id)
+            if league is None:
+                league = self._leagues[league_id] = create_league(league_id)
+                self._status[league_id] = "loaded"
+        return league
+
+    def __contains__(self, league_id):
+        # Senza creare il campionato (Mapping userebbe __getitem__)
+        return league_id in self._configs
+
+    def __iter__(self):
+        return iter(self._configs)
+
+    def __len__(self):
+        return len(self._configs)
+
+    def loaded(self):
+        """Campionati già creati (id -> campionato), senza crearne altri"""
+        return dict(self._leagues)
+
+    def status(self):
+        return dict(self._status)
+
+    def is_ready(self, league_id):
+        return self._status.get(league_id) == "ready"
+
+    def set_ready(self, league_id):
+        self[league_id]
+        if self._status[league_id] != "ready":
+            self._status[league_id] = "ready"
+            log.info("🟢 [%s] Pronto", LEAGUES[league_id]["name"], extra={"league": league_id})
+
+    def set_stopped(self, league_id):
+        self._status[league_id] = "stopped"
+        log.error("🔴 [%s] Simulazione interrotta: campionato non più servito", LEAGUES[league_id]["name"],
+                  extra={"league": league_id})
+
+
+leagues = LeagueRegistry(LEAGUES)
+
+
+def __getattr__(name):
+    # Campionato predefinito (script e benchmark: server.championship), creato al primo accesso
+    if name == "championship":
+        return leagues[DEFAULT_LEAGUE]
+    if name == "matches":
+        return leagues[DEFAULT_LEAGUE].matches
+    if name == "num_matchdays":
+        return leagues[DEFAULT_LEAGUE].num_matchdays
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# BROADCAST VERSO I CLIENT WEBSOCKET
+# Ogni messaggio è codificato (e compresso) una sola volta per tutti i client;
+# i client con più di 1 MB in coda vengono disconnessi.
+WS_COMPRESSION = True
+broadcaster = Broadcaster(max_pending_bytes=1024 * 1024, policy="close")
+clients = broadcaster.clients
+
+# FORMATI DEI MESSAGGI (vedi serialization.py)
+# JSON con il backend più veloce installato (orjson, msgspec o json) per API
+# e client; MessagePack (frame binari) per i client WebSocket che lo chiedono
+# con il sottoprotocollo "livescore.msgpack". Ogni messaggio è codificato una
+# volta per formato usato da almeno un destinatario.
+JSON_BACKEND = None             # None = automatico; "orjson", "msgspec" o "stdlib"
+codecs = create_codecs(JSON_BACKEND)
+
+# METRICHE (GET /metrics, formato Prometheus; vedi metrics.py)
+# Sul percorso caldo solo osservazioni di istogrammi (una bisect); i valori
+# che esistono già (client, code, contatori) sono letti solo allo scrape.
+# Nei nodi edge la durata dei tick è quella misurata dal simulatore.
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
 
-def get_period_multiplier(minute):
+registry = Registry()
+tick_duration = registry.histogram(
+    "livescore_tick_duration_seconds", "Durata del calcolo di un tick (Championship.tick)", ["league"])
+delivery_delay = registry.histogram(
+    "livescore_batch_delivery_delay_seconds",
+    "Ritardo tra la fine del tick e la pubblicazione ai client di questo processo (code, bus)", ["league"])
+publish_duration = registry.histogram(
+    "livescore_publish_duration_seconds",
+    "Pubblicazione di un batch: messaggi per topic, codifica e fan-out", ["league"])
+fanout_duration = registry.histogram(
+    "livescore_fanout_duration_seconds", "Codifica e fan-out di un messaggio ai sottoscrittori di un topic")
+message_bytes = registry.histogram(
+    "livescore_message_bytes", "Dimensione dei messaggi codificati (update: per topic, snapshot: stato iniziale)",
+    ["kind", "format"], buckets=SIZE_BUCKETS)
+loop_lag = registry.histogram(
+    "livescore_event_loop_lag_seconds", "Ritardo dell'event loop (campionato ogni 0,5 s)")
+registry.counter("livescore_ticks_total", "Minuti simulati", ["league"],
+                 function=lambda: {(lid, ): league.tick_count for lid, league in leagues.loaded().items()})
+registry.gauge("livescore_league_ready", "Campionato pronto (1) o in caricamento (0)", ["league"],
+               function=lambda: {(lid, ): int(status == "ready") for lid, status in leagues.status().items()})
+registry.gauge("livescore_clients", "Client WebSocket connessi", ["league"], function=lambda: clients_by_league())
+registry.gauge("livescore_topics", "Topic con almeno un sottoscrittore", function=lambda: len(broadcaster.topics))
+registry.gauge("livescore_client_pending_bytes_max", "Byte in coda di uscita del client più lento",
+               function=lambda: max(client_pending_bytes(), default=0))
+registry.gauge("livescore_client_pending_bytes", "Byte in coda di uscita di tutti i client",
+               function=lambda: sum(client_pending_bytes()))
+registry.counter("livescore_broadcast_total", "Contatori del broadcast (vedi broadcast.BroadcastStats)", ["kind"],
+                 function=lambda: {(key, ): value for key, value in broadcaster.stats.snapshot().items()
+                                   if not key.endswith("_ms")})
+registry.counter("livescore_snapshot_cache_total", "Stato iniziale servito dalla cache (hit) o ricodificato (miss)",
+                 ["result"], function=lambda: {
+                     ("hit", ): sum(cache.hits for cache in snapshot_caches.values()),
+                     ("miss", ): sum(cache.misses for cache in snapshot_caches.values())})
+registry.counter("livescore_bus_messages_total", "Messaggi del bus tra processi", ["result"],
+                 function=lambda: {(key, ): getattr(message_bus, key) for key in ("published", "received", "dropped")
+                                   if hasattr(message_bus, key)})
+registry.gauge("livescore_log_queue_depth", "Record di log in attesa di scrittura",
+               function=lambda: log_handler.queue.qsize() if log_handler else 0)
+registry.counter("livescore_log_records_dropped_total", "Record di log scartati a coda piena",
+                 function=lambda: log_handler.dropped if log_handler else 0)
+registry.counter("process_cpu_seconds_total", "Tempo di CPU del processo", function=time.process_time)
+
+
+def observe_update_size(wire_format, frame):
+    message_bytes.observe(len(frame.payload), "update", wire_format)
+
+
+def observe_snapshot_size(wire_format, frame):
+    message_bytes.observe(len(frame.payload), "snapshot", wire_format)
+
+
+def clients_by_league():
+    counts = dict.fromkeys(((league_id, ) for league_id in leagues), 0)
+    for client in clients:
+        counts[(client.league.league_id, )] += 1
+    return counts
+
+
+def client_pending_bytes():
+    return [pending_bytes(client.ws_connection.stream) for client in clients
+            if client.ws_connection is not None and client.ws_connection.stream is not None]
+
+
+# TOPIC DI SOTTOSCRIZIONE
+# /ws                   -> "live": giornata in corso (segue il cambio di giornata)
+# /ws?matchday=current  -> "live" (esplicito)
+# /ws?matchday=<n>      -> "matchday:<n>": solo le partite di quella giornata
+# /ws?match=<id>        -> "match:<id>": solo quel match (pagina di dettaglio)
+# /ws?standings=1       -> "standings": solo la classifica
+# /ws?standings=live    -> "standings:live": classifica con i risultati parziali delle partite in corso
+# /ws?stats=1           -> "stats": statistiche della stagione (marcatori, assist, cartellini)
+# /ws?league=<id>&...   -> i topic si riferiscono a quel campionato (default: DEFAULT_LEAGUE)
+# Nel broadcaster ogni topic è indicizzato come (id campionato, topic).
+TOPIC_LIVE = "live"
+TOPIC_STANDINGS = "standings"
+TOPIC_LIVE_STANDINGS = "standings:live"
+TOPIC_STATS = "stats"
+
+
+class LeagueNotReady(Exception):
+    """Campionato esistente ma non ancora pronto (caricamento o ripresa all'avvio)"""
+
+
+# Secondi dopo cui riprovare una richiesta a un campionato non ancora pronto (Retry-After)
+NOT_READY_RETRY_AFTER = 1
+
+
+def get_league(league_id=None):
     """
-    Restituisce il moltiplicatore di probabilità in base al minuto.
+    Campionato con l'id indicato (default: DEFAULT_LEAGUE).
+    Solleva ValueError se il campionato non esiste, LeagueNotReady se non è
+    ancora pronto.
     """
-    for period_name, (start, end, mult) in PERIOD_MULTIPLIERS.items():
-        if start <= minute <= end:
-            return mult
-    return 1.0
+    league_id = league_id or DEFAULT_LEAGUE
+    if league_id not in leagues:
+        raise ValueError(f"Campionato non trovato: {league_id}")
+    if not leagues.is_ready(league_id):
+        if leagues.status()[league_id] == "stopped":
+            raise LeagueNotReady(f"Simulazione interrotta: {league_id}")
+        raise LeagueNotReady(f"Campionato non ancora pronto: {league_id}")
+    return leagues[league_id]
 
 
-def generate_event(event_type, minute, home_team, away_team, home_bias, home_score, away_score):
+def parse_topics(championship, match_id=None, matchday=None, standings=None, stats=None):
     """
-    Genera un evento specifico con dati realistici.
+    Converte i parametri della connessione WebSocket nella lista di topic.
+    Solleva ValueError se un parametro non è valido.
     """
-    # Determina quale squadra causa l'evento (con bias)
-    team = "home" if random.random() < home_bias else "away"
-    team_data = home_team if team == "home" else away_team
-    team_name = team_data["name"]
-    
-    # Seleziona un giocatore casuale
-    player = random.choice(team_data["players"])
-    
-    event = {
-        "minute": minute,
-        "type": event_type,
-        "team": team,
-        "player": player,
-        "team_name": team_name
-    }
-    
-    # Dettagli specifici per tipo di evento
-    if event_type == "goal":
-        event["scored"] = True
-        # Tipo di goal
-        goal_types = ["tiro", "colpo di testa", "punizione", "contropiede"]
-        event["detail"] = random.choice(goal_types)
-        
-        # Possibile assistente
-        if random.random() < 0.7:  # 70% dei goal hanno un assist
-            other_players = [p for p in team_data["players"] if p != player]
-            event["assist"] = random.choice(other_players)
-    
-    elif event_type == "penalty":
-        # 75% di probabilità di segnare un rigore
-        scored = random.random() < 0.75
-        event["scored"] = scored
-        event["detail"] = "segnato" if scored else "sbagliato"
-    
-    elif event_type == "substitution":
-        # Solo dopo il 45° minuto
-        if minute < 45:
+    topics = []
+    if match_id is not None:
+        if match_id not in championship.matches:
+            raise ValueError(f"Match non trovato: {match_id}")
+        topics.append(f"match:{match_id}")
+    if matchday is not None:
+        if matchday == "current":
+            topics.append(TOPIC_LIVE)
+        elif matchday.isdigit() and 1 <= int(matchday) <= championship.num_matchdays:
+            topics.append(f"matchday:{int(matchday)}")
+        else:
+            raise ValueError(f"Giornata non valida: {matchday}")
+    if standings == "live":
+        topics.append(TOPIC_LIVE_STANDINGS)
+    elif standings not in (None, "", "0"):
+        topics.append(TOPIC_STANDINGS)
+    if stats not in (None, "", "0"):
+        topics.append(TOPIC_STATS)
+    return topics or [TOPIC_LIVE]
+
+
+def topic_match_ids(championship, topic):
+    """
+    Match inclusi nello stato iniziale di un topic. Le giornate diverse da
+    quella richiesta non sono mai incluse: si caricano via HTTP (/api/matches).
+    """
+    if topic == TOPIC_LIVE:
+        return list(championship.get_matches_by_matchday(championship.current_matchday))
+    if topic.startswith("matchday:"):
+        return list(championship.get_matches_by_matchday(int(topic.split(":", 1)[1])))
+    if topic.startswith("match:"):
+        return [topic.split(":", 1)[1]]
+    return []
+
+
+def build_topic_update(championship, topic, deltas, standings, started_matchday, live_standings=None,
+                       stats_update=None):
+    """
+    Costruisce il match_update per un topic a partire dai delta del tick
+    (per il topic delle statistiche lo stats_update già pronto).
+    Restituisce None se il tick non contiene nulla per quel topic.
+    """
+    if topic == TOPIC_STATS:
+        return stats_update
+
+    matches = championship.matches
+    message = {"type": "match_update", "deltas": [], "standings": None,
+               "current_matchday": championship.current_matchday}
+
+    if topic == TOPIC_LIVE_STANDINGS:
+        if live_standings is None:
             return None
-        other_players = [p for p in team_data["players"] if p != player]
-        event["player_in"] = random.choice(other_players)
-        event["player_out"] = player
-    
-    elif event_type == "injury":
-        event["severity"] = random.choice(["lieve", "moderata", "grave"])
-    
-    elif event_type == "yellow_card":
-        reasons = ["fallo", "simulazione", "proteste", "gioco pericoloso"]
-        event["reason"] = random.choice(reasons)
-    
-    elif event_type == "red_card":
-        reasons = ["doppia ammonizione", "fallo grave", "condotta violenta"]
-        event["reason"] = random.choice(reasons)
-    
-    return event
+        message["live_standings"] = live_standings
+        return message
+
+    if topic == TOPIC_STANDINGS:
+        if standings is None:
+            return None
+        message["standings"] = standings
+        return message
+
+    if topic.startswith("match:"):
+        match_id = topic.split(":", 1)[1]
+        message["deltas"] = [d for d in deltas if d["id"] == match_id]
+        return message if message["deltas"] else None
+
+    if topic.startswith("matchday:"):
+        matchday = int(topic.split(":", 1)[1])
+        message["deltas"] = [d for d in deltas if matches[d["id"]].matchday == matchday]
+    elif started_matchday is not None:
+        # Cambio di giornata: le nuove partite arrivano come snapshot completi,
+        # così il client non deve chiedere un resync per ognuna
+        message["deltas"] = [d for d in deltas if matches[d["id"]].matchday != started_matchday]
+        started_ids = list(championship.get_matches_by_matchday(started_matchday))
+        message["matches"] = [championship.match_snapshot(mid) for mid in started_ids]
+        message["teams"] = championship.teams_snapshot(started_ids)
+    else:
+        message["deltas"] = deltas
+
+    message["standings"] = standings
+    if not message["deltas"] and not message.get("matches") and standings is None:
+        return None
+    return message
+
+
+def build_initial_state(championship, topics):
+    """Stato iniziale compatto per una connessione con i topic indicati"""
+    # dict.fromkeys: unione dei match dei topic senza duplicati, in ordine
+    match_ids = list(dict.fromkeys(
+        mid for topic in topics for mid in topic_match_ids(championship, topic)))
+    state = {
+        "type": "initial_state",
+        "protocol": PROTOCOL_VERSION,
+        "league": championship.league_id,
+        "topics": list(topics),
+        "teams": championship.teams_snapshot(match_ids),
+        "matches": {mid: championship.match_snapshot(mid) for mid in match_ids},
+        "standings": championship.get_sorted_standings(),
+        "current_matchday": championship.current_matchday,
+        "num_matchdays": championship.num_matchdays
+    }
+    if TOPIC_LIVE_STANDINGS in topics:
+        state["live_standings"] = championship.get_live_standings()
+    if TOPIC_STATS in topics:
+        state["stats"] = stats_summary(stats_index(championship))
+    return state
+
+
+class SnapshotCache:
+    """
+    Stato iniziale già codificato (FrameSet: un Frame WebSocket pronto per
+    formato) per ogni combinazione di topic. Viene svuotata solo quando cambia
+    la versione del campionato: le connessioni successive costano una copia
+    di byte, non una nuova codifica.
+    """
+
+    def __init__(self, championship):
+        self.championship = championship
+        self._version = None
+        self._frames = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, topics):
+        if self._version != self.championship.version:
+            self._frames.clear()
+            self._version = self.championship.version
+
+        key = tuple(topics)
+        frame = self._frames.get(key)
+        if frame is None:
+            self.misses += 1
+            frame = FrameSet(build_initial_state(self.championship, topics), codecs, observe_snapshot_size)
+            self._frames[key] = frame
+        else:
+            self.hits += 1
+        return frame
+
+
+# Una cache per campionato (ognuno ha la sua versione), creata al primo client
+snapshot_caches = {}
+
+
+def snapshot_cache(championship):
+    cache = snapshot_caches.get(championship.league_id)
+    if cache is None:
+        cache = snapshot_caches[championship.league_id] = SnapshotCache(championship)
+    return cache
+
+
+# STATISTICHE DELLA STAGIONE (vedi stats.py)
+# Un indice per campionato, aggiornato da publish_batch con gli eventi di ogni
+# batch (anche senza client: le API lo trovano già pronto), sia nel processo
+# che simula sia in quello che riceve i batch dai worker o dal bus. Dopo un
+# ripristino dello stato (epoch cambiata) è ricreato da tutti gli eventi.
+# Il topic "stats" riceve a ogni tick solo le righe cambiate: i valori
+# crescono e basta, quindi il client tiene aggiornate le classifiche
+# fondendo le righe ricevute con quelle dello stato iniziale.
+STATS_LEADERS_LIMIT = 10         # giocatori per classifica nello stato iniziale
+MAX_STATS_LEADERS_LIMIT = 100    # massimo per /api/stats/leaders?limit=
+stats_indexes = {}
+
+
+def stats_index(championship):
+    index = stats_indexes.get(championship.league_id)
+    if index is None or index.epoch != championship.epoch:
+        started = time.perf_counter()
+        index = stats_indexes[championship.league_id] = StatsIndex(championship)
+        log.debug("📊 [%s] Statistiche indicizzate: %d giocatori in %.1f ms", championship.name,
+                  len(index.players), (time.perf_counter() - started) * 1000,
+                  extra={"league": championship.league_id})
+    return index
+
+
+def stats_summary(index, limit=STATS_LEADERS_LIMIT):
+    """Classifiche dei giocatori (primi limit) e totali delle squadre"""
+    return {
+        "leaders": {category: index.top(category, limit) for category in LEADER_CATEGORIES},
+        "teams": {team_id: dict(row) for team_id, row in index.teams.items()},
+    }
 
 
-# GENERA I MATCH INIZIALI
-# Le partite sono generate dal calendario del campionato
-num_matchdays = max(m["matchday"] for m in matches.values())
-print(f"📅 Calendario generato con {len(matches)} partite ({num_matchdays} giornate)")
+def build_stats_update(index, players, teams):
+    """Righe cambiate in un tick (copie: il messaggio è codificato più tardi)"""
+    return {
+        "type": "stats_update",
+        "players": [dict(index.players[key]) for key in sorted(players)],
+        "teams": {team_id: dict(index.teams[team_id]) for team_id in sorted(teams)},
+    }
+
+
+def publish_updates(championship, deltas, standings_updated, started_matchday=None, tick_time=None,
+                    stats_changes=None):
+    """
+    Invia a ogni topic attivo del campionato il proprio aggiornamento,
+    codificato una sola volta. stats_changes: (giocatori, squadre) cambiati
+    nell'indice delle statistiche.
+    """
+    league_id = championship.league_id
+    standings = championship.get_sorted_standings() if standings_updated else None
+
+    # La classifica live cambia solo quando cambia un punteggio o finisce una partita
+    live_standings = None
+    if (league_id, TOPIC_LIVE_STANDINGS) in broadcaster.topics and (
+            standings_updated or any("score" in d for d in deltas)):
+        live_standings = championship.get_live_standings()
+
+    stats_update = None
+    if stats_changes is not None and any(stats_changes) and (league_id, TOPIC_STATS) in broadcaster.topics:
+        stats_update = build_stats_update(stats_index(championship), *stats_changes)
+
+    for key in broadcaster.active_topics():
+        topic_league, topic = key
+        if topic_league != league_id:
+            continue
+        message = build_topic_update(championship, topic, deltas, standings,
+                                     started_matchday, live_standings, stats_update)
+        if message is not None:
+            message["tick_time"] = tick_time
+            # Codifica (per formato) e fan-out: la codifica avviene al primo destinatario
+            start = time.perf_counter()
+            broadcaster.publish_topic(key, FrameSet(message, codecs, observe_update_size))
+            fanout_duration.observe(time.perf_counter() - start)
+
+
+def publish_batch(batch):
+    """Invia ai client il batch di un tick (prodotto qui o in un processo worker)"""
+    league = leagues[batch["league"]]
+    tick_time = batch.get("tick_time")
+    if tick_time is not None:
+        delivery_delay.observe(max(0.0, time.time() - tick_time), batch["league"])
+    # Solo gli eventi nuovi dei match del batch
+    stats_changes = stats_index(league).update(delta["id"] for delta in batch["deltas"])
+    if (batch["deltas"] or batch["standings_updated"]) and clients:
+        # Un messaggio per topic, inviato solo ai client interessati
+        start = time.perf_counter()
+        publish_updates(league, batch["deltas"], batch["standings_updated"],
+                        batch["started_matchday"], tick_time, stats_changes)
+        publish_duration.observe(time.perf_counter() - start, batch["league"])
+
+
+# NODI EDGE (vedi bus.py)
+# Il processo che simula pubblica ogni batch anche sul bus, un canale per
+# campionato. I processi edge (--role edge) non simulano: applicano i batch
+# alla propria copia dei campionati e servono i client come questo processo.
+# Ruoli: "all" (simula e serve i client), "sim" (solo simulazione), "edge".
+BUS_URL = None                  # None = nello stesso processo; es. "tcp://127.0.0.1:6380"
+BUS_CHANNEL_PREFIX = "livescore"
+STATE_REQUESTS_CHANNEL = f"{BUS_CHANNEL_PREFIX}:state_requests"
+STATE_REQUEST_RETRY = 2.0       # secondi tra due richieste di stato di un edge non allineato
+HTTP_PORT = 8888
+
+message_bus = create_bus()      # sostituito da main() con quello di BUS_URL / --bus
+
+
+def league_channel(league_id):
+    return f"{BUS_CHANNEL_PREFIX}:{league_id}"
+
+
+def deliver_batch(batch):
+    """Nel processo che simula: batch ai client di questo processo e ai nodi edge"""
+    if "tick_seconds" in batch:
+        tick_duration.observe(batch["tick_seconds"], batch["league"])
+    publish_batch(batch)
+    message_bus.publish(league_channel(batch["league"]), batch)
+
+
+def publish_state(request):
+    """
+    Richiesta di un edge: lo stato completo del campionato viaggia sul canale
+    dei batch, quindi arriva esattamente tra il tick già applicato e il successivo
+    """
+    league_id = request.get("league")
+    # Finché il campionato non è pronto l'edge riprova (STATE_REQUEST_RETRY)
+    if leagues.is_ready(league_id):
+        league = leagues[league_id]
+        message_bus.publish(league_channel(league.league_id),
+                            {"type": "state", "league": league.league_id, **league.state()})
+
+
+class LeagueFeed:
+    """
+    Copia di un campionato in un nodo edge, allineata ai messaggi del bus.
+    Un batch è applicato solo se prosegue dall'ultimo tick applicato: a un
+    buco (edge appena avviato, messaggi persi, simulatore riavviato) chiede
+    lo stato completo e scarta i batch finché non arriva.
+    """
+
+    def __init__(self, championship):
+        self.championship = championship
+        self.synced = False
+        self.resyncs = 0
+        self._requested = None  # time.monotonic() dell'ultima richiesta di stato
+
+    def request_state(self):
+        now = time.monotonic()
+        if self._requested is None or now - self._requested >= STATE_REQUEST_RETRY:
+            self._requested = now
+            message_bus.publish(STATE_REQUESTS_CHANNEL, {"league": self.championship.league_id})
+
+    def on_message(self, message):
+        championship = self.championship
+        if message.get("type") == "state":
+            if not self.synced:
+                championship.restore_state(message)
+                self.synced = True
+                self.resyncs += 1
+                log.info("🔄 [%s] Stato ricevuto dal simulatore: giornata %d, minuto %d (tick %d)",
+                         championship.name, championship.current_matchday, championship.matchday_minute,
+                         championship.tick_count, extra={"league": championship.league_id})
+                leagues.set_ready(championship.league_id)
+                # I client già connessi ripartono dal nuovo stato completo
+                for client in list(broadcaster.clients):
+                    if client.league is championship:
+                        client.send_initial_state()
+            return
+
+        if self.synced and message["tick"] - message["ticks"] == championship.tick_count:
+            championship.apply_batch(message)
+            publish_batch(message)
+        else:
+            self.synced = False
+            self.request_state()
 
-# SET GLOBALE PER CLIENT WEBSOCKET
-clients = set()
+
+async def start_edge_feeds():
+    """Nodo edge: sottoscrive i canali di tutti i campionati e li tiene allineati"""
+    feeds = []
+    async for league in load_leagues():
+        feed = LeagueFeed(league)
+        message_bus.subscribe(league_channel(league.league_id), feed.on_message)
+        feeds.append(feed)
+    # Finché un campionato non è allineato (es. simulatore non ancora avviato) si riprova
+    while True:
+        for feed in feeds:
+            if not feed.synced:
+                feed.request_state()
+        await asyncio.sleep(STATE_REQUEST_RETRY)
 
 
 # HANDLER HTTP
 class MainHandler(tornado.web.RequestHandler):
     def get(self):
-        self.render("index.html")
+        try:
+            league = get_league(self.get_argument("league", None))
+        except ValueError as e:
+            self.set_status(404)
+            self.write(str(e))
+            return
+        except LeagueNotReady as e:
+            self.set_status(503)
+            self.set_header("Retry-After", str(NOT_READY_RETRY_AFTER))
+            self.write(str(e))
+            return
+        self.render("index.html", league_id=league.league_id)
 
 
 class MatchHandler(tornado.web.RequestHandler):
     def get(self, match_id):
-        if match_id not in matches:
+        try:
+            league = get_league(self.get_argument("league", None))
+        except ValueError as e:
+            self.set_status(404)
+            self.write(str(e))
+            return
+        except LeagueNotReady as e:
+            self.set_status(503)
+            self.set_header("Retry-After", str(NOT_READY_RETRY_AFTER))
+            self.write(str(e))
+            return
+        if match_id not in league.matches:
             self.set_status(404)
             self.write("Match non trovato")
             return
-        self.render("match.html", match_id=match_id)
+        self.render("match.html", match_id=match_id, league_id=league.league_id)
+
+
+# API REST (sola lettura) per chi interroga periodicamente senza WebSocket.
+# Ogni risposta ha un ETag derivato dalle versioni del campionato: una
+# richiesta con If-None-Match ancora valido costa un 304 senza ricostruire
+# né serializzare nulla. I corpi sono in cache già codificati e compressi.
+API_LIVE_MAX_AGE = 1                 # secondi di cache per i dati che cambiano a ogni tick
+API_FINAL_MAX_AGE = 3600             # partite e giornate concluse (non cambiano più)
+API_STALE_WHILE_REVALIDATE = 5       # secondi in cui una CDN può servire la copia scaduta
+API_GZIP_MIN_BYTES = 512             # corpi più piccoli inviati senza compressione
+
+
+class ApiCache:
+    """
+    Risposte delle API di un campionato, una per risorsa: (etag, corpo JSON,
+    corpo gzip o None). Una risorsa è ricostruita solo quando cambia il suo ETag.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, resource, etag, build):
+        entry = self._entries.get(resource)
+        if entry is None or entry[0] != etag:
+            self.misses += 1
+            body = codecs["json"].encode(build())
+            gzipped = gzip.compress(body, 6) if len(body) >= API_GZIP_MIN_BYTES else None
+            entry = self._entries[resource] = (etag, body, gzipped)
+        else:
+            self.hits += 1
+        return entry
+
+
+api_caches = {league_id: ApiCache() for league_id in leagues}
+
+
+class ApiHandler(tornado.web.RequestHandler):
+    """Base delle API REST: campionato da ?league=, errori JSON, ETag, Cache-Control e gzip"""
+
+    def get_api_league(self):
+        """Campionato richiesto, o None dopo aver risposto 404 (o 503 se non è ancora pronto)"""
+        try:
+            return get_league(self.get_argument("league", None))
+        except ValueError as e:
+            self.write_error_json(404, str(e))
+            return None
+        except LeagueNotReady as e:
+            self.set_header("Retry-After", str(NOT_READY_RETRY_AFTER))
+            self.write_error_json(503, str(e))
+            return None
+
+    def write_error_json(self, status, message):
+        self.set_status(status)
+        self.set_header("Cache-Control", "no-store")
+        self.write({"error": message})
+
+    def not_modified(self, etag, max_age):
+        """Imposta ETag e Cache-Control; True (risposta 304 già pronta) se il client ha già questa versione"""
+        # ETag debole: la versione gzip e quella non compressa sono equivalenti
+        self.set_header("ETag", f'W/"{etag}"')
+        self.set_header("Cache-Control", f"public, max-age={max_age}, s-maxage={max_age}, "
+                                         f"stale-while-revalidate={API_STALE_WHILE_REVALIDATE}")
+        self.set_header("Vary", "Accept-Encoding")
+        if self.check_etag_header():
+            self.set_status(304)
+            return True
+        return False
+
+    def write_json(self, body, gzipped=None):
+        self.set_header("Content-Type", "application/json; charset=UTF-8")
+        if gzipped is not None and "gzip" in self.request.headers.get("Accept-Encoding", ""):
+            self.set_header("Content-Encoding", "gzip")
+            body = gzipped
+        self.write(body)
+
+    def send_cached(self, league, resource, etag, max_age, build):
+        """Risposta di una risorsa in cache (o 304), ricostruita con build() se è cambiata"""
+        if self.not_modified(etag, max_age):
+            return
+        _, body, gzipped = api_caches[league.league_id].get(resource, etag, build)
+        self.write_json(body, gzipped)
+
+    def get_api_match(self, league, match_id):
+        match = league.matches.get(match_id)
+        if match is None:
+            self.write_error_json(404, f"Match non trovato: {match_id}")
+        return match
+
+
+def etag_hash(text):
+    """Testo arbitrario (es. il nome di un giocatore) ridotto a esadecimale per un ETag"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def matches_max_age(matches):
+    """Cache lunga solo se tutte le partite sono concluse"""
+    if all(match.status == "finished" for match in matches):
+        return API_FINAL_MAX_AGE
+    return API_LIVE_MAX_AGE
+
+
+class MatchdayApiHandler(ApiHandler):
+    """Partite di una giornata (per le giornate non incluse nello stato iniziale)"""
+    def get(self):
+        league = self.get_api_league()
+        if league is None:
+            return
+
+        matchday = self.get_argument("matchday", str(league.current_matchday))
+        if not matchday.isdigit() or not 1 <= int(matchday) <= league.num_matchdays:
+            self.write_error_json(400, f"Giornata non valida: {matchday}")
+            return
+
+        matchday = int(matchday)
+        match_ids = list(league.get_matches_by_matchday(matchday))
+        day_matches = [league.matches[mid] for mid in match_ids]
+        # I seq dei match crescono a ogni cambiamento: la somma cambia se cambia un match
+        etag = f"{league.league_id}:md{matchday}:{league.epoch}:{sum(m.seq for m in day_matches)}"
+        self.send_cached(league, f"matchday:{matchday}", etag, matches_max_age(day_matches), lambda: {
+            "league": league.league_id,
+            "matchday": matchday,
+            "teams": league.teams_snapshot(match_ids),
+            "matches": {mid: league.match_snapshot(mid) for mid in match_ids}
+        })
+
+
+class MatchApiHandler(ApiHandler):
+    """Stato completo di un match"""
+    def get(self, match_id):
+        league = self.get_api_league()
+        if league is None:
+            return
+        match = self.get_api_match(league, match_id)
+        if match is None:
+            return
+
+        etag = f"{league.league_id}:m{match_id}:{league.epoch}:{match.seq}"
+        self.send_cached(league, f"match:{match_id}", etag, matches_max_age([match]), lambda: {
+            "league": league.league_id,
+            "teams": league.teams_snapshot([match_id]),
+            "match": league.match_snapshot(match_id)
+        })
+
+
+class MatchEventsApiHandler(ApiHandler):
+    """
+    Eventi di un match a partire dal numero since (quanti eventi il client ha
+    già): "next" è il valore di since da usare alla richiesta successiva.
+    """
+    def get(self, match_id):
+        league = self.get_api_league()
+        if league is None:
+            return
+        match = self.get_api_match(league, match_id)
+        if match is None:
+            return
+
+        since = self.get_argument("since", "0")
+        if not since.isdigit():
+            self.write_error_json(400, f"since non valido: {since}")
+            return
+
+        since = int(since)
+        etag = f"{league.league_id}:e{match_id}:{league.epoch}:{match.seq}:{since}"
+        if self.not_modified(etag, matches_max_age([match])):
+            return
+        # Non in cache: una risposta per ogni valore di since
+        self.write_json(codecs["json"].encode({
+            "league": league.league_id,
+            "id": match_id,
+            "seq": match.seq,
+            "status": match.status,
+            "minute": match.minute,
+            "score": match.score,
+            "events": [event.to_wire() for event in match.events[since:]],
+            "next": len(match.events)
+        }))
+
+
+class StandingsApiHandler(ApiHandler):
+    """Classifica ufficiale (o live con ?live=1, con le partite in corso come se finissero ora)"""
+    def get(self):
+        league = self.get_api_league()
+        if league is None:
+            return
+
+        if self.get_argument("live", None) in ("1", "true"):
+            etag = f"{league.league_id}:live:{league.epoch}:{league.version}"
+            self.send_cached(league, "live_standings", etag, API_LIVE_MAX_AGE, lambda: {
+                "league": league.league_id,
+                "current_matchday": league.current_matchday,
+                "standings": league.get_live_standings()
+            })
+            return
+
+        etag = f"{league.league_id}:st:{league.epoch}:{league.standings_version}"
+        self.send_cached(league, "standings", etag, API_LIVE_MAX_AGE, lambda: {
+            "league": league.league_id,
+            "standings": league.get_sorted_standings()
+        })
+
+
+class StatsLeadersApiHandler(ApiHandler):
+    """
+    Classifiche dei giocatori: ?category=goals|assists|yellow_cards|red_cards
+    (default: tutte) e ?limit= (default STATS_LEADERS_LIMIT)
+    """
+    def get(self):
+        league = self.get_api_league()
+        if league is None:
+            return
+
+        category = self.get_argument("category", None)
+        if category is not None and category not in LEADER_CATEGORIES:
+            self.write_error_json(400, f"Categoria non valida: {category} "
+                                       f"(disponibili: {', '.join(LEADER_CATEGORIES)})")
+            return
+        limit = self.get_argument("limit", str(STATS_LEADERS_LIMIT))
+        if not limit.isdigit() or not 1 <= int(limit) <= MAX_STATS_LEADERS_LIMIT:
+            self.write_error_json(400, f"limit non valido: {limit} (da 1 a {MAX_STATS_LEADERS_LIMIT})")
+            return
+
+        limit = int(limit)
+        index = stats_index(league)
+        categories = LEADER_CATEGORIES if category is None else (category,)
+        etag = f"{league.league_id}:sl:{category}:{limit}:{league.epoch}:{index.version}"
+        self.send_cached(league, f"leaders:{category}:{limit}", etag, API_LIVE_MAX_AGE, lambda: {
+            "league": league.league_id,
+            "leaders": {name: index.top(name, limit) for name in categories}
+        })
+
+
+class PlayerStatsApiHandler(ApiHandler):
+    """
+    Statistiche di un giocatore (?team=<id squadra>&name=<nome>) con la
+    posizione in ogni classifica e i suoi eventi (?events=0 per ometterli)
+    """
+    def get(self):
+        league = self.get_api_league()
+        if league is None:
+            return
+
+        team_id = self.get_argument("team", "")
+        name = self.get_argument("name", "")
+        if team_id not in league.teams_by_id:
+            self.write_error_json(404, f"Squadra non trovata: {team_id}")
+            return
+        index = stats_index(league)
+        events = index.player_events.get((team_id, name))
+        if events is None:
+            self.write_error_json(404, f"Nessun evento per {name} ({team_id})")
+            return
+
+        with_events = self.get_argument("events", "1") not in ("0", "false")
+        # Le posizioni in classifica cambiano anche quando segnano gli altri: versione dell'indice.
+        # Il nome arriva dalla richiesta: nell'ETag solo il suo hash
+        etag = (f"{league.league_id}:sp:{team_id}:{etag_hash(name)}:{int(with_events)}:"
+                f"{league.epoch}:{index.version}")
+        if self.not_modified(etag, API_LIVE_MAX_AGE):
+            return
+        body = {"league": league.league_id, **index.player(team_id, name)}
+        if with_events:
+            body["events"] = index.player_event_list(team_id, name)
+        self.write_json(codecs["json"].encode(body))
+
+
+class TeamStatsApiHandler(ApiHandler):
+    """
+    Totali di una squadra e dei suoi giocatori; con ?type=<tipo di evento>
+    (es. goal, yellow_card) anche gli eventi di quel tipo
+    """
+    def get(self, team_id):
+        league = self.get_api_league()
+        if league is None:
+            return
+        if team_id not in league.teams_by_id:
+            self.write_error_json(404, f"Squadra non trovata: {team_id}")
+            return
+
+        event_type = self.get_argument("type", None)
+        if event_type is not None and event_type not in EVENT_TYPES:
+            self.write_error_json(400, f"Tipo di evento non valido: {event_type} "
+                                       f"(disponibili: {', '.join(EVENT_TYPES)})")
+            return
+        index = stats_index(league)
+        etag = f"{league.league_id}:st:{team_id}:{event_type}:{league.epoch}:{index.version}"
+        if self.not_modified(etag, API_LIVE_MAX_AGE):
+            return
+        body = {"league": league.league_id, **index.team(team_id)}
+        if event_type is not None:
+            body["event_list"] = index.team_event_list(team_id, event_type)
+        self.write_json(codecs["json"].encode(body))
+
+
+class HeadToHeadApiHandler(ApiHandler):
+    """Scontri diretti conclusi tra due squadre: ?teams=<id>,<id>"""
+    def get(self):
+        league = self.get_api_league()
+        if league is None:
+            return
+
+        team_ids = self.get_argument("teams", "").split(",")
+        if len(team_ids) != 2 or team_ids[0] == team_ids[1]:
+            self.write_error_json(400, "Indicare due squadre diverse: ?teams=<id>,<id>")
+            return
+        for team_id in team_ids:
+            if team_id not in league.teams_by_id:
+                self.write_error_json(404, f"Squadra non trovata: {team_id}")
+                return
+
+        index = stats_index(league)
+        played = len(index.head_to_head.get(team_pair(*team_ids), ()))
+        etag = f"{league.league_id}:h2h:{'-'.join(team_pair(*team_ids))}:{league.epoch}:{played}"
+        if self.not_modified(etag, API_LIVE_MAX_AGE):
+            return
+        self.write_json(codecs["json"].encode({"league": league.league_id, **index.h2h(*team_ids)}))
+
+
+MAX_FORECAST_SEASONS = 200000
+
+
+class ForecastHandler(tornado.web.RequestHandler):
+    """
+    Previsioni Monte Carlo (scudetto, Champions, retrocessione) dallo stato attuale.
+    Il calcolo gira in un thread separato per non bloccare l'event loop.
+    """
+    async def get(self):
+        try:
+            import montecarlo  # richiede NumPy
+        except ImportError:
+            self.set_status(503)
+            self.write({"error": "Previsioni non disponibili: NumPy non installato"})
+            return
+
+        try:
+            league = get_league(self.get_argument("league", None))
+        except ValueError as e:
+            self.set_status(404)
+            self.write({"error": str(e)})
+            return
+        except LeagueNotReady as e:
+            self.set_status(503)
+            self.set_header("Retry-After", str(NOT_READY_RETRY_AFTER))
+            self.write({"error": str(e)})
+            return
+
+        seasons = self.get_argument("seasons", "10000")
+        if not seasons.isdigit() or not 1 <= int(seasons) <= MAX_FORECAST_SEASONS:
+            self.set_status(400)
+            self.write({"error": f"seasons deve essere tra 1 e {MAX_FORECAST_SEASONS}"})
+            return
+
+        state = montecarlo.capture_state(league)
+        result = await tornado.ioloop.IOLoop.current().run_in_executor(
+            None, montecarlo.forecast, state, int(seasons))
+        result["league"] = league.league_id
+        result["current_matchday"] = league.current_matchday
+        self.write(result)
+
+
+# METRICHE E PROFILER (HTTP)
+# /debug/profile accende e spegne il profiler a campionamento sull'event loop
+# senza riavviare il processo; per sicurezza risponde solo a localhost.
+PROFILE_REMOTE = False               # True: /debug/profile anche da altri host
+PROFILE_INTERVAL_MS = 5              # intervallo di campionamento predefinito
+MAX_PROFILE_SECONDS = 600
+
+profiler = SamplingProfiler()
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.set_header("Cache-Control", "no-store")
+        self.write(registry.render())
+
+
+class ReadyHandler(tornado.web.RequestHandler):
+    """
+    GET /ready[?league=<id>]: stato dei campionati (vedi LeagueRegistry), per
+    i controlli di readiness di un bilanciatore. 200 se tutti (o quello
+    richiesto) sono pronti, altrimenti 503.
+    """
+    def get(self):
+        status = leagues.status()
+        league_id = self.get_argument("league", None)
+        if league_id is not None:
+            if league_id not in status:
+                self.set_status(404)
+                self.write({"error": f"Campionato non trovato: {league_id}"})
+                return
+            status = {league_id: status[league_id]}
+        ready = all(value == "ready" for value in status.values())
+        self.set_status(200 if ready else 503)
+        self.set_header("Cache-Control", "no-store")
+        self.write({"ready": ready, "leagues": status})
+
+
+class ProfileHandler(tornado.web.RequestHandler):
+    """
+    GET  /debug/profile[?format=collapsed]   report della sessione attiva o dell'ultima
+                                             (collapsed: stack per flamegraph.pl / speedscope)
+    POST /debug/profile?action=start[&seconds=N][&interval=ms]
+    POST /debug/profile?action=stop
+    """
+
+    def prepare(self):
+        if not PROFILE_REMOTE and self.request.remote_ip not in ("127.0.0.1", "::1"):
+            raise tornado.web.HTTPError(403)
+        self.set_header("Content-Type", "text/plain; charset=utf-8")
+        self.set_header("Cache-Control", "no-store")
+
+    def get(self):
+        if self.get_argument("format", None) == "collapsed":
+            self.write(profiler.collapsed())
+        else:
+            limit = self.get_argument("limit", "30")
+            if not limit.isdigit() or int(limit) < 1:
+                raise tornado.web.HTTPError(400, "limit deve essere un intero positivo")
+            self.write(profiler.report(limit=int(limit)))
+
+    def post(self):
+        action = self.get_argument("action", None)
+        if action == "stop":
+            profiler.stop()
+            log.info("🔬 Profiler fermato: %d campioni", profiler.samples)
+            self.write(profiler.report())
+            return
+        if action != "start":
+            raise tornado.web.HTTPError(400, "action deve essere start o stop")
+        if profiler.running:
+            raise tornado.web.HTTPError(409, "Profiler già attivo")
+        try:
+            seconds = float(self.get_argument("seconds", str(MAX_PROFILE_SECONDS)))
+            interval = float(self.get_argument("interval", str(PROFILE_INTERVAL_MS))) / 1000
+        except ValueError:
+            raise tornado.web.HTTPError(400, "seconds e interval devono essere numeri")
+        if not 0 < seconds <= MAX_PROFILE_SECONDS or not 0.001 <= interval <= 1:
+            raise tornado.web.HTTPError(400, f"seconds tra 0 e {MAX_PROFILE_SECONDS}, interval tra 1 e 1000 ms")
+        # Il thread del handler è quello dell'event loop: è lui che viene campionato
+        profiler.start(interval=interval, duration=seconds)
+        log.info("🔬 Profiler avviato per %g s (campione ogni %g ms)", seconds, interval * 1000)
+        self.write(f"profiler avviato per {seconds:g} s\n")
 
 
 # HANDLER WEBSOCKET
 class MatchesWebSocket(tornado.websocket.WebSocketHandler):
     def check_origin(self, origin):
         return True
+
+    def get_compression_options(self):
+        # permessage-deflate: i frame condivisi sono compressi una volta sola
+        return {} if WS_COMPRESSION else None
+
+    def select_subprotocol(self, subprotocols):
+        # Il primo formato supportato nell'ordine di preferenza del client
+        for subprotocol in subprotocols:
+            if subprotocol in SUBPROTOCOLS:
+                return subprotocol
+        return None
     
     def open(self):
-        print(" WebSocket aperto - Nuovo client connesso")
-        clients.add(self)
-        asyncio.create_task(self.send_initial_state())
-    
-    async def send_initial_state(self):
-        await self.write_message(json.dumps({
-            "type": "initial_state",
-            "matches": matches,
-            "standings": championship.get_sorted_standings(),
-            "current_matchday": championship.current_matchday
-        }))
+        # Formato dei messaggi verso questo client (letto da FrameSet)
+        self.wire_format = SUBPROTOCOLS.get(self.selected_subprotocol, "json")
+        try:
+            self.league = get_league(self.get_argument("league", None))
+            self.topics = parse_topics(
+                self.league,
+                match_id=self.get_argument("match", None),
+                matchday=self.get_argument("matchday", None),
+                standings=self.get_argument("standings", None),
+                stats=self.get_argument("stats", None),
+            )
+        except ValueError as e:
+            self.close(4404, str(e))
+            return
+        except LeagueNotReady as e:
+            # Le pagine si riconnettono da sole dopo qualche secondo
+            self.close(4503, str(e))
+            return
+
+        log.debug("🔌 WebSocket aperto - Nuovo client connesso (%s: %s, %s)", self.league.league_id,
+                  ", ".join(self.topics), self.wire_format,
+                  extra={"league": self.league.league_id, "client": self.request.remote_ip})
+        broadcaster.add(self)
+        for topic in self.topics:
+            broadcaster.subscribe(self, (self.league.league_id, topic))
+        self.send_initial_state()
     
+    def send_initial_state(self):
+        # Frame condiviso dalla cache: nessuna codifica se lo stato non è cambiato
+        broadcaster.send(self, snapshot_cache(self.league).get(self.topics))
+
+    def on_message(self, message):
+        """
+        Messaggi dal client (sempre JSON). Supporta solo "resync": il client
+        ha rilevato un buco nei numeri di sequenza e chiede lo stato completo
+        dei match.
+        """
+        try:
+            data = json.loads(message)
+        except ValueError:
+            return
+
+        if not isinstance(data, dict) or data.get("type") != "resync":
+            return
+
+        league = self.league
+        match_ids = data.get("match_ids")
+        if not isinstance(match_ids, list):
+            return
+        match_ids = [mid for mid in dict.fromkeys(map(str, match_ids)) if mid in league.matches]
+        # Una pagina chiede al più le partite di una giornata
+        if not match_ids or len(match_ids) > len(league.teams) // 2:
+            return
+
+        # Nel formato del client (JSON o MessagePack), come gli aggiornamenti
+        broadcaster.send(self, FrameSet({
+            "type": "match_snapshot",
+            "teams": league.teams_snapshot(match_ids),
+            "matches": [league.match_snapshot(mid) for mid in match_ids],
+            "current_matchday": league.current_matchday
+        }, codecs))
+
     def on_close(self):
-        print(" WebSocket chiuso - Client disconnesso")
-        clients.remove(self)
+        log.debug("🔌 WebSocket chiuso - Client disconnesso", extra={"client": self.request.remote_ip})
+        broadcaster.discard(self)
+
+
+# SIMULAZIONE DEI CAMPIONATI
+# Il tick di un campionato (Championship.tick) è solo lavoro CPU. Con
+# SIMULATION_WORKERS > 0 i campionati sono divisi in shard e ogni shard gira in
+# un processo del pool: il processo Tornado riceve i batch già pronti, li
+# applica alla propria copia del campionato e fa solo il fan-out ai client.
+# Con SIMULATION_WORKERS = 0 tutti i campionati girano nell'event loop: è il
+# default con un solo campionato, che non giustifica un pool di processi e il
+# thread lettore della coda (--workers lo attiva comunque).
+TICK_SECONDS = 1  # 1 secondo = 1 minuto di gioco (a velocità 1)
+SIMULATION_WORKERS = min(len(LEAGUES), os.cpu_count() or 1) if len(LEAGUES) > 1 else 0
 
+# OROLOGIO DELLA SIMULAZIONE
+SIMULATION_SPEED = 1.0      # minuti di gioco per TICK_SECONDS (60 = un'ora in un minuto; 0 = il più veloce possibile)
+CATCH_UP = True             # se in ritardo, simula i minuti persi in un solo aggiornamento
+MAX_CATCH_UP_MINUTES = 15   # minuti recuperati al massimo per aggiornamento
 
-# SIMULAZIONE MATCH CON PROBABILITÀ REALISTICHE
-async def simulate_matches():
+
+class SimulationClock:
+    """
+    Scadenze dei tick su orologio monotono: la scadenza successiva è sempre
+    la precedente + intervallo, quindi il tempo speso a simulare e pubblicare
+    non si accumula come ritardo.
+
+    Se i tick restano indietro (event loop o worker occupati), con catch_up
+    i minuti persi vengono simulati tutti insieme in un solo batch; senza,
+    l'orologio salta in avanti e la partita rallenta.
+    """
+
+    def __init__(self, speed=SIMULATION_SPEED, catch_up=CATCH_UP, max_catch_up=MAX_CATCH_UP_MINUTES):
+        self.interval = TICK_SECONDS / speed if speed else 0.0
+        self.catch_up = catch_up
+        self.max_catch_up = max_catch_up
+        self.next_deadline = time.monotonic() + self.interval
+        self.caught_up = 0  # minuti simulati in recupero
+
+    def delay(self):
+        """Secondi che mancano al prossimo tick"""
+        return max(0.0, self.next_deadline - time.monotonic())
+
+    def due(self):
+        """Minuti da simulare adesso (almeno 1, da chiamare dopo l'attesa)"""
+        if not self.interval or not self.catch_up:
+            return 1
+        overdue = int((time.monotonic() - self.next_deadline) / self.interval) + 1
+        return max(1, min(overdue, self.max_catch_up))
+
+    def advance(self, ticks):
+        """Registra i minuti effettivamente simulati e fissa la scadenza successiva"""
+        self.next_deadline += ticks * self.interval
+        if ticks > 1:
+            self.caught_up += ticks - 1
+        if not self.catch_up and self.next_deadline < time.monotonic():
+            self.next_deadline = time.monotonic()
+
+    async def wait(self):
+        await asyncio.sleep(self.delay())
+        return self.due()
+
+# LOG DELLA SIMULAZIONE
+# Ogni campionato salva il suo stato in EVENT_LOG_DIR, nel formato STATE_STORE:
+# - "sqlite": stato corrente in <id>.sqlite (vedi statestore): una transazione
+#   per tick, scritta da un thread a parte; la ripresa legge solo lo stato
+# - "jsonl": log di tutti i tick in <id>.jsonl (vedi eventlog): permette di
+#   rivedere la stagione a un minuto qualsiasi, la ripresa rigioca i tick
+#   dall'ultimo snapshot
+# Se lo stato esiste già all'avvio, la stagione riprende da dove si era fermata
+# (anche da un log JSONL con STATE_STORE = "sqlite"): per ricominciare da capo
+# basta cancellare i file. None disattiva il salvataggio.
+EVENT_LOG_DIR = "logs"
+STATE_STORE = "sqlite"
+
+
+def event_log_path(championship):
+    return os.path.join(EVENT_LOG_DIR, f"{championship.league_id}.jsonl")
+
+
+def state_store_path(championship):
+    return os.path.join(EVENT_LOG_DIR, f"{championship.league_id}.sqlite")
+
+
+def resume_league(championship):
+    """Ripristina lo stato salvato del campionato, se esiste. Restituisce True se l'ha trovato"""
+    if EVENT_LOG_DIR is None:
+        return False
+    started = time.perf_counter()
+    tick = None
+    if STATE_STORE == "sqlite" and os.path.exists(state_store_path(championship)):
+        source = "database"
+        tick = statestore.restore(championship, state_store_path(championship))
+    if tick is None and os.path.exists(event_log_path(championship)):
+        source = "log"
+        tick = eventlog.restore(championship, event_log_path(championship))
+    if tick is None:
+        return False
+    log.info("♻️  [%s] Ripresa dal %s: giornata %d, minuto %d (tick %d) in %.1f ms", championship.name,
+             source, championship.current_matchday, championship.matchday_minute, tick,
+             (time.perf_counter() - started) * 1000, extra={"league": championship.league_id})
+    return True
+
+
+def begin_simulation(championship):
+    """
+    Prepara un campionato per i tick: riprende dallo stato salvato se esiste,
+    altrimenti avvia la prima giornata. Restituisce lo store su cui registrare
+    i tick (None se il salvataggio è disattivato).
+    """
+    if not resume_league(championship):
+        championship.start()
+    if EVENT_LOG_DIR is None:
+        return None
+    if STATE_STORE == "sqlite":
+        store = statestore.StateStore(state_store_path(championship))
+    else:
+        store = eventlog.EventLog(event_log_path(championship))
+    store.start(championship)
+    return store
+
+
+async def simulate_matches(championship):
     """
-    Loop che simula l'avanzamento dei match con eventi probabilistici realistici.
+    Loop che simula l'avanzamento dei match di un campionato nell'event loop.
     Tutti i match della stessa giornata iniziano insieme e quando finiscono 
     tutti, passa alla giornata successiva. La classifica si aggiorna in tempo reale.
     """
-    live_matchday = 1
-    max_matchday = max(m["matchday"] for m in matches.values())
-    
-    # Avvia tutte le partite della prima giornata
-    first_matchday_matches = [m for m in matches.values() if m["matchday"] == 1]
-    for match in first_matchday_matches:
-        match["status"] = "live"
-        match["minute"] = 0
-        match["score"] = {"home": 0, "away": 0}
-        match["events"] = []
-    
-    print(f"\n🎯 INIZIO GIORNATA {live_matchday} - {len(first_matchday_matches)} PARTITE IN CAMPO\n")
-    
-    while live_matchday <= max_matchday:
-        await asyncio.sleep(1)  # 1 secondo = 1 minuto di gioco
-        
-        updated_matches = []
-        standings_updated = False
-        
-        # Prendi tutte le partite della giornata corrente
-        current_matchday_matches = [m for m in matches.values() if m["matchday"] == live_matchday]
-        
-        for match_id, match in matches.items():
-            if match["matchday"] != live_matchday:
-                continue
-            
-            if match["status"] != "live":
-                continue
-            
-            # ----------------------------------------------------------------
-            # AVANZAMENTO TEMPO
-            # ----------------------------------------------------------------
-            match["minute"] += 1
-            current_minute = match["minute"]
-            
-            # Gestione fine primo tempo
-            if current_minute == 45:
-                match["half"] = 1
-                match["injury_time"] = random.randint(1, 5)
-                print(f"⏱️  Fine 1° tempo: {match['home']} {match['score']['home']}-{match['score']['away']} {match['away']}")
-            
-            # Gestione inizio secondo tempo
-            if current_minute == 46:
-                match["half"] = 2
-                match["injury_time"] = 0
-            
-            # Gestione fine secondo tempo
-            if current_minute == 90:
-                match["injury_time"] = random.randint(3, 7)
-                print(f"⏱️  90° minuto: +{match['injury_time']} di recupero")
-            
-            # Fine match
-            if current_minute >= 90 + match["injury_time"]:
-                match["status"] = "finished"
-                championship.update_standings(match_id)
-                standings_updated = True
-                print(f"🏁 FINE PARTITA: {match['home']} {match['score']['home']}-{match['score']['away']} {match['away']}")
-                updated_matches.append(match)
+    # Ripresa dal salvataggio (e indice delle statistiche) in un thread: l'event
+    # loop intanto serve gli altri campionati
+    loop = asyncio.get_running_loop()
+    store = await loop.run_in_executor(None, begin_simulation, championship)
+    await loop.run_in_executor(None, stats_index, championship)
+    leagues.set_ready(championship.league_id)
+    if store is not None:
+        # Al riavvio per autoreload i tick ancora in coda vanno scritti
+        tornado.autoreload.add_reload_hook(store.close)
+    clock = SimulationClock(SIMULATION_SPEED, CATCH_UP)
+
+    while True:
+        batch = championship.tick(await clock.wait())
+        clock.advance(batch["ticks"])
+        if store is not None:
+            store.record(championship, batch)
+        deliver_batch(batch)
+        if batch["season_over"]:
+            break
+    if store is not None:
+        store.close()
+
+
+# Impostati in ogni processo worker da _init_worker
+_worker_updates = None   # coda dei batch verso il processo Tornado
+_worker_stop = None      # evento di arresto (es. riavvio per autoreload)
+
+
+def _init_worker(updates, stop, log_dir, state_store, log_level, log_format):
+    global _worker_updates, _worker_stop, EVENT_LOG_DIR, STATE_STORE
+    _worker_updates = updates
+    _worker_stop = stop
+    # Impostati anche da riga di comando nel processo principale
+    EVENT_LOG_DIR = log_dir
+    STATE_STORE = state_store
+    setup_logging(log_level, log_format)
+
+
+def run_league_shard(league_ids, speed=SIMULATION_SPEED, catch_up=CATCH_UP):
+    """
+    Corpo di un processo worker: simula i campionati dello shard e a ogni tick
+    invia al processo Tornado una sola lista con il batch di ogni campionato.
+    Termina a fine stagione, su richiesta di arresto o se il processo padre
+    non esiste più.
+    """
+    parent = os.getppid()
+    # Il worker importa questo modulo: i campionati sono già creati, identici
+    # alle copie del processo Tornado (il calendario è deterministico)
+    # Un orologio per campionato: un batch chiuso in anticipo (cambio di
+    # giornata) non fa perdere il passo agli altri campionati dello shard
+    shard = [(leagues[league_id], begin_simulation(leagues[league_id]), SimulationClock(speed, catch_up))
+             for league_id in league_ids]
+    stores = [store for _, store, _ in shard if store is not None]
+    try:
+        _simulate_shard(shard, parent)
+    except KeyboardInterrupt:
+        pass  # Ctrl+C arriva anche ai worker (stesso gruppo di processi): è un arresto, non un errore
+    finally:
+        # I processi del pool non eseguono atexit: i tick in coda si scrivono qui
+        for store in stores:
+            store.close()
+
+
+def _simulate_shard(shard, parent):
+    """Ciclo dei tick di run_league_shard, fino a fine stagione o all'arresto"""
+    while shard:
+        time.sleep(min(clock.delay() for _, _, clock in shard))
+        if _worker_stop.is_set() or os.getppid() != parent:
+            return
+        batches = []
+        for league, store, clock in shard:
+            if clock.delay() > 0:
                 continue
-            
-            # ----------------------------------------------------------------
-            # GENERAZIONE EVENTI CON PROBABILITÀ REALISTICHE
-            # ----------------------------------------------------------------
-            multiplier = get_period_multiplier(current_minute)
-            
-            home_team = match["home_data"]
-            away_team = match["away_data"]
-            strength_diff = home_team["strength"] - away_team["strength"]
-            home_bias = 0.5 + (strength_diff / 200)
-            
-            for event_type, base_prob in EVENT_PROBABILITIES.items():
-                adjusted_prob = base_prob * multiplier
-                
-                if random.random() < adjusted_prob:
-                    event = generate_event(
-                        event_type, current_minute, home_team, away_team,
-                        home_bias, match["score"]["home"], match["score"]["away"]
-                    )
-                    
-                    if event:
-                        match["events"].append(event)
-                        
-                        # Aggiorna punteggio
-                        if event_type == "goal" and event.get("scored", True):
-                            match["score"][event["team"]] += 1
-                            print(f"⚽ GOL! {event['player']} ({event['team_name']}) - "
-                                  f"{match['home']} {match['score']['home']}-{match['score']['away']} {match['away']}")
-                        
-                        elif event_type == "penalty":
-                            if event.get("scored"):
-                                match["score"][event["team"]] += 1
-                                print(f"⚽🎯 RIGORE SEGNATO! {event['player']} ({event['team_name']})")
-                            else:
-                                print(f"❌ RIGORE SBAGLIATO! {event['player']} ({event['team_name']})")
-                        
-                        elif event_type == "yellow_card":
-                            print(f"🟨 Cartellino giallo: {event['player']} ({event['team_name']})")
-                        
-                        elif event_type == "red_card":
-                            print(f"🟥 CARTELLINO ROSSO! {event['player']} ({event['team_name']})")
-                        
-                        elif event_type == "corner":
-                            print(f"🚩 Corner per {event['team_name']}")
-            
-            updated_matches.append(match)
-        
-        # ----------------------------------------------------------------
-        # BROADCAST AGGIORNAMENTI
-        # ----------------------------------------------------------------
-        if (updated_matches or standings_updated) and clients:
-            message = json.dumps({
-                "type": "match_update",
-                "matches": updated_matches,
-                "standings": championship.get_sorted_standings() if standings_updated else None,
-                "current_matchday": live_matchday
-            })
-            
-            for client in list(clients):
-                try:
-                    await client.write_message(message)
-                except Exception as e:
-                    print(f"Errore invio: {e}")
-        
-        # Passa alla giornata successiva quando TUTTE le partite della giornata sono finite
-        if all(m["status"] == "finished" for m in current_matchday_matches):
-            if live_matchday < max_matchday:
-                live_matchday += 1
-                # Avvia tutte le partite della nuova giornata
-                next_matchday_matches = [m for m in matches.values() if m["matchday"] == live_matchday]
-                for match in next_matchday_matches:
-                    match["status"] = "live"
-                    match["minute"] = 0
-                    match["score"] = {"home": 0, "away": 0}
-                    match["events"] = []
-                print(f"\n{'='*70}")
-                print(f"🎯 INIZIO GIORNATA {live_matchday} - {len(next_matchday_matches)} PARTITE IN CAMPO")
-                print(f"{'='*70}\n")
-            else:
-                print(f"\n{'='*70}")
-                print(f"{'='*70}\n")
-                break
+            batch = league.tick(clock.due())
+            clock.advance(batch["ticks"])
+            if store is not None:
+                store.record(league, batch)
+            batches.append(batch)
+        if batches:
+            _worker_updates.put(batches)
+        over = {batch["league"] for batch in batches if batch["season_over"]}
+        shard = [entry for entry in shard if entry[0].league_id not in over]
+
+
+def apply_worker_batches(batches):
+    """Nell'event loop: aggiorna le copie dei campionati e pubblica i batch"""
+    for batch in batches:
+        leagues[batch["league"]].apply_batch(batch)
+        deliver_batch(batch)
+
+
+def _forward_worker_batches(updates, loop):
+    """
+    Thread lettore della coda: la lettura dalla pipe e l'unpickling avvengono
+    qui, all'event loop arrivano solo batch già pronti. Termina con None
+    (vedi start_league_workers).
+    """
+    while True:
+        batches = updates.get()
+        if batches is None:
+            return
+        loop.call_soon_threadsafe(apply_worker_batches, batches)
+
+
+def stop_leagues(league_ids):
+    """
+    Nell'event loop, quando uno shard termina con errore: i suoi campionati
+    non avanzano più, quindi non sono più serviti (503) e i client connessi
+    vengono chiusi invece di restare su dati fermi.
+    """
+    for league_id in league_ids:
+        leagues.set_stopped(league_id)
+    for client in list(broadcaster.clients):
+        if client.league.league_id in league_ids:
+            client.close(4503, "Simulazione interrotta")
+
+
+def _report_shard_exit(league_ids, loop, future):
+    # Nel thread del pool: lo stato dei campionati si cambia nell'event loop
+    error = future.exception()
+    if error is not None:
+        log.error("❌ Worker di simulazione terminato con errore (%s): %r", ", ".join(league_ids), error,
+                  exc_info=error)
+        loop.call_soon_threadsafe(stop_leagues, league_ids)
+
+
+def start_league_workers(num_workers):
+    """
+    Avvia il pool di processi per la simulazione: i campionati sono assegnati
+    a rotazione a num_workers shard (uno per processo). Le copie del processo
+    Tornado devono essere già allineate (vedi prepare_league_copy).
+    Restituisce la funzione che ferma i worker e il thread lettore.
+    """
+    context = multiprocessing.get_context("spawn")
+    updates = context.Queue()
+    stop = context.Event()
+    league_ids = list(leagues)
+    num_workers = min(num_workers, len(league_ids))
+    pool = ProcessPoolExecutor(max_workers=num_workers, mp_context=context,
+                               initializer=_init_worker,
+                               initargs=(updates, stop, EVENT_LOG_DIR, STATE_STORE, LOG_LEVEL, LOG_FORMAT))
+    loop = asyncio.get_running_loop()
+    for i in range(num_workers):
+        shard_ids = league_ids[i::num_workers]
+        future = pool.submit(run_league_shard, shard_ids, SIMULATION_SPEED, CATCH_UP)
+        future.add_done_callback(functools.partial(_report_shard_exit, shard_ids, loop))
+
+    threading.Thread(target=_forward_worker_batches, args=(updates, loop), daemon=True).start()
+    registry.gauge("livescore_worker_queue_depth", "Liste di batch dei worker in attesa nella coda",
+                   function=lambda: updates.qsize())
+    log.info("🧵 %d campionati simulati da %d processi worker", len(league_ids), num_workers)
+
+    def stop_workers():
+        if not stop.is_set():
+            stop.set()
+            updates.put(None)
+    return stop_workers
+
+
+def prepare_league_copy(league_id):
+    """Nel thread di load_leagues: le copie del processo Tornado partono dallo stesso stato dei worker"""
+    league = leagues[league_id]
+    resume_league(league)
+    stats_index(league)
+    return league
+
+
+async def load_leagues(prepare=None):
+    """
+    Crea i campionati uno alla volta in un thread (il server è già in
+    ascolto: quelli non pronti rispondono 503) e li restituisce man mano.
+    prepare(league_id), se indicato, sostituisce la sola creazione.
+    """
+    loop = asyncio.get_running_loop()
+    for league_id in leagues:
+        yield await loop.run_in_executor(None, prepare or leagues.__getitem__, league_id)
 
 
 # ============================================================================
 # FUNZIONE PRINCIPALE
 # ============================================================================
-async def main():
-    print("=" * 70)
-    print("⚽ SERVER EVENTI SPORTIVI LIVE - SERIE A 2025/2026")
-    print("=" * 70)
-    
-    app = tornado.web.Application(
+# Con DEBUG (--debug) Tornado riavvia il server quando cambia un file e mette
+# i traceback nelle risposte di errore: solo in sviluppo, mai in produzione.
+DEBUG = False
+
+
+def make_app(debug=None):
+    return tornado.web.Application(
         [
             (r"/", MainHandler),
             (r"/match/([^/]+)", MatchHandler),
+            (r"/api/matches", MatchdayApiHandler),
+            (r"/api/match/([^/]+)", MatchApiHandler),
+            (r"/api/match/([^/]+)/events", MatchEventsApiHandler),
+            (r"/api/standings", StandingsApiHandler),
+            (r"/api/stats/leaders", StatsLeadersApiHandler),
+            (r"/api/stats/player", PlayerStatsApiHandler),
+            (r"/api/stats/team/([^/]+)", TeamStatsApiHandler),
+            (r"/api/stats/h2h", HeadToHeadApiHandler),
+            (r"/api/forecast", ForecastHandler),
+            (r"/metrics", MetricsHandler),
+            (r"/ready", ReadyHandler),
+            (r"/debug/profile", ProfileHandler),
             (r"/ws", MatchesWebSocket),
             (r"/static/(.*)", tornado.web.StaticFileHandler, {"path": "static"}),
         ],
         template_path="templates",
-        debug=True
+        debug=DEBUG if debug is None else debug
     )
-    
-    app.listen(8888)
-    print("\n✅ Server avviato su http://localhost:8888")
-    print("📡 WebSocket disponibile su ws://localhost:8888/ws")
-    print("\n📊 MATCH GENERATI:")
 
-    
-    asyncio.create_task(simulate_matches())
-    await asyncio.Event().wait()
+
+async def main(role="all", port=HTTP_PORT, bus_url=BUS_URL, reuse_port=False):
+    global message_bus
+    log.info("⚽ SERVER EVENTI SPORTIVI LIVE - %s", ", ".join(config["name"].upper() for config in LEAGUES.values()))
+    LoopLagMonitor(loop_lag).start()
+
+    message_bus = create_bus(bus_url)
+    await message_bus.connect()
+    if message_bus.shared:
+        log.info("📨 Bus: %s (ruolo: %s)", bus_url, role)
+
+    if role != "sim":
+        app = make_app()
+
+        # Con reuse_port più processi edge ascoltano sulla stessa porta (SO_REUSEPORT)
+        http_server = tornado.httpserver.HTTPServer(app)
+        http_server.add_sockets(tornado.netutil.bind_sockets(port, reuse_port=reuse_port))
+        log.info("✅ Server avviato su http://localhost:%d (WebSocket: ws://localhost:%d/ws, metriche: /metrics)",
+                 port, port)
+
+    if role == "edge":
+        await start_edge_feeds()
+        return
+
+    message_bus.subscribe(STATE_REQUESTS_CHANNEL, publish_state)
+    if SIMULATION_WORKERS > 0:
+        async for league in load_leagues(prepare_league_copy):
+            leagues.set_ready(league.league_id)
+        stop = start_league_workers(SIMULATION_WORKERS)
+        # Con autoreload il processo viene sostituito: i worker vanno fermati
+        tornado.autoreload.add_reload_hook(stop)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            stop()
+    else:
+        async for league in load_leagues():
+            asyncio.create_task(simulate_matches(league))
+        await asyncio.Event().wait()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Server eventi sportivi live")
+    parser.add_argument("--role", choices=("all", "sim", "edge"), default="all",
+                        help="all: simula e serve i client; sim: solo simulazione; edge: solo client")
+    parser.add_argument("--port", type=int, default=HTTP_PORT)
+    parser.add_argument("--bus", dest="bus_url", default=BUS_URL,
+                        help="URL del bus (tcp://host:porta, redis://host:porta, unix:///percorso)")
+    parser.add_argument("--reuse-port", action="store_true",
+                        help="SO_REUSEPORT: più processi edge sulla stessa porta")
+    parser.add_argument("--speed", type=float, default=SIMULATION_SPEED,
+                        help="minuti di gioco per secondo (0 = il più veloce possibile)")
+    parser.add_argument("--workers", type=int, default=SIMULATION_WORKERS,
+                        help="processi worker di simulazione (0 = nell'event loop)")
+    parser.add_argument("--log-dir", default=EVENT_LOG_DIR, help="cartella dei log dei campionati")
+    parser.add_argument("--no-log", action="store_true", help="non scrive e non riprende i log")
+    parser.add_argument("--store", choices=("sqlite", "jsonl"), default=STATE_STORE,
+                        help="sqlite: stato corrente, ripresa immediata; jsonl: log di tutti i tick")
+    parser.add_argument("--log-level", default=LOG_LEVEL, type=str.upper,
+                        choices=("DEBUG", "INFO", "WARNING", "ERROR"),
+                        help="DEBUG include cartellini gialli, corner e connessioni")
+    parser.add_argument("--log-format", choices=("text", "json"), default=LOG_FORMAT)
+    parser.add_argument("--json-backend", choices=("auto", "orjson", "msgspec", "stdlib"),
+                        default=JSON_BACKEND or "auto", help="encoder JSON per client e API")
+    parser.add_argument("--debug", action="store_true",
+                        help="sviluppo: riavvio automatico e traceback nelle risposte di errore")
+    args = parser.parse_args()
+    if args.role != "all" and args.bus_url is None:
+        parser.error(f"il ruolo {args.role} richiede --bus")
+    return args
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    args = parse_args()
+    SIMULATION_SPEED = args.speed
+    SIMULATION_WORKERS = args.workers
+    EVENT_LOG_DIR = None if args.no_log else args.log_dir
+    STATE_STORE = args.store
+    LOG_LEVEL = args.log_level
+    LOG_FORMAT = args.log_format
+    DEBUG = args.debug
+    setup_logging()
+    try:
+        codecs.update(create_codecs(args.json_backend))
+    except ValueError as e:
+        sys.exit(str(e))
+    asyncio.run(main(args.role, args.port, args.bus_url, args.reuse_port))
@@ -0,0 +1,278 @@
+"""
+Stato persistente di un campionato in SQLite (WAL), con ripresa immediata.
+
+A differenza del log JSONL (eventlog.py), che registra tutta la storia e
+per riprendere rigioca i tick dall'ultimo snapshot, qui si tiene solo lo
+stato corrente, sempre aggiornato:
+- league:  una riga con campionato, seme, orologio (tick, giornata, minuto)
+           e classifica
+- matches: i campi variabili dei match già iniziati (stato, minuto,
+           punteggio, tempo, recupero, numero di sequenza)
+- events:  gli eventi dei match (JSON), una riga per evento, solo in aggiunta
+
+Scritture: record() copia dai delta del batch i valori da salvare (tuple,
+sul thread che simula: niente JSON né SQL) e li passa a un thread di
+scrittura, che li codifica e li applica in una transazione per tick; se il
+disco è lento i tick in coda finiscono in una sola transazione. Il costo di un tick dipende dai match cambiati, non
+dalla lunghezza della stagione. Con synchronous=NORMAL un crash del
+processo perde al massimo i tick ancora in coda: alla ripresa vengono
+rigiocati identici (il generatore di ogni tick dipende da seme e tick).
+
+restore() legge le tre tabelle e ripristina lo stato: nessun replay.
+
+Uso da riga di comando:
+    python statestore.py logs/serie_a.sqlite
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+import eventlog
+
+STORE_FORMAT = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS league (
+    league TEXT PRIMARY KEY,
+    format INTEGER NOT NULL,
+    seed INTEGER NOT NULL,
+    tick INTEGER NOT NULL,
+    matchday INTEGER NOT NULL,
+    minute INTEGER NOT NULL,
+    standings TEXT NOT NULL,
+    saved_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS matches (
+    id TEXT PRIMARY KEY,
+    matchday INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    minute INTEGER NOT NULL,
+    home_score INTEGER NOT NULL,
+    away_score INTEGER NOT NULL,
+    half INTEGER NOT NULL,
+    injury_time INTEGER NOT NULL,
+    seq INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS events (
+    match_id TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    event TEXT NOT NULL,
+    PRIMARY KEY (match_id, n)
+) WITHOUT ROWID;
+"""
+
+log = logging.getLogger("livescore.store")
+
+
+encode = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False).encode
+
+
+def connect(path):
+    connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    # In WAL basta NORMAL: nessun fsync a ogni commit, il database resta integro
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def match_row(match):
+    score = match.score
+    return (match.id, match.matchday, match.status, match.minute, score["home"], score["away"],
+            match.half, match.injury_time, match.seq)
+
+
+class StateStore:
+    """
+    Scrittura dello stato di un campionato (stessa interfaccia di
+    eventlog.EventLog: start, record, close). Il thread che simula non
+    tocca mai il database.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.ticks = 0
+        self.transactions = 0
+        self._queue = queue.SimpleQueue()
+        self._writer_lost = False
+        self._connection = connect(path)
+        self._thread = threading.Thread(target=self._run, name=f"statestore-{os.path.basename(path)}",
+                                        daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self):
+        """Tick in coda non ancora scritti"""
+        return self._queue.qsize()
+
+    def _writer_alive(self):
+        """False (con un solo errore nel log) se il thread di scrittura è terminato: nulla va più accodato"""
+        if self._thread.is_alive():
+            return True
+        if not self._writer_lost:
+            self._writer_lost = True
+            log.error("❌ Thread di scrittura di %s terminato: lo stato non viene più salvato", self.path)
+        return False
+
+    def start(self, championship):
+        """
+        Da chiamare prima del primo tick o dopo una ripresa: scrive lo stato
+        completo (match iniziati ed eventi compresi), così il database è
+        allineato anche se la ripresa è avvenuta da un log JSONL.
+        """
+        if not self._writer_alive():
+            return
+        started = [match for match in championship.matches.values() if match.seq > 0]
+        events = [(match.id, n, event.to_wire()) for match in started for n, event in enumerate(match.events)]
+        self._queue.put(("checkpoint", self._league_row(championship, True),
+                         [match_row(match) for match in started], events))
+
+    def record(self, championship, batch):
+        """Accoda le righe di un tick (dopo Championship.tick()): solo i match cambiati e i nuovi eventi"""
+        if not self._writer_alive():
+            return
+        matches = []
+        events = []
+        for delta in batch["deltas"]:
+            match = championship.matches[delta["id"]]
+            matches.append(match_row(match))
+            new_events = delta.get("events")
+            if new_events:
+                first = len(match.events) - len(new_events)
+                events.extend((match.id, first + i, event) for i, event in enumerate(new_events))
+        self._queue.put(("tick", self._league_row(championship, batch["standings_updated"]), matches, events))
+
+    @staticmethod
+    def _league_row(championship, with_standings):
+        # Gli eventi dei delta non cambiano più, la classifica sì: se serve se ne salva una copia
+        standings = {tid: dict(row) for tid, row in championship.standings.items()} if with_standings else None
+        return (championship.league_id, STORE_FORMAT, championship.seed, championship.tick_count,
+                championship.current_matchday, championship.matchday_minute, standings, time.time())
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            # Tick accumulati nel frattempo: una sola transazione
+            while not self._queue.empty() and len(items) < 1000:
+                items.append(self._queue.get())
+            stop = None in items
+            items = [item for item in items if item is not None]
+            if items:
+                try:
+                    self._write(items)
+                except Exception:  # disco, database o valori non codificabili: il thread non si ferma
+                    log.exception("❌ Stato non salvato in %s (%d tick)", self.path, len(items))
+            if stop:
+                return
+
+    def _write(self, items):
+        connection = self._connection
+        connection.execute("BEGIN")
+        try:
+            for kind, league, matches, events in items:
+                if kind == "checkpoint":
+                    connection.execute("DELETE FROM events")
+                if league[6] is None:
+                    connection.execute(
+                        "UPDATE league SET tick = ?, matchday = ?, minute = ?, saved_at = ? WHERE league = ?",
+                        (league[3], league[4], league[5], league[7], league[0]))
+                else:
+                    connection.execute("INSERT OR REPLACE INTO league VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                       league[:6] + (encode(league[6]), league[7]))
+                connection.executemany("INSERT OR REPLACE INTO matches VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", matches)
+                connection.executemany("INSERT OR REPLACE INTO events VALUES (?, ?, ?)",
+                                       [(match_id, n, encode(event)) for match_id, n, event in events])
+                self.ticks += kind == "tick"
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        self.transactions += 1
+
+    def close(self):
+        """Scrive i tick in coda e chiude il database"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._connection.close()
+
+
+def restore(championship, path):
+    """
+    Ripristina in championship (appena creato, con lo stesso calendario) lo
+    stato salvato. Restituisce il tick raggiunto, o None se il database non
+    contiene ancora uno stato; solleva ValueError se è di un altro campionato.
+    """
+    connection = connect(path)
+    try:
+        row = connection.execute("SELECT league, seed, tick, matchday, minute, standings FROM league").fetchone()
+        if row is None:
+            return None
+        league_id, seed, tick, matchday, minute, standings = row
+        if league_id != championship.league_id:
+            raise ValueError(f"{path} contiene lo stato del campionato {league_id}, "
+                             f"non di {championship.league_id}")
+
+        rows = connection.execute("SELECT match_id, event FROM events ORDER BY match_id, n").fetchall()
+        # Un solo json.loads per tutti gli eventi: molto più veloce di uno per riga
+        decoded = json.loads("[" + ",".join(event for _, event in rows) + "]")
+        events = {}
+        for (match_id, _), event in zip(rows, decoded):
+            events.setdefault(match_id, []).append(event)
+        states = {}
+        query = "SELECT id, status, minute, home_score, away_score, half, injury_time, seq FROM matches"
+        for match_id, status, match_minute, home, away, half, injury_time, seq in connection.execute(query):
+            if match_id not in championship.matches:
+                raise ValueError(f"{path}: match {match_id} non presente nel calendario")
+            states[match_id] = {"id": match_id, "status": status, "minute": match_minute,
+                                "score": {"home": home, "away": away}, "half": half,
+                                "injury_time": injury_time, "seq": seq, "events": events.get(match_id, [])}
+    finally:
+        connection.close()
+
+    championship.seed = seed
+    championship.restore_standings(json.loads(standings))
+    # Nell'ordine del calendario (come le partite in corso durante la simulazione):
+    # da questo ordine dipende la sequenza di numeri casuali dei tick successivi
+    championship.restore_matches([states[mid] for mid in championship.matches if mid in states])
+    championship.current_matchday = matchday
+    championship.matchday_minute = minute
+    championship.tick_count = tick
+    return tick
+
+
+def main():
+    import server
+
+    parser = argparse.ArgumentParser(description="Mostra lo stato salvato di un campionato")
+    parser.add_argument("path")
+    parser.add_argument("--league", default=server.DEFAULT_LEAGUE)
+    args = parser.parse_args()
+    # connect() creerebbe un database vuoto
+    if not os.path.exists(args.path):
+        sys.exit(f"{args.path}: file non trovato")
+
+    championship = server.create_league(args.league)
+    start = time.perf_counter()
+    try:
+        tick = restore(championship, args.path)
+    except ValueError as e:
+        sys.exit(str(e))
+    if tick is None:
+        print(f"{args.path}: nessuno stato salvato")
+        return
+    eventlog.print_summary(championship, f"tick {tick}, seme {championship.seed}, "
+                                         f"ripristinato in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+/**
+ * Formato dei messaggi del server (vedi serialization.py).
+ *
+ * La pagina chiede al server MessagePack (sottoprotocollo WebSocket
+ * "livescore.msgpack", frame binari più piccoli del JSON) e accetta JSON
+ * come alternativa; con ?format=json nell'indirizzo della pagina chiede
+ * solo JSON. decodeMessage() riconosce il formato dal tipo del frame.
+ * I messaggi verso il server (resync) restano JSON.
+ */
+const WIRE_SUBPROTOCOLS = new URLSearchParams(window.location.search).get("format") === "json"
+    ? ["livescore.json"]
+    : ["livescore.msgpack", "livescore.json"];
+
+function openLivescoreSocket(url) {
+    const socket = new WebSocket(url, WIRE_SUBPROTOCOLS);
+    socket.binaryType = "arraybuffer";
+    return socket;
+}
+
+function decodeMessage(data) {
+    return typeof data === "string" ? JSON.parse(data) : MsgPack.decode(new Uint8Array(data));
+}
+
+/**
+ * Decoder MessagePack (https://msgpack.org): tipi nil, bool, interi,
+ * float, str, bin, array e map. Le stringhe ASCII brevi (chiavi, tipi di
+ * evento) sono decodificate senza TextDecoder.
+ */
+const MsgPack = (() => {
+    const utf8 = new TextDecoder();
+    let bytes = null;
+    let view = null;
+    let pos = 0;
+
+    function str(length) {
+        const end = pos + length;
+        if (length < 32) {
+            let ascii = "";
+            for (let i = pos; i < end; i++) {
+                const byte = bytes[i];
+                if (byte > 0x7f) {
+                    ascii = null;
+                    break;
+                }
+                ascii += String.fromCharCode(byte);
+            }
+            if (ascii !== null) {
+                pos = end;
+                return ascii;
+            }
+        }
+        const value = utf8.decode(bytes.subarray(pos, end));
+        pos = end;
+        return value;
+    }
+
+    function array(length) {
+        const result = new Array(length);
+        for (let i = 0; i < length; i++) {
+            result[i] = value();
+        }
+        return result;
+    }
+
+    function map(length) {
+        const result = {};
+        for (let i = 0; i < length; i++) {
+            const key = value();
+            result[key] = value();
+        }
+        return result;
+    }
+
+    function bin(length) {
+        const result = bytes.slice(pos, pos + length);
+        pos += length;
+        return result;
+    }
+
+    function value() {
+        const code = bytes[pos++];
+        if (code < 0x80) return code;
+        if (code < 0x90) return map(code & 0x0f);
+        if (code < 0xa0) return array(code & 0x0f);
+        if (code < 0xc0) return str(code & 0x1f);
+        if (code >= 0xe0) return code - 0x100;
+        let result;
+        switch (code) {
+            case 0xc0: return null;
+            case 0xc2: return false;
+            case 0xc3: return true;
+            case 0xc4: return bin(bytes[pos++]);
+            case 0xc5: result = view.getUint16(pos); pos += 2; return bin(result);
+            case 0xc6: result = view.getUint32(pos); pos += 4; return bin(result);
+            case 0xca: result = view.getFloat32(pos); pos += 4; return result;
+            case 0xcb: result = view.getFloat64(pos); pos += 8; return result;
+            case 0xcc: return bytes[pos++];
+            case 0xcd: result = view.getUint16(pos); pos += 2; return result;
+            case 0xce: result = view.getUint32(pos); pos += 4; return result;
+            case 0xcf: result = Number(view.getBigUint64(pos)); pos += 8; return result;
+            case 0xd0: result = view.getInt8(pos); pos += 1; return result;
+            case 0xd1: result = view.getInt16(pos); pos += 2; return result;
+            case 0xd2: result = view.getInt32(pos); pos += 4; return result;
+            case 0xd3: result = Number(view.getBigInt64(pos)); pos += 8; return result;
+            case 0xd9: return str(bytes[pos++]);
+            case 0xda: result = view.getUint16(pos); pos += 2; return str(result);
+            case 0xdb: result = view.getUint32(pos); pos += 4; return str(result);
+            case 0xdc: result = view.getUint16(pos); pos += 2; return array(result);
+            case 0xdd: result = view.getUint32(pos); pos += 4; return array(result);
+            case 0xde: result = view.getUint16(pos); pos += 2; return map(result);
+            case 0xdf: result = view.getUint32(pos); pos += 4; return map(result);
+        }
+        throw new Error(`Tipo MessagePack non supportato: 0x${code.toString(16)}`);
+    }
+
+    function decode(data) {
+        bytes = data;
+        view = new DataView(data.buffer, data.byteOffset, data.byteLength);
+        pos = 0;
+        try {
+            return value();
+        } finally {
+            bytes = view = null;
+        }
+    }
+
+    return { decode };
+})();
@@ -0,0 +1,232 @@
+"""
+Statistiche della stagione: marcatori, assist, cartellini, rigori e scontri
+diretti, aggiornate in modo incrementale man mano che i match producono eventi.
+
+StatsIndex tiene per un campionato:
+- totali per giocatore (id squadra, nome) e per squadra (STAT_FIELDS)
+- classifiche ordinate dei giocatori per LEADER_CATEGORIES (Leaderboard)
+- indici inversi sugli eventi: giocatore -> eventi, squadra -> tipo -> eventi
+  (riferimenti (id match, posizione in match.events), senza copie)
+- scontri diretti: coppia di squadre -> match conclusi
+
+update() legge solo gli eventi che non ha ancora visto (per ogni match
+ricorda quanti ne ha indicizzati), quindi costa quanto gli eventi nuovi del
+tick e si può chiamare più volte sugli stessi match. Le interrogazioni non
+scorrono mai gli eventi: i primi n di una classifica sono una slice, la
+posizione di un giocatore una ricerca binaria, il resto accessi a dizionari.
+
+Dopo un ripristino dello stato (epoch del campionato cambiata) l'indice va
+ricreato: il costruttore indicizza tutti gli eventi già presenti.
+"""
+import bisect
+
+from model import PENALTY_SCORED
+
+# Statistiche di giocatori e squadre
+STAT_FIELDS = ("goals", "assists", "yellow_cards", "red_cards", "penalties_scored", "penalties_missed")
+# Classifiche dei giocatori mantenute ordinate
+LEADER_CATEGORIES = ("goals", "assists", "yellow_cards", "red_cards")
+
+
+def event_stats(event):
+    """
+    Statistiche incrementate da un evento: (campi del giocatore, campi del
+    secondo giocatore). Il secondo giocatore è l'assistman di un gol; i
+    rigori trasformati contano anche come gol.
+    """
+    event_type = event.type
+    if event_type == "goal":
+        return ("goals",), ("assists",) if event.other is not None else ()
+    if event_type == "penalty":
+        if event.info == PENALTY_SCORED:
+            return ("goals", "penalties_scored"), ()
+        return ("penalties_missed",), ()
+    if event_type == "yellow_card":
+        return ("yellow_cards",), ()
+    if event_type == "red_card":
+        return ("red_cards",), ()
+    return (), ()
+
+
+class Leaderboard:
+    """
+    Giocatori con valore maggiore di zero in ordine decrescente (a parità di
+    valore per nome e squadra). Aggiornare un giocatore costa due ricerche
+    binarie più lo spostamento in lista, senza riordinare tutto.
+    """
+
+    def __init__(self):
+        self.keys = []  # (-valore, nome, id squadra), crescenti
+
+    def __len__(self):
+        return len(self.keys)
+
+    def update(self, team_id, player, old, new):
+        if old:
+            del self.keys[bisect.bisect_left(self.keys, (-old, player, team_id))]
+        if new:
+            bisect.insort(self.keys, (-new, player, team_id))
+
+    def top(self, limit):
+        """I primi limit: (id squadra, giocatore)"""
+        return [(team_id, player) for _, player, team_id in self.keys[:limit]]
+
+    def rank(self, value):
+        """Posizione (a pari merito) di chi ha questo valore, None se zero"""
+        if not value:
+            return None
+        return bisect.bisect_left(self.keys, (-value,)) + 1
+
+
+class StatsIndex:
+    """Statistiche e indici di un campionato (vedi il docstring del modulo)"""
+
+    def __init__(self, championship):
+        self.championship = championship
+        # Epoch del campionato indicizzata: se cambia l'indice non è più valido
+        self.epoch = championship.epoch
+        # Incrementata a ogni cambiamento (ETag delle API)
+        self.version = 0
+        self.players = {}        # (id squadra, giocatore) -> riga
+        self.teams = {}          # id squadra -> riga
+        self.team_players = {}   # id squadra -> {giocatore: riga}
+        self.player_events = {}  # (id squadra, giocatore) -> [(id match, n)]
+        self.team_events = {}    # id squadra -> tipo di evento -> [(id match, n)]
+        self.head_to_head = {}   # (id squadra, id squadra) in ordine -> [id match conclusi]
+        self.leaders = {category: Leaderboard() for category in LEADER_CATEGORIES}
+        self._indexed = {}       # id match -> eventi già indicizzati
+        self._finished = set()
+        for team in championship.teams:
+            row = {"team_id": team["id"], "name": team["name"]}
+            row.update(dict.fromkeys(STAT_FIELDS, 0))
+            self.teams[team["id"]] = row
+            self.team_players[team["id"]] = {}
+            self.team_events[team["id"]] = {}
+        self.update(championship.matches)
+
+    def update(self, match_ids):
+        """
+        Indicizza i nuovi eventi dei match indicati (e i match appena
+        conclusi). Restituisce (giocatori cambiati, squadre cambiate).
+        """
+        matches = self.championship.matches
+        changed_players = set()
+        changed_teams = set()
+        for match_id in match_ids:
+            match = matches[match_id]
+            start = self._indexed.get(match_id, 0)
+            if len(match.events) > start:
+                for n in range(start, len(match.events)):
+                    self._add_event(match, n, changed_players, changed_teams)
+                self._indexed[match_id] = len(match.events)
+            if match.status == "finished" and match_id not in self._finished:
+                self._finished.add(match_id)
+                self.head_to_head.setdefault(team_pair(match.home_id, match.away_id), []).append(match_id)
+                changed_teams.update((match.home_id, match.away_id))
+        if changed_players or changed_teams:
+            self.version += 1
+        return changed_players, changed_teams
+
+    def _add_event(self, match, n, changed_players, changed_teams):
+        event = match.events[n]
+        team_id = match.home_id if event.team == "home" else match.away_id
+        ref = (match.id, n)
+        self.team_events[team_id].setdefault(event.type, []).append(ref)
+
+        fields, other_fields = event_stats(event)
+        self.player_events.setdefault((team_id, event.player), []).append(ref)
+        self._increment(team_id, event.player, fields, changed_players, changed_teams)
+        if event.other is not None:
+            # Assistman o giocatore entrato: anche a lui appartiene l'evento
+            self.player_events.setdefault((team_id, event.other), []).append(ref)
+            self._increment(team_id, event.other, other_fields, changed_players, changed_teams)
+
+    def _increment(self, team_id, player, fields, changed_players, changed_teams):
+        if not fields:
+            return
+        key = (team_id, player)
+        row = self.players.get(key)
+        if row is None:
+            row = {"player": player, "team_id": team_id}
+            row.update(dict.fromkeys(STAT_FIELDS, 0))
+            self.players[key] = row
+            self.team_players[team_id][player] = row
+        team_row = self.teams[team_id]
+        for field in fields:
+            value = row[field]
+            row[field] = value + 1
+            team_row[field] += 1
+            leaderboard = self.leaders.get(field)
+            if leaderboard is not None:
+                leaderboard.update(team_id, player, value, value + 1)
+        changed_players.add(key)
+        changed_teams.add(team_id)
+
+    # ------------------------------------------------------------------------
+    # INTERROGAZIONI
+    # ------------------------------------------------------------------------
+    def top(self, category, limit=10):
+        """Primi limit giocatori di una categoria (LEADER_CATEGORIES) con la posizione"""
+        if category not in self.leaders:
+            raise ValueError(f"Categoria non valida: {category}")
+        leaderboard = self.leaders[category]
+        rows = []
+        for team_id, player in leaderboard.top(limit):
+            row = self.players[team_id, player]
+            rows.append({"position": leaderboard.rank(row[category]), **row})
+        return rows
+
+    def player(self, team_id, player):
+        """Statistiche di un giocatore (zero se non ne ha) con la posizione in ogni classifica"""
+        row = self.players.get((team_id, player))
+        if row is None:
+            row = {"player": player, "team_id": team_id, **dict.fromkeys(STAT_FIELDS, 0)}
+        ranks = {category: self.leaders[category].rank(row[category]) for category in LEADER_CATEGORIES}
+        return {**row, "ranks": ranks}
+
+    def player_event_list(self, team_id, player):
+        """Eventi di un giocatore (anche come assistman o giocatore entrato), in ordine di indicizzazione"""
+        return self._events(self.player_events.get((team_id, player), ()))
+
+    def team_event_list(self, team_id, event_type):
+        """Eventi di un tipo di una squadra"""
+        return self._events(self.team_events[team_id].get(event_type, ()))
+
+    def _events(self, refs):
+        matches = self.championship.matches
+        events = []
+        for match_id, n in refs:
+            match = matches[match_id]
+            events.append({"match_id": match_id, "matchday": match.matchday, **match.events[n].to_wire()})
+        return events
+
+    def team(self, team_id):
+        """Totali di una squadra, numero di eventi per tipo e giocatori con statistiche"""
+        return {
+            **self.teams[team_id],
+            "events": {event_type: len(refs) for event_type, refs in self.team_events[team_id].items()},
+            "players": sorted(self.team_players[team_id].values(), key=lambda row: (-row["goals"], row["player"])),
+        }
+
+    def h2h(self, team_a, team_b):
+        """Scontri diretti conclusi tra due squadre: vittorie, pareggi, gol e risultati"""
+        record = {team_a: {"wins": 0, "goals": 0}, team_b: {"wins": 0, "goals": 0}}
+        draws = 0
+        results = []
+        for match_id in self.head_to_head.get(team_pair(team_a, team_b), ()):
+            match = self.championship.matches[match_id]
+            home, away = match.score["home"], match.score["away"]
+            record[match.home_id]["goals"] += home
+            record[match.away_id]["goals"] += away
+            if home == away:
+                draws += 1
+            else:
+                record[match.home_id if home > away else match.away_id]["wins"] += 1
+            results.append({"match_id": match_id, "matchday": match.matchday, "home_id": match.home_id,
+                            "away_id": match.away_id, "score": dict(match.score)})
+        return {"teams": record, "draws": draws, "matches": results}
+
+
+def team_pair(team_a, team_b):
+    """Chiave degli scontri diretti: la stessa in entrambi gli ordini"""
+    return (team_a, team_b) if team_a <= team_b else (team_b, team_a)
@@ -0,0 +1,43 @@
+"""
+Fixture comuni dei test. I percorsi dei campionati (teams.json) sono
+relativi alla cartella del progetto: i test girano da lì, qualunque sia la
+cartella da cui si avvia pytest.
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import server  # noqa: E402
+
+# Squadre e calendario sempre dal file squadre: i test non scrivono in .cache/
+server.ARTIFACT_DIR = None
+
+SEED = 1234
+
+
+@pytest.fixture(autouse=True)
+def project_dir(monkeypatch):
+    monkeypatch.chdir(ROOT)
+
+
+def new_league(seed=SEED):
+    """Campionato appena creato, con seme fisso, prima giornata non ancora avviata"""
+    championship = server.create_league(server.DEFAULT_LEAGUE)
+    championship.seed = seed
+    return championship
+
+
+def play(championship, ticks):
+    """Avanza di ticks minuti; restituisce i batch prodotti"""
+    return [championship.tick() for _ in range(ticks)]
+
+
+@pytest.fixture
+def league():
+    championship = new_league()
+    championship.start()
+    return championship
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import re
+import urllib.parse
+
+import pytest
+import tornado.httpclient
+import tornado.httpserver
+import tornado.netutil
+
+import server
+from conftest import SEED, play
+
+# ETag debole valido secondo la RFC 7232: W/"..." con soli caratteri ammessi
+ETAG_RE = re.compile(r'^W/"[\x21\x23-\x7e]*"$')
+
+
+@pytest.fixture
+def league():
+    """Campionato predefinito pronto per le API, con qualche giornata già giocata"""
+    championship = server.leagues[server.DEFAULT_LEAGUE]
+    if not server.leagues.is_ready(championship.league_id):
+        championship.seed = SEED
+        championship.start()
+        play(championship, 250)
+        server.leagues.set_ready(championship.league_id)
+    return championship
+
+
+def fetch(path, **headers):
+    """Richiesta GET all'applicazione su una porta libera; risposta anche per gli errori"""
+    async def request():
+        sockets = tornado.netutil.bind_sockets(0, "127.0.0.1")
+        http_server = tornado.httpserver.HTTPServer(server.make_app(debug=False))
+        http_server.add_sockets(sockets)
+        port = sockets[0].getsockname()[1]
+        try:
+            return await tornado.httpclient.AsyncHTTPClient().fetch(
+                f"http://127.0.0.1:{port}{path}", headers=headers, raise_error=False)
+        finally:
+            http_server.stop()
+
+    return asyncio.run(request())
+
+
+def get_json(path, status=200, **headers):
+    response = fetch(path, **headers)
+    assert response.code == status
+    if status == 200:
+        assert ETAG_RE.match(response.headers["ETag"])
+    return json.loads(response.body) if response.body else None
+
+
+def assert_not_modified(path):
+    etag = fetch(path).headers["ETag"]
+    response = fetch(path, **{"If-None-Match": etag})
+    assert response.code == 304
+    assert response.headers["ETag"] == etag
+
+
+def test_matchday(league):
+    body = get_json(f"/api/matches?matchday={league.current_matchday}")
+    assert set(body["matches"]) == set(league.get_matches_by_matchday(league.current_matchday))
+    assert_not_modified("/api/matches?matchday=1")
+    assert "error" in get_json("/api/matches?matchday=0", 400)
+    assert "error" in get_json("/api/matches?matchday=abc", 400)
+    assert "error" in get_json("/api/matches?league=nessuna", 404)
+
+
+def test_match_and_events(league):
+    match_id = next(iter(league.get_matches_by_matchday(1)))
+    assert get_json(f"/api/match/{match_id}")["match"]["id"] == match_id
+    assert_not_modified(f"/api/match/{match_id}")
+    events = get_json(f"/api/match/{match_id}/events?since=1")
+    assert len(events["events"]) == events["next"] - 1
+    get_json(f"/api/match/{match_id}/events?since=-1", 400)
+    get_json("/api/match/nessuno", 404)
+
+
+def test_standings(league):
+    rows = get_json("/api/standings")["standings"]
+    assert [row["team_id"] for row in rows] == [row["team_id"] for row in league.get_sorted_standings()]
+    assert_not_modified("/api/standings")
+    assert_not_modified("/api/standings?live=1")
+
+
+def test_debug_is_off_by_default():
+    assert server.make_app().settings.get("debug") is False
+    assert server.make_app(debug=True).settings.get("debug") is True
+
+
+def test_stats_leaders(league):
+    body = get_json("/api/stats/leaders?category=goals&limit=5")
+    assert len(body["leaders"]["goals"]) == 5
+    assert_not_modified("/api/stats/leaders?category=goals&limit=5")
+    get_json("/api/stats/leaders?category=falli", 400)
+    get_json("/api/stats/leaders?limit=abc", 400)
+
+
+def test_player_stats(league):
+    leader = get_json("/api/stats/leaders?category=goals&limit=1")["leaders"]["goals"][0]
+    path = "/api/stats/player?" + urllib.parse.urlencode({"team": leader["team_id"], "name": leader["player"]})
+    body = get_json(path)
+    assert body["goals"] == leader["goals"]
+    assert all(leader["player"] in (event["player"], event.get("assist"), event.get("player_in"))
+               for event in body["events"])
+    assert_not_modified(path)
+    # Il nome del giocatore non compare nell'ETag
+    assert leader["player"].split()[-1] not in fetch(path).headers["ETag"]
+    get_json("/api/stats/player?team=nessuna&name=x", 404)
+    get_json(f"/api/stats/player?team={leader['team_id']}&name=%22Nessuno%22", 404)
+
+
+def test_team_stats_rejects_unknown_type(league):
+    team_id = league.teams[0]["id"]
+    body = get_json(f"/api/stats/team/{team_id}?type=goal")
+    assert all(event["type"] == "goal" for event in body["event_list"])
+    assert_not_modified(f"/api/stats/team/{team_id}?type=goal")
+    # Testo della richiesta che non può finire in un header
+    for event_type in ("a%0Db", "a%22b", "falli"):
+        assert "error" in get_json(f"/api/stats/team/{team_id}?type={event_type}", 400)
+    get_json("/api/stats/team/nessuna", 404)
+
+
+def test_head_to_head(league):
+    match = next(match for match in league.matches.values() if match.status == "finished")
+    path = f"/api/stats/h2h?teams={match.home_id},{match.away_id}"
+    body = get_json(path)
+    assert match.id in [result["match_id"] for result in body["matches"]]
+    assert_not_modified(path)
+    get_json(f"/api/stats/h2h?teams={match.home_id},{match.home_id}", 400)
+    get_json(f"/api/stats/h2h?teams={match.home_id},nessuna", 404)
@@ -0,0 +1,111 @@
+import zlib
+from concurrent.futures import Future
+
+from broadcast import EVICT_CLOSE, EVICT_DROP, Broadcaster, Frame, deflate_message
+
+
+class FakeStream:
+    """Stream con i contatori di Tornado: i byte scritti restano in coda finché non si chiama flush()"""
+
+    def __init__(self):
+        self.data = []
+        self._total_write_index = 0
+        self._total_write_done_index = 0
+
+    def write(self, data):
+        self.data.append(data)
+        self._total_write_index += len(data)
+
+    def flush(self):
+        self._total_write_done_index = self._total_write_index
+
+
+class FakeConnection:
+    def __init__(self, stream):
+        self.stream = stream
+        self._compressor = None
+        self._message_bytes_out = 0
+        self._wire_bytes_out = 0
+
+    def is_closing(self):
+        return False
+
+
+class FakeHandler:
+    def __init__(self, connection):
+        self.ws_connection = connection
+        self.closed = None
+
+    def close(self, code, reason):
+        self.closed = code
+
+
+class LegacyConnection:
+    """Connessione di una versione di Tornado senza gli attributi privati"""
+    stream = None
+
+    def is_closing(self):
+        return False
+
+
+class LegacyHandler(FakeHandler):
+    def __init__(self):
+        super().__init__(LegacyConnection())
+        self.pending = []
+
+    def write_message(self, message, binary=False):
+        future = Future()
+        self.pending.append((message, future))
+        return future
+
+
+def test_shared_frame_written_once_for_all_clients():
+    broadcaster = Broadcaster()
+    handlers = [FakeHandler(FakeConnection(FakeStream())) for _ in range(3)]
+    for handler in handlers:
+        broadcaster.add(handler)
+    frame = Frame('{"type":"update"}')
+    assert broadcaster.publish(frame) == 3
+    assert all(handler.ws_connection.stream.data == [frame.plain] for handler in handlers)
+    assert broadcaster.stats.frames_written == 3
+
+
+def test_deflated_frame_is_independent_of_history():
+    payload = b'{"type":"update","deltas":[]}' * 10
+    data = deflate_message(payload)
+    assert zlib.decompressobj(-zlib.MAX_WBITS).decompress(data + b"\x00\x00\xff\xff") == payload
+
+
+def test_slow_client_is_evicted():
+    broadcaster = Broadcaster(max_pending_bytes=100, policy=EVICT_CLOSE)
+    slow = FakeHandler(FakeConnection(FakeStream()))
+    fast = FakeHandler(FakeConnection(FakeStream()))
+    broadcaster.add(slow)
+    broadcaster.add(fast)
+    for _ in range(10):
+        broadcaster.publish(Frame("x" * 40))
+        fast.ws_connection.stream.flush()
+    assert slow.closed == 1013 and slow not in broadcaster.clients
+    assert fast.closed is None and len(fast.ws_connection.stream.data) == 10
+
+
+def test_fallback_client_has_the_same_limit():
+    broadcaster = Broadcaster(max_pending_bytes=100, policy=EVICT_DROP)
+    handler = LegacyHandler()
+    broadcaster.add(handler)
+    for _ in range(5):
+        broadcaster.publish(Frame("x" * 40))
+    # Oltre 100 byte in attesa i messaggi successivi sono saltati
+    assert len(handler.pending) == 3
+    assert broadcaster.stats.dropped == 2
+
+    # Scritture completate: la coda si svuota e i messaggi ripartono
+    for _, future in handler.pending:
+        future.set_result(None)
+    handler.pending.clear()
+    assert broadcaster.publish(Frame("x" * 40)) == 1
+
+    broadcaster.policy = EVICT_CLOSE
+    for _ in range(3):
+        broadcaster.publish(Frame("x" * 40))
+    assert handler.closed == 1013 and handler not in broadcaster.clients
@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+import tornado.netutil
+import tornado.tcpserver
+
+import bus
+
+
+class FakeStream:
+    """Stream in memoria con i due metodi di lettura usati da read_reply"""
+
+    def __init__(self, data):
+        self.data = data
+
+    async def read_until(self, delimiter):
+        end = self.data.index(delimiter) + len(delimiter)
+        chunk, self.data = self.data[:end], self.data[end:]
+        return chunk
+
+    async def read_bytes(self, length):
+        chunk, self.data = self.data[:length], self.data[length:]
+        return chunk
+
+
+def read(data):
+    stream = FakeStream(data)
+    reply = asyncio.run(bus.read_reply(stream))
+    assert stream.data == b""
+    return reply
+
+
+def test_command_round_trip():
+    payload = bus.encode_message({"tick": 1, "nome": "è⚽", "righe": [1, 2]})
+    command = bus.encode_command("PUBLISH", "lega:serie_a", payload, 42, b"a\r\nb")
+    assert read(command) == [b"PUBLISH", b"lega:serie_a", payload, 42, b"a\r\nb"]
+    assert bus.decode_message(read(command)[2]) == {"tick": 1, "nome": "è⚽", "righe": [1, 2]}
+
+
+def test_simple_replies():
+    assert read(b"+PONG\r\n") == "PONG"
+    assert read(b":-7\r\n") == -7
+    assert read(b"$-1\r\n") is None
+    assert read(b"*-1\r\n") is None
+    assert read(b"$0\r\n\r\n") == b""
+    assert read(b"*0\r\n") == []
+
+
+def test_error_replies():
+    with pytest.raises(bus.BusError, match="ERR comando"):
+        read(b"-ERR comando non valido\r\n")
+    with pytest.raises(bus.BusError):
+        read(b"?boh\r\n")
+
+
+def test_parse_address():
+    assert bus.parse_address("unix:///tmp/bus.sock") == ("unix", "/tmp/bus.sock")
+    assert bus.parse_address("redis://10.0.0.1:6390/") == ("tcp", ("10.0.0.1", 6390))
+    assert bus.parse_address("tcp://:6380") == ("tcp", ("127.0.0.1", 6380))
+    with pytest.raises(ValueError):
+        bus.create_bus("http://localhost:80")
+    assert isinstance(bus.create_bus(), bus.LocalBus)
+
+
+def test_broker_publish_subscribe(tmp_path):
+    path = str(tmp_path / "bus.sock")
+
+    async def scenario():
+        broker = bus.Broker()
+        broker.add_socket(tornado.netutil.bind_unix_socket(path))
+        received = asyncio.Queue()
+        client = bus.RespBus(f"unix://{path}")
+        client.subscribe("lega", received.put_nowait)
+        await client.connect()
+        # La sottoscrizione parte in background: si pubblica finché il broker non la registra
+        while not broker.channels.get(b"lega"):
+            await asyncio.sleep(0.01)
+        assert client.publish("lega", {"tick": 5, "deltas": []}) == 1
+        message = await asyncio.wait_for(received.get(), 5)
+        broker.stop()
+        return message, broker.messages
+
+    message, published = asyncio.run(scenario())
+    assert message == {"tick": 5, "deltas": []}
+    assert published == 1
+
+
+def test_broker_forgets_empty_channels(tmp_path):
+    path = str(tmp_path / "bus.sock")
+
+    async def scenario():
+        broker = bus.Broker()
+        broker.add_socket(tornado.netutil.bind_unix_socket(path))
+        stream = await bus.open_stream(("unix", path))
+        stream.write(bus.encode_command("SUBSCRIBE", "a", "b"))
+        assert await bus.read_reply(stream) == [b"subscribe", b"a", 1]
+        assert await bus.read_reply(stream) == [b"subscribe", b"b", 2]
+        assert set(broker.channels) == {b"a", b"b"}
+        stream.close()
+        while broker.channels:
+            await asyncio.sleep(0.01)
+        broker.stop()
+
+    asyncio.run(asyncio.wait_for(scenario(), 5))
+
+
+class BrokenBroker(tornado.tcpserver.TCPServer):
+    """Risponde a ogni comando con una reply malformata (ValueError in read_reply)"""
+
+    def __init__(self):
+        super().__init__()
+        self.connections = 0
+
+    async def handle_stream(self, stream, address):
+        self.connections += 1
+        await bus.read_reply(stream)
+        stream.write(b"$abc\r\n")
+
+
+def test_publisher_reconnects_after_unexpected_error(tmp_path, monkeypatch):
+    monkeypatch.setattr(bus, "RECONNECT_DELAY", 0.01)
+    path = str(tmp_path / "bus.sock")
+
+    async def scenario():
+        broker = BrokenBroker()
+        broker.add_socket(tornado.netutil.bind_unix_socket(path))
+        client = bus.RespBus(f"unix://{path}")
+        await client.connect()
+        first = client._publisher
+        client.publish("lega", {"tick": 1})
+        # Publisher e sottoscrittore, poi il nuovo publisher
+        while broker.connections < 3 or client._publisher in (None, first):
+            await asyncio.sleep(0.01)
+        broker.stop()
+
+    asyncio.run(asyncio.wait_for(scenario(), 5))
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+import engine
+import server
+from conftest import play
+
+
+def new_xg_league(seed=1234):
+    championship = server.Championship(server.load_teams("teams.json"), seed=seed, engine="xg")
+    championship.start()
+    return championship
+
+
+def test_engines():
+    with pytest.raises(TypeError):
+        engine.MatchEngine()
+    with pytest.raises(ValueError):
+        engine.create_engine("nessuno")
+    assert isinstance(engine.create_engine(), engine.ClassicEngine)
+    assert isinstance(engine.create_engine("xg"), engine.XGEngine)
+
+
+def test_xg_season_is_reproducible():
+    first, second = new_xg_league(), new_xg_league()
+    for a, b in zip(play(first, 300), play(second, 300)):
+        assert json.dumps(a["deltas"]) == json.dumps(b["deltas"])
+
+
+def test_xg_events_respect_who_is_on_the_pitch():
+    championship = new_xg_league()
+    play(championship, 500)
+    goalkeepers = {player for team in championship.teams
+                   for player in team.get("roles", {}).get(engine.GOALKEEPERS, ())}
+    for match in championship.matches.values():
+        sent_off = set()
+        score = {"home": 0, "away": 0}
+        for event in match.events:
+            assert event.player not in sent_off
+            if event.type == "red_card":
+                sent_off.add(event.player)
+            if event.type == "goal":
+                assert event.player not in goalkeepers
+            if event.scored:
+                score[event.team] += 1
+        assert score == match.score
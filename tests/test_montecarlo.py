@@ -0,0 +1,64 @@
+import pytest
+
+import server
+from conftest import play
+
+np = pytest.importorskip("numpy")
+montecarlo = pytest.importorskip("montecarlo")
+
+
+def xg_league(seed=1234):
+    championship = server.Championship(server.load_teams("teams.json"), seed=seed, engine="xg")
+    championship.start()
+    return championship
+
+
+def test_distributions_are_normalized():
+    for distributions, params in ((montecarlo.score_distributions, [0.3, 0.5, 0.7]),
+                                  (montecarlo.xg_score_distributions, [(0.01, 0.02), (0.03, 0.005)])):
+        for start in ((0, (0, 0), None), (60, (2, 1), None), (92, (0, 0), 4)):
+            dists = distributions(params, *start)
+            assert dists.shape == (len(params), montecarlo.MAX_GOALS + 1, montecarlo.MAX_GOALS + 1)
+            assert np.allclose(dists.sum(axis=(1, 2)), 1.0)
+            # Il punteggio non può scendere
+            assert dists[:, :start[1][0], :].sum() == pytest.approx(0)
+
+
+@pytest.mark.parametrize("engine_name", ["classic", "xg"])
+def test_fixture_distributions_match_single_fixtures(league, engine_name):
+    championship = league if engine_name == "classic" else xg_league()
+    play(championship, 50)
+    state = montecarlo.capture_state(championship)
+    assert state["engine"] == engine_name
+    fixtures = state["fixtures"]
+    dists = montecarlo.fixture_distributions(fixtures, engine_name)
+    distributions = montecarlo.DISTRIBUTIONS[engine_name]
+    for i in (0, len(fixtures) // 2, len(fixtures) - 1):
+        f = fixtures[i]
+        expected = distributions([f["params"]], f["minute"], f["score"], f["injury_time"])[0]
+        assert np.allclose(dists[i], expected)
+
+
+def test_xg_distributions_follow_the_xg_engine():
+    # Gol attesi dalla distribuzione esatta contro tre stagioni giocate dal motore xG
+    goals = np.arange(montecarlo.MAX_GOALS + 1)
+    expected = played = 0.0
+    for seed in (1, 2, 3):
+        championship = xg_league(seed)
+        dists = montecarlo.fixture_distributions(montecarlo.capture_state(championship)["fixtures"], "xg")
+        expected += float((dists.sum(axis=2) @ goals).sum() + (dists.sum(axis=1) @ goals).sum())
+        while not play(championship, 100)[-1]["season_over"]:
+            pass
+        played += sum(match.score["home"] + match.score["away"] for match in championship.matches.values())
+    # Circa 3000 gol: 4 deviazioni standard sono poco più del 4%
+    assert played == pytest.approx(expected, rel=0.05)
+
+
+def test_forecast_probabilities(league):
+    play(league, 300)
+    result = montecarlo.forecast(montecarlo.capture_state(league), 2000, seed=1)
+    assert result["engine"] == "classic"
+    positions = np.array([team["positions"] for team in result["teams"]])
+    assert np.allclose(positions.sum(axis=0), 1.0, atol=1e-3)
+    assert np.allclose(positions.sum(axis=1), 1.0, atol=1e-3)
+    assert sum(team["title"] for team in result["teams"]) == pytest.approx(1.0, abs=1e-3)
@@ -0,0 +1,127 @@
+import json
+import os
+import stat
+
+import pytest
+
+import artifacts
+import eventlog
+import server
+import statestore
+from conftest import new_league, play
+
+
+def comparable(batch):
+    """Batch senza i campi che dipendono dall'orologio reale"""
+    return {key: value for key, value in batch.items() if key not in ("tick_time", "tick_seconds")}
+
+
+def simulate(store, ticks):
+    championship = new_league()
+    championship.start()
+    store.start(championship)
+    # Come il server: ogni tick si registra subito, prima del successivo
+    for _ in range(ticks):
+        store.record(championship, championship.tick())
+    store.close()
+    return championship
+
+
+@pytest.mark.parametrize("store, restore, filename", [
+    (statestore.StateStore, statestore.restore, "league.sqlite"),
+    (eventlog.EventLog, eventlog.restore, "league.jsonl"),
+], ids=["sqlite", "jsonl"])
+def test_restore_equals_live_state(tmp_path, store, restore, filename):
+    path = str(tmp_path / filename)
+    # Fino a metà della quinta giornata: giornate concluse, una in corso
+    live = simulate(store(path), 470)
+
+    restored = new_league(seed=0)
+    assert restore(restored, path) == live.tick_count
+    assert restored.seed == live.seed
+    assert json.loads(json.dumps(restored.state())) == json.loads(json.dumps(live.state()))
+    assert restored.get_sorted_standings() == live.get_sorted_standings()
+    assert list(restored.live_matches) == list(live.live_matches)
+
+    # La simulazione ripresa prosegue identica
+    for expected, actual in zip(play(live, 150), play(restored, 150)):
+        assert comparable(actual) == comparable(expected)
+
+
+def test_statestore_empty_database(tmp_path):
+    path = str(tmp_path / "empty.sqlite")
+    statestore.StateStore(path).close()
+    assert statestore.restore(new_league(), path) is None
+
+
+def test_statestore_writer_survives_errors(tmp_path, monkeypatch, caplog):
+    path = str(tmp_path / "league.sqlite")
+    encode = statestore.encode
+    failures = [TypeError("valore non codificabile")]
+
+    def failing_encode(value):
+        if failures:
+            raise failures.pop()
+        return encode(value)
+
+    # Fallisce la prima transazione (con i tick accodati nel frattempo): le successive vengono scritte
+    monkeypatch.setattr(statestore, "encode", failing_encode)
+    live = simulate(statestore.StateStore(path), 200)
+    assert "Stato non salvato" in caplog.text
+    restored = new_league(seed=0)
+    assert statestore.restore(restored, path) == live.tick_count
+    assert restored.get_sorted_standings() == live.get_sorted_standings()
+
+
+def test_statestore_stops_queueing_without_writer(tmp_path, caplog):
+    store = statestore.StateStore(str(tmp_path / "league.sqlite"))
+    championship = new_league()
+    championship.start()
+    store.close()
+    for batch in play(championship, 3):
+        store.record(championship, batch)
+    assert store.pending == 0
+    assert caplog.text.count("non viene più salvato") == 1
+
+
+def test_restore_rejects_other_league(tmp_path):
+    path = str(tmp_path / "league.sqlite")
+    simulate(statestore.StateStore(path), 5)
+    other = new_league()
+    other.league_id = "altro"
+    with pytest.raises(ValueError):
+        statestore.restore(other, path)
+
+
+def test_eventlog_restore_to_earlier_minute(tmp_path):
+    path = str(tmp_path / "league.jsonl")
+    simulate(eventlog.EventLog(path), 300)
+
+    reference = new_league()
+    reference.start()
+    while (reference.current_matchday, reference.matchday_minute) < (2, 40):
+        reference.tick()
+    restored = new_league()
+    eventlog.restore(restored, path, 2, 40)
+    assert json.loads(json.dumps(restored.state())) == json.loads(json.dumps(reference.state()))
+
+
+def test_artifact_round_trip(tmp_path):
+    teams = server.load_teams("teams.json")
+    fixtures = server.build_calendar([team["id"] for team in teams])
+    path = str(tmp_path / "teams.cal")
+    umask = os.umask(0o027)
+    try:
+        artifacts.save(path, teams, fixtures)
+    finally:
+        os.umask(umask)
+    assert artifacts.load(path) == (teams, fixtures)
+    # Permessi di un file normale (0666 meno la umask), nessun file temporaneo rimasto
+    if os.name == "posix":
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+    assert os.listdir(tmp_path) == ["teams.cal"]
+
+    with open(path, "r+b") as f:
+        f.truncate(artifacts.HEADER.size + 10)
+    with pytest.raises(ValueError):
+        artifacts.load(path)
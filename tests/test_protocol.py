@@ -0,0 +1,75 @@
+import copy
+import json
+import types
+
+import server
+from conftest import play
+
+
+def wire(batch):
+    """Il batch come lo riceve un altro processo (JSON sul bus)"""
+    return json.loads(json.dumps(batch))
+
+
+def apply_delta(state, delta):
+    """Come le pagine: applica un delta se prosegue la sequenza del match, altrimenti False (resync)"""
+    match = state[delta["id"]]
+    if delta["seq"] != match["seq"] + 1:
+        return False
+    for field in server.DELTA_FIELDS:
+        if field in delta:
+            match[field] = delta[field]
+    match["events"].extend(delta.get("events", ()))
+    match["seq"] = delta["seq"]
+    return True
+
+
+def test_delta_replay_converges_to_snapshot(league):
+    client = {mid: copy.deepcopy(league.match_snapshot(mid)) for mid in league.matches}
+    # Oltre un cambio di giornata (le nuove partite arrivano come delta dallo stato iniziale)
+    for batch in play(league, 250):
+        for delta in wire(batch)["deltas"]:
+            assert apply_delta(client, delta)
+    assert client == json.loads(json.dumps({mid: league.match_snapshot(mid) for mid in league.matches}))
+
+
+def test_sequence_gap_is_detected(league):
+    client = {mid: copy.deepcopy(league.match_snapshot(mid)) for mid in league.matches}
+    batches = [wire(batch) for batch in play(league, 3)]
+    delta = batches[1]["deltas"][0]
+    # Il client ha perso il primo batch: il delta successivo non si applica
+    assert not apply_delta(client, delta)
+    # Dopo il resync (snapshot del match) la sequenza riprende
+    client[delta["id"]] = copy.deepcopy(league.match_snapshot(delta["id"]))
+    resynced = [d for d in play(league, 1)[0]["deltas"] if d["id"] == delta["id"]]
+    assert resynced
+    for d in resynced:
+        assert apply_delta(client, wire(d))
+
+
+def test_resync_request_is_validated(league, monkeypatch):
+    sent = []
+    monkeypatch.setattr(server.broadcaster, "send", lambda client, frames: sent.append(frames.message))
+    client = types.SimpleNamespace(league=league)
+    match_id = next(iter(league.matches))
+
+    def resync(match_ids):
+        sent.clear()
+        server.MatchesWebSocket.on_message(client, json.dumps({"type": "resync", "match_ids": match_ids}))
+        return [match["id"] for message in sent for match in message["matches"]]
+
+    assert resync([match_id, match_id, "nessuno"]) == [match_id]
+    # Tipi sbagliati o richieste più lunghe di una giornata: nessuna risposta
+    assert resync(7) == []
+    assert resync({"id": match_id}) == []
+    assert resync(list(league.matches)) == []
+    # 100k copie dello stesso id: un solo snapshot
+    assert resync([match_id] * 100000) == [match_id]
+
+
+def test_build_topic_update_filters_by_topic(league):
+    batch = play(league, 10)[-1]
+    match_id = batch["deltas"][0]["id"]
+    message = server.build_topic_update(league, f"match:{match_id}", batch["deltas"], None, None)
+    assert [delta["id"] for delta in message["deltas"]] == [match_id]
+    assert server.build_topic_update(league, server.TOPIC_STANDINGS, batch["deltas"], None, None) is None
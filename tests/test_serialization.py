@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+import server
+import serialization
+from conftest import play
+
+# Valori ai limiti di ogni formato MessagePack (fixint, int8...64, str8/16/32, array16, map16)
+EDGE_VALUES = [
+    0, 1, 127, 128, 255, 256, 65535, 65536, 2 ** 32 - 1, 2 ** 32, 2 ** 64 - 1,
+    -1, -32, -33, -128, -129, -32768, -32769, -2 ** 31, -2 ** 31 - 1, -2 ** 63,
+    0.5, -1.25, 1e300, True, False, None,
+    "", "a" * 31, "a" * 32, "a" * 255, "a" * 256, "a" * 65535, "a" * 65536, "è⚽ minuto 90'",
+    b"", b"\x00\xff" * 200, b"x" * 70000,
+    [], list(range(15)), list(range(16)), list(range(70000)),
+    {}, {str(i): i for i in range(15)}, {str(i): i for i in range(16)},
+    {"nested": [{"a": [1, {"b": None}]}, "c"]},
+]
+
+
+@pytest.mark.parametrize("value", EDGE_VALUES, ids=lambda value: type(value).__name__)
+def test_python_msgpack_round_trip(value):
+    assert serialization.unpackb(serialization.packb(value)) == value
+
+
+def test_msgpack_tuple_and_subclasses():
+    class Kind(str):
+        pass
+
+    assert serialization.unpackb(serialization.packb((1, 2))) == [1, 2]
+    assert serialization.unpackb(serialization.packb({Kind("goal"): Kind("x")})) == {"goal": "x"}
+    with pytest.raises(TypeError):
+        serialization.packb(object())
+
+
+def test_unpackb_rejects_trailing_data():
+    with pytest.raises(ValueError):
+        serialization.unpackb(serialization.packb(1) + b"\x00")
+
+
+def test_python_encoder_matches_msgpack_package():
+    msgpack = pytest.importorskip("msgpack")
+    for value in EDGE_VALUES:
+        assert serialization.packb(value) == msgpack.packb(value, use_bin_type=True)
+        assert msgpack.unpackb(serialization.packb(value), raw=False, strict_map_key=False) == value
+
+
+def real_messages():
+    """Stato iniziale e aggiornamenti veri di una giornata in corso"""
+    championship = server.create_league(server.DEFAULT_LEAGUE)
+    championship.seed = 7
+    championship.start()
+    batches = play(championship, 60)
+    topics = [server.TOPIC_LIVE, server.TOPIC_STANDINGS, server.TOPIC_LIVE_STANDINGS]
+    messages = [server.build_initial_state(championship, topics)]
+    for batch in batches:
+        messages.extend(batch["deltas"])
+    return messages
+
+
+@pytest.mark.parametrize("name", sorted(serialization.available_codecs()))
+def test_codecs_round_trip_real_messages(name):
+    codec = serialization.available_codecs()[name]
+    for message in real_messages():
+        data = codec.encode(message)
+        decoded = serialization.decode(data if codec.binary else data.decode("utf-8"))
+        # Confronto sul JSON: le tuple diventano liste in tutti i formati
+        assert decoded == json.loads(json.dumps(message))
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        serialization.json_codec("nessuno")
+    with pytest.raises(ValueError):
+        serialization.msgpack_codec("nessuno")
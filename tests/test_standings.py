@@ -0,0 +1,62 @@
+import random
+
+import server
+from conftest import play
+
+
+def full_sort(standings):
+    """Classifica ricalcolata da zero: tutte le squadre ordinate per standings_key"""
+    return sorted(standings, key=lambda team_id: server.standings_key(standings[team_id]), reverse=True)
+
+
+def test_incremental_ranking_matches_full_sort(league):
+    # Più di tre giornate: molti spostamenti in classifica
+    for _ in range(4):
+        play(league, 100)
+        assert league._ranking.ids == full_sort(league.standings)
+        rows = league.get_sorted_standings()
+        assert [row["team_id"] for row in rows] == full_sort(league.standings)
+        assert [row["position"] for row in rows] == list(range(1, len(rows) + 1))
+
+
+def test_standings_match_finished_results(league):
+    play(league, 400)
+    expected = {team_id: {"played": 0, "points": 0, "goals_for": 0} for team_id in league.standings}
+    for match in league.matches.values():
+        if match.status != "finished":
+            continue
+        home, away = match.score["home"], match.score["away"]
+        for team_id, scored, conceded in ((match.home_id, home, away), (match.away_id, away, home)):
+            expected[team_id]["played"] += 1
+            expected[team_id]["goals_for"] += scored
+            expected[team_id]["points"] += 3 if scored > conceded else 1 if scored == conceded else 0
+    for team_id, row in league.standings.items():
+        assert {field: row[field] for field in expected[team_id]} == expected[team_id]
+
+
+def test_ranking_move_random():
+    rng = random.Random(0)
+    keys = {f"team{i}": (0, 0, 0, 0, f"team{i}") for i in range(20)}
+    ranking = server.Ranking(keys.items())
+    for _ in range(2000):
+        team_id = rng.choice(list(keys))
+        old = keys[team_id]
+        new = keys[team_id] = (old[0] + rng.choice((0, 1, 3)), rng.randint(-5, 5), rng.randint(0, 9), 0, team_id)
+        ranking.move(team_id, old, new)
+    assert ranking.ids == sorted(keys, key=keys.get, reverse=True)
+    assert ranking.keys == sorted(keys.values(), reverse=True)
+
+
+def test_live_standings_project_live_scores(league):
+    play(league, 60)
+    assert league.live_matches
+    projected = {team_id: dict(row) for team_id, row in league.standings.items()}
+    for match in league.live_matches.values():
+        server.apply_result(projected[match.home_id], projected[match.away_id],
+                            match.score["home"], match.score["away"])
+    rows = league.get_live_standings()
+    assert [row["team_id"] for row in rows] == full_sort(projected)
+    live_teams = {team_id for match in league.live_matches.values() for team_id in (match.home_id, match.away_id)}
+    assert {row["team_id"] for row in rows if row["live"]} == live_teams
+    # La classifica ufficiale non cambia
+    assert league._ranking.ids == full_sort(league.standings)
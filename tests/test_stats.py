@@ -0,0 +1,59 @@
+from collections import Counter
+
+from conftest import play
+from stats import LEADER_CATEGORIES, StatsIndex, event_stats
+
+
+def brute_force(championship):
+    """Statistiche dei giocatori contando da capo tutti gli eventi"""
+    counts = Counter()
+    for match in championship.matches.values():
+        for event in match.events:
+            team_id = match.home_id if event.team == "home" else match.away_id
+            fields, other_fields = event_stats(event)
+            counts.update((team_id, event.player, field) for field in fields)
+            counts.update((team_id, event.other, field) for field in other_fields)
+    return counts
+
+
+def test_incremental_index_matches_rebuild(league):
+    index = StatsIndex(league)
+    version = index.version
+    for _ in range(3):
+        for batch in play(league, 80):
+            index.update([delta["id"] for delta in batch["deltas"]])
+        assert index.version > version
+        version = index.version
+
+        rebuilt = StatsIndex(league)
+        assert index.players == rebuilt.players
+        assert index.teams == rebuilt.teams
+        assert index.head_to_head == rebuilt.head_to_head
+        for category in LEADER_CATEGORIES:
+            assert index.top(category, 50) == rebuilt.top(category, 50)
+
+        counts = brute_force(league)
+        for (team_id, player), row in index.players.items():
+            for field, value in row.items():
+                if field not in ("player", "team_id"):
+                    assert value == counts[team_id, player, field]
+
+
+def test_update_is_idempotent(league):
+    play(league, 50)
+    index = StatsIndex(league)
+    version = index.version
+    assert index.update(league.matches) == (set(), set())
+    assert index.version == version
+
+
+def test_leaders_are_sorted_with_ties(league):
+    play(league, 300)
+    index = StatsIndex(league)
+    rows = index.top("goals", 100)
+    assert rows
+    assert [row["goals"] for row in rows] == sorted((row["goals"] for row in rows), reverse=True)
+    for row in rows:
+        assert row["position"] == 1 + sum(other["goals"] > row["goals"] for other in index.players.values())
+    unknown = index.player(rows[0]["team_id"], "Nessuno")
+    assert unknown["goals"] == 0 and unknown["ranks"]["goals"] is None
@@ -0,0 +1,78 @@
+import queue
+import threading
+import types
+from concurrent.futures import Future
+
+import pytest
+
+import server
+from conftest import new_league, play
+from test_protocol import wire
+
+
+class ImmediateLoop:
+    """Al posto dell'event loop: esegue subito le callback passate dai thread"""
+
+    def call_soon_threadsafe(self, callback, *args):
+        callback(*args)
+
+
+def test_single_league_runs_in_event_loop():
+    assert len(server.LEAGUES) > 1 or server.SIMULATION_WORKERS == 0
+
+
+def test_forwarder_stops_on_sentinel():
+    updates = queue.Queue()
+    received = []
+    loop = types.SimpleNamespace(call_soon_threadsafe=lambda callback, batches: received.append(batches))
+    thread = threading.Thread(target=server._forward_worker_batches, args=(updates, loop))
+    thread.start()
+    updates.put([{"tick": 1}])
+    updates.put(None)
+    thread.join(5)
+    assert not thread.is_alive()
+    assert received == [[{"tick": 1}]]
+
+
+def test_crashed_shard_stops_serving_its_leagues(monkeypatch):
+    registry = server.LeagueRegistry(server.LEAGUES)
+    monkeypatch.setattr(server, "leagues", registry)
+    registry.set_ready(server.DEFAULT_LEAGUE)
+    closed = []
+    client = types.SimpleNamespace(league=registry[server.DEFAULT_LEAGUE],
+                                   close=lambda code, reason: closed.append(code))
+    monkeypatch.setattr(server.broadcaster, "clients", [client])
+
+    # Uno shard che termina normalmente (fine stagione, arresto) non cambia nulla
+    finished = Future()
+    finished.set_result(None)
+    server._report_shard_exit([server.DEFAULT_LEAGUE], ImmediateLoop(), finished)
+    assert server.get_league() is registry[server.DEFAULT_LEAGUE]
+
+    crashed = Future()
+    crashed.set_exception(RuntimeError("worker"))
+    server._report_shard_exit([server.DEFAULT_LEAGUE], ImmediateLoop(), crashed)
+    assert registry.status()[server.DEFAULT_LEAGUE] == "stopped"
+    assert closed == [4503]
+    with pytest.raises(server.LeagueNotReady, match="interrotta"):
+        server.get_league()
+
+
+def test_deltas_do_not_share_live_state(league):
+    # I batch restano in coda (o nel bus) mentre il campionato avanza
+    held = []
+    for batch in play(league, 300):
+        held.extend((delta["score"], dict(delta["score"])) for delta in batch["deltas"] if "score" in delta)
+    assert held
+    assert all(score == copy for score, copy in held)
+
+
+def test_apply_batch_copy_matches_simulation(league):
+    # La copia del processo Tornado segue il worker applicando i batch ricevuti dalla coda
+    replica = new_league()
+    replica.restore_state(wire(league.state()))
+    for batch in play(league, 200):
+        replica.apply_batch(wire(batch))
+    assert wire(replica.state()) == wire(league.state())
+    assert replica.get_sorted_standings() == league.get_sorted_standings()
+    assert replica.live_matches.keys() == league.live_matches.keys()